@@ -3,6 +3,7 @@
 Minimal dev-focused settings to support a React frontend on localhost:3000.
 """
 
+import json
 import os
 from pathlib import Path
 
@@ -25,6 +26,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'surveillance.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -90,8 +92,19 @@ CORS_ALLOW_ALL_ORIGINS = True  # Dev only - allow all origins
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'surveillance.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Stage latency histograms, request counters and model-load timings,
+# exposed at /api/metrics/ in Prometheus text format to staff users only.
+#
+# Override via environment variable METRICS_ENABLED=0 to turn instrumentation
+# into no-ops.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').strip() != '0'
+
 # Activity model identifier (used by /api/classify/)
 #
 # Can be either:
@@ -103,3 +116,208 @@ VIDEOMAE_MODEL_DIR = os.environ.get(
     'VIDEOMAE_MODEL_DIR',
     'Accurateinfosolution/Suspicious_activity_detection_Yolov11_Custom',
 )
+
+# Per-camera regions of interest for /api/detect/.
+#
+# Maps a camera id (the `cameraId` sent by the client, 'default' when omitted)
+# to a list of [x, y, width, height] rectangles in percent of the frame. Only
+# these zones are cropped and run through YOLO; cameras without an entry use
+# the full frame.
+#
+# Override via environment variable DETECTION_ROIS (JSON), e.g.
+#   {"default": [[0, 30, 60, 70], [55, 0, 45, 50]]}
+DETECTION_ROIS: dict[str, list[list[float]]] = json.loads(os.environ.get('DETECTION_ROIS', '{}'))
+
+# Run a low-resolution pass and re-check only low-confidence people at high
+# resolution (see DETECTION_CONFIG['adaptive_*'] in surveillance/yolo_detector.py).
+#
+# Override via environment variable DETECTION_ADAPTIVE_RESOLUTION=1.
+DETECTION_ADAPTIVE_RESOLUTION = os.environ.get('DETECTION_ADAPTIVE_RESOLUTION', '').strip() == '1'
+
+# Bounded executors for the async inference views, keyed by URL name.
+# `workers` run requests concurrently, `queue_depth` more may wait; beyond
+# that the endpoint answers 503 with Retry-After instead of queueing. Each
+# model's forward pass is serialized by a lock (the predictors are not
+# thread-safe), so extra workers overlap decoding and postprocessing only.
+#
+# Override via environment variables INFERENCE_WORKERS / INFERENCE_QUEUE_DEPTH
+# (detect) and CLASSIFY_WORKERS / CLASSIFY_QUEUE_DEPTH (classify).
+INFERENCE_POOLS = {
+    'detect-humans': {
+        'workers': int(os.environ.get('INFERENCE_WORKERS', '1')),
+        'queue_depth': int(os.environ.get('INFERENCE_QUEUE_DEPTH', '4')),
+    },
+    'classify-activity': {
+        'workers': int(os.environ.get('CLASSIFY_WORKERS', '1')),
+        'queue_depth': int(os.environ.get('CLASSIFY_QUEUE_DEPTH', '2')),
+    },
+}
+INFERENCE_RETRY_AFTER_SECONDS = int(os.environ.get('INFERENCE_RETRY_AFTER_SECONDS', '1'))
+
+# Directory where each process keeps a marker file while its inference pools
+# have requests in flight. Recording analysis reads it to yield to live
+# traffic in other processes too (e.g. a separate `manage.py process_jobs`).
+# Every process on the host must use the same directory. Set it empty to
+# only consider this process.
+#
+# Override via environment variable INFERENCE_ACTIVITY_DIR.
+INFERENCE_ACTIVITY_DIR = os.environ.get('INFERENCE_ACTIVITY_DIR', str(BASE_DIR / 'run' / 'inference-activity'))
+
+# Detection-gated activity classification (surveillance/cascade.py).
+# /api/classify/ only runs the activity model when /api/detect/ saw people for
+# that camera within `presence_window` seconds, and smooths verdicts: it takes
+# `enter_count` suspicious verdicts in a row to raise an alert and
+# `exit_count` normal ones to clear it.
+#
+# Override via environment variable ACTIVITY_CASCADE=0 to classify every call.
+ACTIVITY_CASCADE = {
+    'enabled': os.environ.get('ACTIVITY_CASCADE', '1').strip() != '0',
+    'presence_window': 3.0,
+    'enter_count': 2,
+    'exit_count': 3,
+}
+
+# Classify every detected person on /api/detect/: person boxes are cropped from
+# the decoded frame and all crops go through the activity model in one batched
+# pass, so each detection gets its own `status` and `statusConfidence`.
+#
+# Override via environment variable PER_PERSON_CLASSIFICATION=1.
+PER_PERSON_CLASSIFICATION = os.environ.get('PER_PERSON_CLASSIFICATION', '').strip() == '1'
+
+# /api/events/ (Server-Sent Events): heartbeat interval, how many past events
+# are kept for clients resuming with Last-Event-ID, and (with STATE_BACKEND=sqlite)
+# how often each worker polls the shared event log.
+EVENTS_HEARTBEAT_SECONDS = int(os.environ.get('EVENTS_HEARTBEAT_SECONDS', '15'))
+EVENTS_HISTORY = int(os.environ.get('EVENTS_HISTORY', '500'))
+EVENTS_POLL_SECONDS = float(os.environ.get('EVENTS_POLL_SECONDS', '0.25'))
+
+# Fan-out for named cameras (requests with a `cameraId`, surveillance/camera_hub.py).
+# Viewers of one camera share a single inference: concurrent requests join the
+# one in flight, and results younger than the window are reused. Each fresh
+# result is also pushed to /api/cameras/<id>/events/. Only `cameras` and
+# cameras with recent frames can be subscribed to; at most `max_cameras` are
+# tracked, each with up to `max_variants` parameter sets, and cameras idle for
+# `idle_seconds` are dropped.
+#
+# Override via environment variables CAMERA_SHARING=0 to run every request and
+# CAMERAS (comma-separated ids that can always be subscribed to).
+CAMERA_SHARING = {
+    'enabled': os.environ.get('CAMERA_SHARING', '1').strip() != '0',
+    'detect_window': 0.25,
+    'classify_window': 2.0,
+    'history': 16,
+    'cameras': [c.strip() for c in os.environ.get('CAMERAS', '').split(',') if c.strip()],
+    'max_cameras': 64,
+    'max_variants': 8,
+    'idle_seconds': 300.0,
+}
+
+# Where session state, stats counters, alerts, /api/events/ events and cascade
+# presence live (surveillance/state_backends.py). 'memory' is per-process and only
+# correct with a single worker; 'sqlite' keeps them in a WAL-mode SQLite file
+# shared by every worker on the host. Verdict smoothing, camera sharing and
+# evidence rings stay per-process either way (see "Multiple workers" in README.md).
+#
+# Override via environment variables STATE_BACKEND=sqlite and STATE_SQLITE_PATH.
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'memory').strip().lower()
+STATE_SQLITE_PATH = os.environ.get('STATE_SQLITE_PATH', str(BASE_DIR / 'state.sqlite3'))
+
+# INT8 model variants built by `manage.py quantize` (surveillance/quantization.py).
+# A variant is registered as selectable only when its accuracy against the FP32
+# model on held-out frames stays within `tolerance` (max drop in mAP@0.5 and
+# verdict agreement). With MODEL_PRECISION=int8, CPU-only nodes load the
+# selectable variants; CUDA nodes keep FP32/FP16.
+#
+# Override via environment variables MODEL_PRECISION, QUANTIZED_MODELS_DIR and
+# QUANTIZATION_TOLERANCE.
+QUANTIZATION = {
+    'precision': os.environ.get('MODEL_PRECISION', 'fp32').strip().lower(),
+    'variants_dir': os.environ.get('QUANTIZED_MODELS_DIR', str(BASE_DIR / 'models' / 'quantized')),
+    'tolerance': float(os.environ.get('QUANTIZATION_TOLERANCE', '0.02')),
+}
+
+# Segmented recording storage (surveillance/recordings.py). Uploads are split
+# into `segment_seconds` segments (ffmpeg stream copy when available) and
+# indexed per camera by time. A background pass every `interval` seconds
+# deletes the oldest segments (at most `batch` per pass) while usage exceeds
+# `quota_mb`, and segments older than `max_age_days` when that is non-zero.
+# The segment index and in-progress uploads live in `state_dir`, which must
+# stay outside MEDIA_ROOT (served at MEDIA_URL in DEBUG).
+#
+# Override via environment variables RECORDINGS_SEGMENT_SECONDS,
+# RECORDINGS_QUOTA_MB, RECORDINGS_MAX_AGE_DAYS and RECORDINGS_STATE_DIR.
+RECORDINGS = {
+    'state_dir': os.environ.get('RECORDINGS_STATE_DIR', str(BASE_DIR / 'run' / 'recordings')),
+    'segment_seconds': int(os.environ.get('RECORDINGS_SEGMENT_SECONDS', '60')),
+    'quota_mb': float(os.environ.get('RECORDINGS_QUOTA_MB', '10240')),
+    'max_age_days': float(os.environ.get('RECORDINGS_MAX_AGE_DAYS', '0')),
+    'interval': 60.0,
+    'batch': 200,
+}
+
+# Local job queue for uploaded recordings (surveillance/jobs.py and
+# recording_jobs.py): segmenting, probe, thumbnail/keyframes and re-analysis
+# jobs live in a SQLite file and run on `workers` threads, at most
+# `concurrency[kind]` of a kind at once per process. Analysis samples
+# `analyze_fps` frames per second. While live requests are in flight on the
+# host (see INFERENCE_ACTIVITY_DIR) it uses at most `live_duty_cycle` of wall
+# time and waits up to `yield_max_wait` seconds per frame for them to finish.
+# With `autostart` the web server starts the workers at launch; turn it off
+# to run them only in a separate `manage.py process_jobs` process.
+#
+# Override via environment variables JOBS_AUTOSTART, JOBS_WORKERS,
+# JOBS_ANALYZE_CONCURRENCY and JOBS_ANALYZE_FPS.
+JOBS = {
+    'path': BASE_DIR / 'jobs.sqlite3',
+    'autostart': os.environ.get('JOBS_AUTOSTART', '1').strip() != '0',
+    'workers': int(os.environ.get('JOBS_WORKERS', '2')),
+    'concurrency': {
+        'segment': 1,
+        'probe': 2,
+        'thumbnail': 1,
+        'analyze': int(os.environ.get('JOBS_ANALYZE_CONCURRENCY', '1')),
+    },
+    'max_attempts': 3,
+    'analyze_fps': float(os.environ.get('JOBS_ANALYZE_FPS', '1.0')),
+    'keyframes': 6,
+    'yield_max_wait': 5.0,
+    'live_duty_cycle': 0.25,
+}
+
+# Alert evidence (surveillance/evidence.py): each camera's last `pre_frames`
+# encoded frames (at most `ring_mb` per camera, for the `max_cameras` most
+# recently seen cameras) are kept in memory. On an
+# alert they are archived with the triggering clip (`trigger_frames`) and the
+# next `post_frames` frames (waiting at most `post_timeout` seconds) as one
+# record in append-only `segment_mb` files under `path`; the oldest segments
+# are deleted beyond `max_mb`.
+#
+# Override via environment variables EVIDENCE_ENABLED, EVIDENCE_PRE_FRAMES,
+# EVIDENCE_POST_FRAMES, EVIDENCE_RING_MB, EVIDENCE_MAX_CAMERAS and
+# EVIDENCE_MAX_MB.
+EVIDENCE = {
+    'enabled': os.environ.get('EVIDENCE_ENABLED', '1').strip() != '0',
+    'path': str(BASE_DIR / 'evidence'),
+    'pre_frames': int(os.environ.get('EVIDENCE_PRE_FRAMES', '5')),
+    'post_frames': int(os.environ.get('EVIDENCE_POST_FRAMES', '5')),
+    'trigger_frames': 8,
+    'post_timeout': 10.0,
+    'ring_mb': float(os.environ.get('EVIDENCE_RING_MB', '4')),
+    'max_cameras': int(os.environ.get('EVIDENCE_MAX_CAMERAS', '64')),
+    'segment_mb': 64.0,
+    'max_mb': float(os.environ.get('EVIDENCE_MAX_MB', '1024')),
+}
+
+# Sampling profiler at /api/debug/profile/ (surveillance/profiler.py), for
+# staff users only and off unless enabled. Captures are capped at
+# `max_seconds` and `max_hz`; the sampler backs off to keep its own cost under
+# `max_overhead` of wall time.
+#
+# Override via environment variables PROFILING_ENABLED=1 and
+# PROFILING_MAX_OVERHEAD.
+PROFILING = {
+    'enabled': os.environ.get('PROFILING_ENABLED', '').strip() == '1',
+    'max_seconds': 30.0,
+    'max_hz': 1000.0,
+    'max_overhead': float(os.environ.get('PROFILING_MAX_OVERHEAD', '0.02')),
+}
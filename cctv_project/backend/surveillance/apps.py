@@ -1,6 +1,55 @@
+import os
+import sys
+from pathlib import Path
+
 from django.apps import AppConfig
 
 
+def _serving() -> bool:
+    """Whether this process serves requests.
+
+    False for management commands (migrate, test, process_jobs, ...) and for
+    the parent process of runserver's autoreloader, which only watches files.
+    """
+    program = Path(sys.argv[0]).name if sys.argv else ''
+    if program not in ('manage.py', 'django-admin', 'django-admin.py'):
+        return True  # an ASGI/WSGI server importing the project
+    if len(sys.argv) < 2 or sys.argv[1] != 'runserver':
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+
+
 class SurveillanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'surveillance'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import inference_pool, metrics, profiler, quantization
+        from .camera_hub import CAMERA_HUB
+        from .cascade import CASCADE
+        from .events import BUS
+        from .evidence import EVIDENCE
+        from .services import follow_shared_events, get_backend
+
+        metrics.configure(enabled=getattr(settings, 'METRICS_ENABLED', True))
+        CASCADE.configure(**getattr(settings, 'ACTIVITY_CASCADE', {}))
+        CASCADE.share_presence(get_backend())
+        BUS.configure(history=getattr(settings, 'EVENTS_HISTORY', 500))
+        CAMERA_HUB.configure(**getattr(settings, 'CAMERA_SHARING', {}))
+        quantization.configure(**getattr(settings, 'QUANTIZATION', {}))
+        EVIDENCE.configure(**getattr(settings, 'EVIDENCE', {}))
+        profiler.configure(**getattr(settings, 'PROFILING', {}))
+        inference_pool.configure(getattr(settings, 'INFERENCE_ACTIVITY_DIR', None))
+
+        # Only processes that stream /api/events/ need to follow the shared event log
+        if _serving():
+            follow_shared_events()
+
+        # Start the workers with the server, so jobs left queued by a restart
+        # run without waiting for the first request that touches the queue
+        if getattr(settings, 'JOBS', {}).get('autostart', True) and _serving():
+            from .recording_jobs import get_queue
+
+            get_queue()
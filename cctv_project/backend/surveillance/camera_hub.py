@@ -0,0 +1,224 @@
+"""Camera-centric fan-out so viewers of one camera share its inference.
+
+Several dashboards watching the same camera each post frames for it. The hub
+makes inference cost follow cameras rather than viewers:
+
+- single-flight: while a model call for a camera is running, other requests
+  for that camera await the same future instead of starting their own;
+- coalescing: a result younger than the endpoint's window (about one
+  frame interval for detection, one classify interval for classification)
+  is returned as-is;
+- broadcast: every fresh result is published on the camera's own event bus,
+  so a viewer can subscribe to `/api/cameras/<id>/events/` and receive
+  results without posting frames at all.
+
+Sharing only applies to requests that name a camera (`cameraId`); a browser's
+local webcam without one is always its own source.
+
+Camera ids come from clients, so the hub stays bounded. A camera exists once
+frames were posted for it, or when it is listed in `cameras`. Subscribing to
+an unknown camera is refused instead of creating it. Each camera keeps at
+most `max_variants` parameter variants (confidence, frame count). Cameras
+idle for `idle_seconds`, and the least recently used ones beyond
+`max_cameras`, are evicted unless a request is in flight or a viewer is
+subscribed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable
+
+from .events import EventBus
+
+
+@dataclass
+class HubConfig:
+    enabled: bool = True
+    detect_window: float = 0.25
+    classify_window: float = 2.0
+    history: int = 16
+    cameras: list[str] = field(default_factory=list)
+    max_cameras: int = 64
+    max_variants: int = 8
+    idle_seconds: float = 300.0
+
+
+@dataclass
+class _Slot:
+    result: Any = None
+    produced_at: float = 0.0
+    in_flight: Future | None = None
+
+
+@dataclass
+class _Camera:
+    bus: EventBus
+    slots: OrderedDict[Hashable, _Slot] = field(default_factory=OrderedDict)
+    inferences: int = 0
+    shared: int = 0
+    last_result_at: float | None = None
+    last_used: float = 0.0
+
+    def busy(self) -> bool:
+        return self.bus.subscriber_count > 0 or any(s.in_flight is not None for s in self.slots.values())
+
+
+@dataclass
+class CameraHub:
+    config: HubConfig = field(default_factory=HubConfig)
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        # Least recently used first
+        self._cameras: OrderedDict[str, _Camera] = OrderedDict()
+        self._last_sweep = 0.0
+
+    def configure(self, **options: Any) -> None:
+        self.config = HubConfig(**{**self.config.__dict__, **options})
+
+    def _camera(self, camera_id: str, now: float) -> _Camera:
+        """Get or create a camera and mark it used; caller holds the lock."""
+        camera = self._cameras.get(camera_id)
+        if camera is None:
+            camera = self._cameras[camera_id] = _Camera(EventBus(history=self.config.history))
+        else:
+            self._cameras.move_to_end(camera_id)
+        camera.last_used = now
+        self._evict(now)
+        return camera
+
+    def _evict(self, now: float) -> None:
+        """Drop idle cameras and LRU ones beyond max_cameras; caller holds the lock."""
+        over = len(self._cameras) - max(1, self.config.max_cameras)
+        sweep = now - self._last_sweep > min(self.config.idle_seconds, 60.0)
+        if over <= 0 and not sweep:
+            return
+        if sweep:
+            self._last_sweep = now
+        pinned = set(self.config.cameras)
+        # Oldest first; never the camera that was just used (last)
+        for camera_id, camera in list(self._cameras.items())[:-1]:
+            idle = sweep and now - camera.last_used > self.config.idle_seconds
+            if over <= 0 and not idle:
+                if not sweep:
+                    break
+                continue
+            if camera_id in pinned or camera.busy():
+                continue
+            del self._cameras[camera_id]
+            over -= 1
+
+    def bus(self, camera_id: str) -> EventBus | None:
+        """The camera's event bus; None for a camera that is neither configured nor active."""
+        with self._lock:
+            if camera_id not in self._cameras and camera_id not in self.config.cameras:
+                return None
+            return self._camera(camera_id, time.monotonic()).bus
+
+    def latest(self, camera_id: str, kind: str) -> Any:
+        """Most recent result of `kind` for a camera, any parameters."""
+        best = None
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+            for key, slot in (camera.slots.items() if camera is not None else ()):
+                if key[1] == kind and slot.result is not None:
+                    if best is None or slot.produced_at > best.produced_at:
+                        best = slot
+        return best.result if best is not None else None
+
+    async def run(
+        self,
+        key: tuple[str, str, Any],
+        window: float,
+        submit: Callable[[], Future],
+        on_result: Callable[[EventBus, Any], None] | None = None,
+    ) -> tuple[Any, bool]:
+        """Return (result, shared) for key = (camera_id, kind, params).
+
+        `submit` starts the work (e.g. InferencePool.submit) and is only called
+        when there is neither a fresh result nor one in flight.
+        `on_result(bus, result)` runs once per fresh result, with the camera's
+        event bus, on the worker thread that produced it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            camera = self._camera(key[0], now)
+            slot = camera.slots.get(key)
+            if slot is None:
+                slot = camera.slots[key] = _Slot()
+                self._trim_variants(camera)
+            else:
+                camera.slots.move_to_end(key)
+            if slot.result is not None and now - slot.produced_at <= window:
+                camera.shared += 1
+                return slot.result, True
+            if slot.in_flight is not None:
+                camera.shared += 1
+                future, shared = slot.in_flight, True
+            else:
+                future, shared = submit(), False
+                slot.in_flight = future
+                camera.inferences += 1
+        if not shared:
+            # Outside the lock: the callback runs inline if the work already finished
+            future.add_done_callback(lambda f: self._store(key, slot, f, on_result))
+        # Shielded: one viewer disconnecting must not cancel the others' result
+        return await asyncio.shield(asyncio.wrap_future(future)), shared
+
+    def _trim_variants(self, camera: _Camera) -> None:
+        """Keep at most max_variants parameter slots, dropping the least recently used idle ones."""
+        excess = len(camera.slots) - max(1, self.config.max_variants)
+        for key in list(camera.slots):
+            if excess <= 0:
+                break
+            if camera.slots[key].in_flight is None:
+                del camera.slots[key]
+                excess -= 1
+
+    def _store(self, key: tuple[str, str, Any], slot: _Slot, future: Future,
+               on_result: Callable[[EventBus, Any], None] | None) -> None:
+        if future.cancelled() or future.exception() is not None:
+            result = None
+        else:
+            result = future.result()
+        with self._lock:
+            slot.in_flight = None
+            camera = self._cameras.get(key[0])
+            if result is None or camera is None or camera.slots.get(key) is not slot:
+                return  # failed, or the camera was evicted or reset meanwhile
+            slot.result = result
+            slot.produced_at = time.monotonic()
+            camera.last_result_at = time.time()
+            bus = camera.bus
+        if on_result is not None:
+            on_result(bus, result)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                camera_id: {
+                    'inferences': c.inferences,
+                    'sharedResponses': c.shared,
+                    'subscribers': c.bus.subscriber_count,
+                    'lastResultAt': c.last_result_at,
+                }
+                for camera_id, c in self._cameras.items()
+            }
+
+    def reset(self) -> None:
+        """Forget every camera; ones with connected viewers keep their bus (and stream) only."""
+        with self._lock:
+            for camera_id, camera in list(self._cameras.items()):
+                if camera.bus.subscriber_count:
+                    self._cameras[camera_id] = _Camera(camera.bus, last_used=camera.last_used)
+                else:
+                    del self._cameras[camera_id]
+
+
+CAMERA_HUB = CameraHub()
@@ -0,0 +1,190 @@
+"""Detection-gated activity classification.
+
+The person detector is cheap; the activity model is not. Per camera we
+remember when `/api/detect/` last saw people, and `/api/classify/` only runs
+the activity model when people are present or were seen within
+`presence_window` seconds. If the camera has no fresh detection at all, the
+classify call probes the detector on its latest frame first. That presence
+is kept in the state backend (`share_presence`), so with
+STATE_BACKEND=sqlite a detection handled by one worker gates the classify
+calls handled by the others.
+
+Raw verdicts are smoothed with hysteresis: the smoothed state only turns
+`suspicious` after `enter_count` consecutive suspicious verdicts and only
+returns to `normal` after `exit_count` consecutive normal ones (a skipped
+classification counts as normal, reported with the classifier's last
+confidence for `normal`), so one noisy frame neither starts nor stops an
+alert.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+
+class PresenceStore(Protocol):
+    def record_presence(self, camera_id: str, people: bool, now: float) -> None: ...
+
+    def presence(self, camera_id: str) -> tuple[float | None, float | None]: ...
+
+
+@dataclass
+class CascadeConfig:
+    enabled: bool = True
+    presence_window: float = 3.0
+    enter_count: int = 2
+    exit_count: int = 3
+
+
+@dataclass
+class CameraCascadeState:
+    last_detect_at: float | None = None
+    last_people_at: float | None = None
+    smoothed: str = 'normal'
+    confidence: float = 0.0
+    # Most recent classifier confidence per label, reused for skipped calls
+    label_confidence: dict[str, float] = field(default_factory=dict)
+    streak_label: str = 'normal'
+    streak: int = 0
+    classifier_runs: int = 0
+    classifier_skipped: int = 0
+    detector_probes: int = 0
+
+
+@dataclass(frozen=True)
+class SmoothedVerdict:
+    prediction: str
+    confidence: float
+    changed: bool
+    skipped: bool
+
+
+@dataclass
+class DetectionCascade:
+    config: CascadeConfig = field(default_factory=CascadeConfig)
+    cameras: dict[str, CameraCascadeState] = field(default_factory=dict)
+    # Where presence is kept; None keeps it in `cameras` (this process only)
+    presence_store: PresenceStore | None = None
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def configure(self, **options: Any) -> None:
+        self.config = CascadeConfig(**{**self.config.__dict__, **options})
+
+    def share_presence(self, store: PresenceStore | None) -> None:
+        self.presence_store = store
+
+    def _camera(self, camera_id: str) -> CameraCascadeState:
+        state = self.cameras.get(camera_id)
+        if state is None:
+            state = self.cameras.setdefault(camera_id, CameraCascadeState())
+        return state
+
+    def record_detections(self, camera_id: str, count: int, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        if self.presence_store is not None:
+            self.presence_store.record_presence(camera_id, count > 0, now)
+            return
+        with self._lock:
+            state = self._camera(camera_id)
+            state.last_detect_at = now
+            if count > 0:
+                state.last_people_at = now
+
+    def _presence(self, camera_id: str) -> tuple[float | None, float | None]:
+        """(last detector result, last detection with people)."""
+        if self.presence_store is not None:
+            return self.presence_store.presence(camera_id)
+        with self._lock:
+            state = self._camera(camera_id)
+            return state.last_detect_at, state.last_people_at
+
+    def needs_probe(self, camera_id: str, now: float | None = None) -> bool:
+        """True when there is no detector result fresh enough to gate on."""
+        if not self.config.enabled:
+            return False
+        now = time.time() if now is None else now
+        last = self._presence(camera_id)[0]
+        return last is None or now - last > self.config.presence_window
+
+    def record_probe(self, camera_id: str, count: int, now: float | None = None) -> None:
+        self.record_detections(camera_id, count, now)
+        with self._lock:
+            self._camera(camera_id).detector_probes += 1
+
+    def should_classify(self, camera_id: str, now: float | None = None) -> bool:
+        if not self.config.enabled:
+            return True
+        now = time.time() if now is None else now
+        last = self._presence(camera_id)[1]
+        return last is not None and now - last <= self.config.presence_window
+
+    def smoothed(self, camera_id: str) -> str:
+        """The camera's current smoothed verdict ('normal' for an unknown camera)."""
+        with self._lock:
+            state = self.cameras.get(camera_id)
+            return state.smoothed if state is not None else 'normal'
+
+    def record_skip(self, camera_id: str) -> SmoothedVerdict:
+        with self._lock:
+            state = self._camera(camera_id)
+            state.classifier_skipped += 1
+            confidence = state.label_confidence.get('normal', state.confidence)
+            return self._vote(state, 'normal', confidence, skipped=True)
+
+    def record_result(self, camera_id: str, prediction: str, confidence: float) -> SmoothedVerdict:
+        with self._lock:
+            state = self._camera(camera_id)
+            state.classifier_runs += 1
+            state.label_confidence[prediction] = confidence
+            if not self.config.enabled:
+                changed = prediction != state.smoothed
+                state.smoothed, state.confidence = prediction, confidence
+                return SmoothedVerdict(prediction, confidence, changed, skipped=False)
+            return self._vote(state, prediction, confidence, skipped=False)
+
+    def _vote(self, state: CameraCascadeState, label: str, confidence: float, *, skipped: bool) -> SmoothedVerdict:
+        if label == state.streak_label:
+            state.streak += 1
+        else:
+            state.streak_label, state.streak = label, 1
+
+        changed = False
+        if state.smoothed != 'suspicious' and label == 'suspicious' and state.streak >= self.config.enter_count:
+            state.smoothed, changed = 'suspicious', True
+        elif state.smoothed == 'suspicious' and label != 'suspicious' and state.streak >= self.config.exit_count:
+            state.smoothed, changed = 'normal', True
+
+        if changed or (label == state.smoothed and not skipped):
+            state.confidence = confidence
+        return SmoothedVerdict(state.smoothed, state.confidence, changed, skipped)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            cameras = {
+                camera_id: {
+                    'state': s.smoothed,
+                    'classifierRuns': s.classifier_runs,
+                    'classifierSkipped': s.classifier_skipped,
+                    'detectorProbes': s.detector_probes,
+                }
+                for camera_id, s in self.cameras.items()
+            }
+        runs = sum(c['classifierRuns'] for c in cameras.values())
+        skipped = sum(c['classifierSkipped'] for c in cameras.values())
+        return {
+            'enabled': self.config.enabled,
+            'classifierRuns': runs,
+            'classifierSkipped': skipped,
+            'skipRatio': round(skipped / (runs + skipped), 4) if runs + skipped else 0.0,
+            'cameras': cameras,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.cameras.clear()
+
+
+CASCADE = DetectionCascade()
@@ -0,0 +1,191 @@
+"""Compact columnar encoding for detection and state responses.
+
+Served instead of JSON when the client sends
+`Accept: application/vnd.cctv.columnar`. Every list of flat records (the
+`detections` of /api/detect/, the `alerts` of /api/state/) becomes a table
+whose columns are packed buffers; everything else stays JSON in the header.
+
+Numbers are stored as fixed-point integers: a column whose values all have
+at most `scale` decimals is sent as int16/int32 codes and decoded as
+`code / 10**scale`. Division is correctly rounded, so this yields exactly the
+float that parsing the JSON text would; float16/float32 buffers could not
+promise that for values like 12.34. Columns that don't fit fall back to
+float64. Strings are dictionary-encoded (uint8/uint16 codes).
+
+Layout (little-endian)::
+
+    b'CCOL' | u8 version | u32 header length | header (UTF-8 JSON) | column buffers
+
+The header is `{"data": <payload with tables replaced by {"$table": i}>,
+"tables": [[rows, columns], ...]}`. A column is `[name, kind, dtype, param]`
+plus, if some rows lack the key, the list of those row indices. Kinds: `i`
+int, `f` fixed-point (param = scale), `d` float64, `s` dictionary strings
+(param = the strings), `j` plain JSON (param = the values, no buffer).
+Buffers follow each other in table/column order with no padding; a column
+holds one item per row that has the key. `decode()` is the reference
+decoder.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any
+
+MEDIA_TYPE = 'application/vnd.cctv.columnar'
+MAGIC = b'CCOL'
+VERSION = 1
+MAX_SCALE = 6
+
+_PREAMBLE = struct.Struct('<4sBI')
+_INT_RANGES = (('h', -(2 ** 15), 2 ** 15 - 1), ('i', -(2 ** 31), 2 ** 31 - 1))
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _is_table(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and bool(value)
+        and all(isinstance(row, dict) and all(isinstance(v, _SCALARS) for v in row.values()) for row in value)
+    )
+
+
+def _int_dtype(codes: list[int]) -> str | None:
+    lo, hi = min(codes), max(codes)
+    for dtype, min_value, max_value in _INT_RANGES:
+        if min_value <= lo and hi <= max_value:
+            return dtype
+    return None
+
+
+def _fixed_point(values: list[float]) -> tuple[int, list[int]] | None:
+    """Decimal scale and integer codes that reproduce every value exactly.
+
+    repr() is the shortest string that round-trips (what the JSON renderer
+    emits), so its digit count after the point is the scale to use.
+    """
+    texts = list(map(repr, values))
+    if any('e' in t or 'n' in t for t in texts):  # exponent form, inf, nan
+        return None
+    if '-0.0' in texts:  # integer code 0 has no sign
+        return None
+    scale = max(len(t) - t.index('.') - 1 for t in texts)
+    if scale > MAX_SCALE:
+        return None
+    factor = 10 ** scale
+    codes = [round(v * factor) for v in values]
+    if any(code / factor != v for code, v in zip(codes, values)):
+        return None
+    return scale, codes
+
+
+def _encode_column(values: list[Any], buffers: bytearray) -> list[Any]:
+    """Pack one column; returns its [kind, dtype, param] descriptor."""
+
+    def pack(kind: str, dtype: str, items: list[Any], param: Any = None) -> list[Any]:
+        buffers.extend(struct.pack(f'<{len(items)}{dtype}', *items))
+        return [kind, dtype, param]
+
+    types = {type(v) for v in values}
+    if types == {str}:
+        table = list(dict.fromkeys(values))
+        index = {s: i for i, s in enumerate(table)}
+        return pack('s', 'B' if len(table) <= 0xFF else 'H', [index[v] for v in values], table)
+    if types == {int}:
+        dtype = _int_dtype(values)
+        if dtype is not None:
+            return pack('i', dtype, values)
+    elif types == {float}:
+        fixed = _fixed_point(values)
+        if fixed is not None:
+            scale, codes = fixed
+            dtype = _int_dtype(codes)
+            if dtype is not None:
+                return pack('f', dtype, codes, scale)
+        return pack('d', 'd', values)
+    # Mixed types (e.g. int and float, or None) stay as JSON so each value keeps its type
+    return ['j', None, values]
+
+
+def _encode_table(rows: list[dict[str, Any]], buffers: bytearray) -> list[Any]:
+    columns = []
+    for name in dict.fromkeys(key for row in rows for key in row):
+        present, missing = [], []
+        for i, row in enumerate(rows):
+            if name in row:
+                present.append(row[name])
+            else:
+                missing.append(i)
+        column = [name, *_encode_column(present, buffers)]
+        if missing:
+            column.append(missing)
+        columns.append(column)
+    return [len(rows), columns]
+
+
+def encode(payload: Any) -> bytes:
+    tables: list[dict[str, Any]] = []
+    buffers = bytearray()
+
+    def walk(value: Any) -> Any:
+        if _is_table(value):
+            tables.append(_encode_table(value, buffers))
+            return {'$table': len(tables) - 1}
+        if isinstance(value, dict):
+            return {k: walk(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        return value
+
+    header = json.dumps({'data': walk(payload), 'tables': tables}, separators=(',', ':')).encode('utf-8')
+    return _PREAMBLE.pack(MAGIC, VERSION, len(header)) + header + bytes(buffers)
+
+
+def _decode_column(kind: str, dtype: str | None, param: Any, count: int, body: memoryview, offset: int) -> tuple[list[Any], int]:
+    if kind == 'j':
+        return param, offset
+    end = offset + count * struct.calcsize(dtype)
+    items = list(struct.unpack(f'<{count}{dtype}', body[offset:end]))
+    if kind == 's':
+        items = [param[i] for i in items]
+    elif kind == 'f':
+        factor = 10 ** param
+        items = [code / factor for code in items]
+    return items, end
+
+
+def _decode_table(table: list[Any], body: memoryview, offset: int) -> tuple[list[dict[str, Any]], int]:
+    count, columns = table
+    rows: list[dict[str, Any]] = [{} for _ in range(count)]
+    for name, kind, dtype, param, *rest in columns:
+        missing = set(rest[0]) if rest else set()
+        values, offset = _decode_column(kind, dtype, param, count - len(missing), body, offset)
+        present = iter(values)
+        for i, row in enumerate(rows):
+            if i not in missing:
+                row[name] = next(present)
+    return rows, offset
+
+
+def decode(data: bytes) -> Any:
+    magic, version, header_len = _PREAMBLE.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a columnar payload')
+    start = _PREAMBLE.size
+    header = json.loads(bytes(data[start:start + header_len]))
+    body = memoryview(data)[start + header_len:]
+    tables, offset = [], 0
+    for table in header['tables']:
+        rows, offset = _decode_table(table, body, offset)
+        tables.append(rows)
+
+    def walk(value: Any) -> Any:
+        if isinstance(value, dict):
+            if value.keys() == {'$table'}:
+                return tables[value['$table']]
+            return {k: walk(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        return value
+
+    return walk(header['data'])
@@ -0,0 +1,240 @@
+"""In-process event bus for the `/api/events/` Server-Sent Events stream.
+
+Alerts and state changes are published once and fanned out to every
+connected dashboard, so idle clients cost nothing between events. The last
+`history` events are kept in a ring buffer; a client reconnecting with
+`Last-Event-ID` gets everything it missed replayed before live events.
+
+SSE ids are `<epoch>-<n>`. The epoch is random per bus, so an id from
+another process, from before a restart, or from a bus that was since
+recreated is recognised as foreign. A client whose id is foreign, newer
+than anything published, or older than the ring gets a fresh `snapshot`
+instead of a replay that would silently miss events.
+
+With a shared state backend the bus *follows* its event log instead
+(`follow`): events are appended to the log by whichever process raised
+them, and every serving process polls the log and publishes the rows with
+their row id as the event id and the log's epoch. Ids then mean the same
+thing in every worker, so a client can resume on any of them, and events
+raised in `process_jobs` reach the dashboards too.
+
+Subscribers are either async (ASGI, an asyncio.Queue fed with
+call_soon_threadsafe) or sync (WSGI/runserver, a queue.Queue). Each queue is
+bounded; a subscriber that falls behind is closed and simply resumes from
+its last event id when the browser reconnects.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Iterator, Protocol
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class EventLog(Protocol):
+    """A shared, append-only event log (see state_backends.SQLiteStateBackend)."""
+
+    def event_epoch(self) -> str: ...
+
+    def last_event_id(self) -> int: ...
+
+    def events_after(self, event_id: int, limit: int = 500) -> list[tuple[int, str, dict[str, Any]]]: ...
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: dict[str, Any]
+    epoch: str = ''
+
+    def encode(self) -> str:
+        sse_id = f'{self.epoch}-{self.id}' if self.epoch else self.id
+        return f"id: {sse_id}\nevent: {self.type}\ndata: {json.dumps(self.data, separators=(',', ':'))}\n\n"
+
+
+class _Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop | None) -> None:
+        self.loop = loop
+        self.queue: asyncio.Queue | queue.Queue = (
+            asyncio.Queue(SUBSCRIBER_QUEUE_SIZE) if loop is not None else queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        )
+        self.overflowed = False
+
+    def offer(self, event: Event) -> None:
+        if self.loop is None:
+            self._put(event)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # event loop already closed
+            self.overflowed = True
+
+    def _put(self, event: Event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except (asyncio.QueueFull, queue.Full):
+            self.overflowed = True
+
+
+class EventBus:
+    def __init__(self, history: int = 500) -> None:
+        self._lock = threading.Lock()
+        self._history: deque[Event] = deque(maxlen=history)
+        self._next_id = 1
+        self._subscribers: set[_Subscription] = set()
+        self._follower: threading.Thread | None = None
+        self._stop_following = threading.Event()
+        self.epoch = uuid.uuid4().hex[:8]
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def configure(self, *, history: int) -> None:
+        with self._lock:
+            self._history = deque(self._history, maxlen=max(1, int(history)))
+
+    def publish(self, event_type: str, data: dict[str, Any], event_id: int | None = None) -> Event:
+        """Fan an event out to subscribers; `event_id` (increasing) is given when following a log."""
+        with self._lock:
+            event = Event(self._next_id if event_id is None else event_id, event_type, data, self.epoch)
+            self._next_id = event.id + 1
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.offer(event)
+        return event
+
+    def follow(self, log: EventLog, poll_interval: float = 0.25) -> None:
+        """Publish the shared log's events from now on, in a background thread (idempotent).
+
+        Takes over the log's epoch and primes the history with its latest
+        events, so clients resume across workers and restarts.
+        """
+        with self._lock:
+            if self._follower is not None:
+                return
+            self._stop_following.clear()
+            self.epoch = log.event_epoch()
+            self._history.clear()
+            self._next_id = log.last_event_id() + 1
+            rows = log.events_after(max(0, self._next_id - 1 - self._history.maxlen), self._history.maxlen)
+            for event_id, event_type, data in rows:
+                self._history.append(Event(event_id, event_type, data, self.epoch))
+            self._follower = threading.Thread(
+                target=self._follow, args=(log, poll_interval), name='event-log-follower', daemon=True
+            )
+        self._follower.start()
+
+    def _follow(self, log: EventLog, poll_interval: float) -> None:
+        while not self._stop_following.is_set():
+            try:
+                for event_id, event_type, data in log.events_after(self.last_id):
+                    self.publish(event_type, data, event_id)
+            except Exception:
+                logger.exception('Reading the shared event log failed')
+            self._stop_following.wait(poll_interval)
+
+    def unfollow(self) -> None:
+        """Stop following the shared log (publishing keeps working, with this bus's own ids)."""
+        with self._lock:
+            follower, self._follower = self._follower, None
+        if follower is not None:
+            self._stop_following.set()
+            follower.join()
+
+    def _resume_point(self, last_event_id: str | None) -> int | None:
+        """The id to replay after, or None when `last_event_id` can't be resumed from here (lock held)."""
+        epoch, _, number = (last_event_id or '').rpartition('-')
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        after = int(number)
+        oldest = self._history[0].id if self._history else self._next_id
+        # Newer than anything published here, or events after it fell out of the ring
+        return after if oldest - 1 <= after < self._next_id else None
+
+    def _subscribe(self, last_event_id: str | None, loop: asyncio.AbstractEventLoop | None):
+        """Register a subscriber and take its backlog atomically (no gaps).
+
+        Returns (subscription, id replayed up to, backlog or None if a snapshot is needed).
+        """
+        sub = _Subscription(loop)
+        with self._lock:
+            self._subscribers.add(sub)
+            after = self._resume_point(last_event_id)
+            if after is None:
+                return sub, self._next_id - 1, None
+            return sub, after, [e for e in self._history if e.id > after]
+
+    def _opening(self, sent: int, backlog: list[Event] | None, snapshot: Callable[[], dict[str, Any]]) -> list[Event]:
+        return backlog if backlog is not None else [Event(sent, 'snapshot', snapshot(), self.epoch)]
+
+    def _unsubscribe(self, sub: _Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    async def stream(
+        self, last_event_id: str | None, heartbeat: float, snapshot: Callable[[], dict[str, Any]]
+    ) -> AsyncIterator[Event | None]:
+        """Yield a snapshot or the replay, then live events; None means "send a heartbeat"."""
+        sub, sent, backlog = self._subscribe(last_event_id, asyncio.get_running_loop())
+        try:
+            for event in self._opening(sent, backlog, snapshot):
+                sent = event.id
+                yield event
+            while not sub.overflowed:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event.id > sent:
+                    sent = event.id
+                    yield event
+        finally:
+            self._unsubscribe(sub)
+
+    def stream_sync(
+        self, last_event_id: str | None, heartbeat: float, snapshot: Callable[[], dict[str, Any]]
+    ) -> Iterator[Event | None]:
+        """Blocking variant of `stream` for WSGI servers (one thread per client)."""
+        sub, sent, backlog = self._subscribe(last_event_id, None)
+        try:
+            for event in self._opening(sent, backlog, snapshot):
+                sent = event.id
+                yield event
+            while not sub.overflowed:
+                try:
+                    event = sub.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield None
+                    continue
+                if event.id > sent:
+                    sent = event.id
+                    yield event
+        finally:
+            self._unsubscribe(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def heartbeat_comment() -> str:
+    return f": heartbeat {int(time.time())}\n\n"
+
+
+BUS = EventBus()
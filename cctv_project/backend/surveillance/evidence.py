@@ -0,0 +1,388 @@
+"""Alert evidence: the encoded frames around each suspicious verdict.
+
+Every frame a camera sends to `/api/detect/`, plus the last frame of each
+`/api/classify/` clip, goes into a small per-camera ring. Frames stay
+encoded: the request's base64 string is kept by reference, so it is neither
+copied nor decoded. When an alert fires, the evidence is:
+
+- the ring's last `pre_frames`, minus frames that are also in the clip
+  (the dashboard sends each clip frame to `/api/detect/` as well);
+- the clip that triggered the alert (`trigger_frames`, picked evenly), each
+  frame stamped with its capture time when the client sent `frameTimes`,
+  else with the time the ring saw it, else with the alert time;
+- the camera's next `post_frames` frames, or whatever arrived within
+  `post_timeout` seconds.
+
+These are written as one record on a background thread, never on the
+request path.
+
+Records are appended to fixed-size segment files (`segment_mb`) under
+`path`, and read back through mmap. A SQLite index maps each alert ID to
+(segment, offset, length) and to each frame's position inside the record.
+Fetching an alert's evidence is therefore one index lookup plus one
+contiguous read. Each process appends to its own active segment; segment
+IDs come from the shared index. Once the segments exceed `max_mb`, the
+oldest sealed ones are deleted together with their index rows.
+
+Memory is bounded to `pre_frames` frames and `ring_mb` per camera for at
+most `max_cameras` cameras (the least recently seen one's ring is dropped
+first), plus the alerts still collecting their post frames.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import mmap
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.sqlite3'
+DEFAULT_MIME = 'image/jpeg'
+# An unsealed segment this long untouched belongs to a process that is gone
+ABANDONED_SEGMENT_SECONDS = 3600
+
+
+@dataclass
+class EvidenceConfig:
+    enabled: bool = True
+    path: str = 'evidence'
+    pre_frames: int = 5
+    post_frames: int = 5
+    trigger_frames: int = 8
+    post_timeout: float = 10.0
+    ring_mb: float = 4.0
+    max_cameras: int = 64
+    segment_mb: float = 64.0
+    max_mb: float = 1024.0
+
+
+def _decode_frame(frame: str) -> tuple[bytes, str]:
+    """(image bytes, MIME type) from a data URL or bare base64 string."""
+    mime = DEFAULT_MIME
+    if frame.startswith('data:') and ',' in frame:
+        header, frame = frame.split(',', 1)
+        mime = header[5:].split(';', 1)[0] or DEFAULT_MIME
+    return base64.b64decode(frame), mime
+
+
+def _evenly(items: list, limit: int) -> list:
+    if limit <= 0:
+        return []
+    if len(items) <= limit:
+        return items
+    step = len(items) / limit
+    return [items[int(i * step)] for i in range(limit)]
+
+
+class EvidenceArchive:
+    """Append-only segment files plus an offset index."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS segments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            sealed INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS evidence (
+            alert_id TEXT PRIMARY KEY,
+            camera_id TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            segment_id INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            frames TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS evidence_segment ON evidence (segment_id);
+    """
+
+    def __init__(self, root: str | Path, segment_bytes: int, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.segment_bytes = max(1, int(segment_bytes))
+        self.max_bytes = max(self.segment_bytes, int(max_bytes))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active: tuple[int, Any] | None = None  # (segment id, append handle)
+        self.root.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / INDEX_FILE, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+        return conn
+
+    def _segment_path(self, segment_id: int) -> Path:
+        return self.root / f'{segment_id:08d}.bin'
+
+    def _seal_active(self) -> None:
+        if self._active is None:
+            return
+        segment_id, handle = self._active
+        handle.close()
+        self._conn().execute('UPDATE segments SET sealed = 1 WHERE id = ?', (segment_id,))
+        self._active = None
+
+    def append(self, alert_id: str, camera_id: str, frames: list[tuple[bytes, str, str, float]]) -> dict[str, Any]:
+        """Write one record of (data, role, mime, ts) frames; returns its index entry."""
+        record = b''.join(data for data, _, _, _ in frames)
+        layout, position = [], 0
+        for data, role, mime, ts in frames:
+            layout.append([position, len(data), role, mime, round(ts, 3)])
+            position += len(data)
+
+        with self._lock:
+            conn = self._conn()
+            if self._active is not None and (
+                self._active[1].tell() + len(record) > self.segment_bytes
+                or conn.execute('SELECT 1 FROM segments WHERE id = ?', (self._active[0],)).fetchone() is None
+            ):
+                self._seal_active()
+            if self._active is None:
+                segment_id = conn.execute(
+                    'INSERT INTO segments (created_at, updated_at) VALUES (?, ?)', (time.time(), time.time())
+                ).lastrowid
+                self._active = (segment_id, open(self._segment_path(segment_id), 'ab'))
+            segment_id, handle = self._active
+            offset = handle.tell()
+            handle.write(record)
+            handle.flush()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    'UPDATE segments SET bytes = ?, updated_at = ? WHERE id = ?',
+                    (offset + len(record), time.time(), segment_id),
+                )
+                # Plain INSERT: a reused alert ID fails loudly instead of orphaning the earlier record
+                conn.execute(
+                    'INSERT INTO evidence (alert_id, camera_id, created_at, segment_id, offset, length, frames) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (alert_id, camera_id, time.time(), segment_id, offset, len(record), json.dumps(layout)),
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            self._enforce_quota()
+        return {'alertId': alert_id, 'segment': segment_id, 'offset': offset, 'length': len(record)}
+
+    def _enforce_quota(self) -> None:
+        conn = self._conn()
+        total = conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM segments').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = conn.execute(
+            'SELECT id, bytes FROM segments WHERE (sealed = 1 OR updated_at < ?) AND id != ? ORDER BY id',
+            (time.time() - ABANDONED_SEGMENT_SECONDS, self._active[0] if self._active else -1),
+        ).fetchall()
+        for row in victims:
+            if total <= self.max_bytes:
+                break
+            # Index rows first: a concurrent fetch then misses cleanly instead of reading a deleted file
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM evidence WHERE segment_id = ?', (row['id'],))
+                conn.execute('DELETE FROM segments WHERE id = ?', (row['id'],))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            try:
+                self._segment_path(row['id']).unlink(missing_ok=True)
+            except OSError as e:  # e.g. still mapped by another process on Windows
+                logger.warning('Could not delete evidence segment %s: %s', row['id'], e)
+            total -= row['bytes']
+
+    def _read(self, segment_id: int, offset: int, length: int) -> bytes | None:
+        # Mapped per read rather than cached: a lingering map would keep a segment
+        # another process deleted for the quota from freeing its disk space
+        try:
+            with open(self._segment_path(segment_id), 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if offset + length > len(mapped):
+                    return None
+                return mapped[offset:offset + length]
+        except (FileNotFoundError, ValueError):  # deleted, or empty (mmap of 0 bytes)
+            return None
+
+    def get(self, alert_id: str) -> dict[str, Any] | None:
+        """An alert's evidence: metadata plus frames as (data, role, mime, ts), in one read."""
+        row = self._conn().execute('SELECT * FROM evidence WHERE alert_id = ?', (alert_id,)).fetchone()
+        if row is None:
+            return None
+        record = self._read(row['segment_id'], row['offset'], row['length'])
+        if record is None:
+            return None
+        return {
+            'alertId': row['alert_id'],
+            'cameraId': row['camera_id'],
+            'createdAt': row['created_at'],
+            'frames': [
+                (record[start:start + size], role, mime, ts)
+                for start, size, role, mime, ts in json.loads(row['frames'])
+            ],
+        }
+
+    def usage(self) -> dict[str, Any]:
+        segments, total = self._conn().execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM segments').fetchone()
+        records = self._conn().execute('SELECT COUNT(*) FROM evidence').fetchone()[0]
+        return {'bytes': total, 'maxBytes': self.max_bytes, 'segments': segments, 'records': records}
+
+    def close(self) -> None:
+        with self._lock:
+            self._seal_active()
+
+
+@dataclass
+class _PendingEvidence:
+    alert_id: str
+    camera_id: str
+    frames: list[tuple[str, str, float]]  # (encoded frame, role, ts)
+    remaining: int
+    timer: threading.Timer | None = None
+
+
+@dataclass
+class EvidenceStore:
+    config: EvidenceConfig = field(default_factory=EvidenceConfig)
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rings: OrderedDict[str, deque[tuple[float, str]]] = OrderedDict()
+        self._ring_bytes: dict[str, int] = {}
+        self._pending: dict[str, _PendingEvidence] = {}
+        self._archive: EvidenceArchive | None = None
+
+    def configure(self, **options: Any) -> None:
+        self.config = EvidenceConfig(**{**self.config.__dict__, **options})
+
+    def archive(self) -> EvidenceArchive:
+        with self._lock:
+            if self._archive is None:
+                self._archive = EvidenceArchive(
+                    self.config.path,
+                    int(self.config.segment_mb * 1024 * 1024),
+                    int(self.config.max_mb * 1024 * 1024),
+                )
+            return self._archive
+
+    def observe(self, camera_id: str, frame: str) -> None:
+        """Remember a camera's latest encoded frame (by reference)."""
+        if not self.config.enabled or not isinstance(frame, str):
+            return
+        now = time.time()
+        completed = []
+        with self._lock:
+            ring = self._rings.get(camera_id)
+            if ring is None:
+                ring = self._rings[camera_id] = deque()
+                self._ring_bytes[camera_id] = 0
+                while len(self._rings) > max(1, self.config.max_cameras):
+                    evicted, _ = self._rings.popitem(last=False)
+                    del self._ring_bytes[evicted]
+            else:
+                self._rings.move_to_end(camera_id)
+            ring.append((now, frame))
+            self._ring_bytes[camera_id] += len(frame)
+            cap = self.config.ring_mb * 1024 * 1024
+            while ring and (len(ring) > self.config.pre_frames or self._ring_bytes[camera_id] > cap):
+                _, dropped = ring.popleft()
+                self._ring_bytes[camera_id] -= len(dropped)
+
+            for pending in self._pending.values():
+                if pending.camera_id == camera_id and pending.remaining > 0:
+                    pending.frames.append((frame, 'after', now))
+                    pending.remaining -= 1
+                    if pending.remaining == 0:
+                        completed.append(pending)
+        for pending in completed:
+            self._write_async(pending)
+
+    def capture(self, alert_id: str, camera_id: str, trigger: list[str], frame_times: list[float] | None = None) -> None:
+        """Start collecting evidence for an alert; it is archived once the post frames arrive.
+
+        `frame_times` are the clip frames' capture times (epoch seconds), when known.
+        """
+        if not self.config.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            if alert_id in self._pending:
+                logger.warning('Evidence for %s is already being collected; ignoring the repeat', alert_id)
+                return
+            ring = self._rings.get(camera_id, ())
+            clip = set(trigger)
+            seen_at = {frame: ts for ts, frame in ring if frame in clip}
+            before = [(frame, 'before', ts) for ts, frame in ring if frame not in clip]
+            times = frame_times if frame_times is not None else [seen_at.get(frame, now) for frame in trigger]
+            picked = _evenly(list(zip(trigger, times)), self.config.trigger_frames)
+            frames = before + [(frame, 'trigger', ts) for frame, ts in picked]
+            pending = _PendingEvidence(alert_id, camera_id, frames, max(0, self.config.post_frames))
+            if pending.remaining:
+                pending.timer = threading.Timer(self.config.post_timeout, self._expire, args=(alert_id,))
+                pending.timer.daemon = True
+            self._pending[alert_id] = pending
+        if pending.remaining:
+            pending.timer.start()
+        else:
+            self._write_async(pending)
+
+    def _expire(self, alert_id: str) -> None:
+        """Post-frame timeout: archive with the frames that did arrive."""
+        with self._lock:
+            pending = self._pending.get(alert_id)
+            if pending is None or pending.remaining == 0:  # already complete and being written
+                return
+            pending.remaining = 0
+        self._write(pending)
+
+    def _write_async(self, pending: _PendingEvidence) -> None:
+        if pending.timer is not None:
+            pending.timer.cancel()
+        threading.Thread(target=self._write, args=(pending,), name='evidence-writer', daemon=True).start()
+
+    def _write(self, pending: _PendingEvidence) -> None:
+        try:
+            frames = []
+            for frame, role, ts in pending.frames:
+                data, mime = _decode_frame(frame)
+                frames.append((data, role, mime, ts))
+            self.archive().append(pending.alert_id, pending.camera_id, frames)
+        except Exception:
+            logger.exception('Failed to archive evidence for %s', pending.alert_id)
+        finally:
+            # Pending until written, so a fetch never sees neither
+            with self._lock:
+                self._pending.pop(pending.alert_id, None)
+
+    def is_pending(self, alert_id: str) -> bool:
+        with self._lock:
+            return alert_id in self._pending
+
+    def get(self, alert_id: str) -> dict[str, Any] | None:
+        return self.archive().get(alert_id)
+
+    def usage(self) -> dict[str, Any]:
+        with self._lock:
+            ring_bytes = sum(self._ring_bytes.values())
+            pending = len(self._pending)
+        return {**self.archive().usage(), 'ringBytes': ring_bytes, 'pendingAlerts': pending}
+
+
+EVIDENCE = EvidenceStore()
@@ -0,0 +1,188 @@
+"""Bounded executors for model inference.
+
+Each pool owns a small thread pool plus a slot semaphore sized
+`workers + queue_depth`. When every slot is taken `submit()` raises
+`InferencePoolFull` immediately instead of queueing, so the async views can
+shed load with a fast 503 rather than letting requests pile up in memory.
+
+Pools are keyed by the endpoint's URL name (the same label the metrics use)
+and configured by settings.INFERENCE_POOLS, e.g.
+    {'detect-humans': {'workers': 1, 'queue_depth': 4}}
+
+Background work in other processes (e.g. `manage.py process_jobs`) needs to
+know when live requests are running. While any pool in a process has
+requests in flight, that process keeps a marker file named after its host and
+pid in the activity directory (settings.INFERENCE_ACTIVITY_DIR), refreshing
+its mtime on each submit. `live_busy()` checks this process's pools and any
+fresh marker. A marker left behind by a crashed process counts only for
+`ACTIVITY_STALE_SECONDS`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL = {'workers': 1, 'queue_depth': 4}
+ACTIVITY_STALE_SECONDS = 30.0
+
+
+class InferencePoolFull(Exception):
+    """Raised when a pool has no free worker or queue slot."""
+
+
+class InferencePool:
+    def __init__(self, name: str, workers: int, queue_depth: int) -> None:
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.queue_depth = max(0, int(queue_depth))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f'inference-{name}')
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_depth)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise InferencePoolFull(self.name)
+
+        queued_at = time.perf_counter()
+
+        def call() -> Any:
+            metrics.observe_stage(self.name, 'queue_wait', time.perf_counter() - queued_at)
+            return fn(*args, **kwargs)
+
+        try:
+            future = self._executor.submit(call)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_flight += 1
+        _activity.enter()
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run fn on the pool and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        _activity.leave()
+        self._slots.release()
+
+
+_pools: dict[str, InferencePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> InferencePool:
+    pool = _pools.get(name)
+    if pool is None:
+        from django.conf import settings
+
+        config = {**DEFAULT_POOL, **getattr(settings, 'INFERENCE_POOLS', {}).get(name, {})}
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = InferencePool(name, config['workers'], config['queue_depth'])
+                _pools[name] = pool
+    return pool
+
+
+def live_in_flight() -> int:
+    """Requests currently queued or running across every pool in this process."""
+    return sum(pool.in_flight for pool in list(_pools.values()))
+
+
+class _Activity:
+    """This process's marker file: present while any pool has requests in flight."""
+
+    def __init__(self) -> None:
+        self.directory: Path | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._touched = 0.0
+
+    @property
+    def marker(self) -> Path | None:
+        return self.directory / f'{socket.gethostname()}-{os.getpid()}' if self.directory else None
+
+    def enter(self) -> None:
+        marker = self.marker
+        if marker is None:
+            return
+        with self._lock:
+            self._in_flight += 1
+            now = time.monotonic()
+            if self._in_flight > 1 and now - self._touched < 1.0:
+                return
+            self._touched = now
+            try:
+                marker.touch()
+            except OSError as e:
+                logger.warning('Cannot write inference activity marker %s: %s', marker, e)
+
+    def leave(self) -> None:
+        marker = self.marker
+        if marker is None:
+            return
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if self._in_flight == 0:
+                marker.unlink(missing_ok=True)
+
+    def others_busy(self) -> bool:
+        if self.directory is None:
+            return False
+        own, cutoff = self.marker.name, time.time() - ACTIVITY_STALE_SECONDS
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.name != own and entry.stat().st_mtime >= cutoff:
+                            return True
+                    except FileNotFoundError:  # its process just went idle
+                        continue
+        except OSError:
+            pass
+        return False
+
+
+_activity = _Activity()
+
+
+def configure(activity_dir: str | Path | None = None) -> None:
+    """Set (or with None, disable) the shared directory for activity markers."""
+    directory = Path(activity_dir) if activity_dir else None
+    if directory is not None:
+        directory.mkdir(parents=True, exist_ok=True)
+        # Markers of processes that crashed mid-request
+        cutoff = time.time() - 3600
+        for marker in directory.iterdir():
+            try:
+                if marker.stat().st_mtime < cutoff:
+                    marker.unlink()
+            except OSError:
+                pass
+    _activity.directory = directory
+
+
+def live_busy() -> bool:
+    """Whether live requests are in flight in this process or any other one sharing the activity directory."""
+    return live_in_flight() > 0 or _activity.others_busy()
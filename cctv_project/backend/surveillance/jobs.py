@@ -0,0 +1,322 @@
+"""Durable local job queue with a small worker pool.
+
+Jobs are rows in a WAL-mode SQLite file, so they survive restarts and every
+process on the host can share the queue without a broker. A worker claims a
+job inside one IMMEDIATE transaction and takes a lease (`locked_until`). A job
+whose worker died is claimed again once the lease expires, unless that was its
+last attempt; then it is marked `failed`. Each claim gets its own worker token,
+so a worker whose lease was taken over can no longer extend or finish the job.
+Long jobs extend their lease with `Job.touch()`. Failures are retried with
+exponential backoff until `max_attempts` is reached, after which the job stays
+`failed` with its error.
+
+`concurrency` caps how many jobs of one kind a process runs at once. Kinds
+without a limit use every worker.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+DONE_RETENTION_SECONDS = 7 * 86400
+
+
+@dataclass
+class JobConfig:
+    workers: int = 2
+    concurrency: dict[str, int] = field(default_factory=dict)
+    max_attempts: int = 3
+    lease_seconds: float = 300.0
+    poll_interval: float = 2.0
+    backoff_seconds: float = 10.0
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: dict[str, Any]
+    recording_id: int | None
+    attempts: int
+    worker: str
+    queue: JobQueue
+
+    def touch(self) -> None:
+        """Extend the lease of a long-running job."""
+        self.queue._extend_lease(self)
+
+
+class JobQueue:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            recording_id INTEGER,
+            payload TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            available_at REAL NOT NULL,
+            locked_until REAL,
+            worker TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at);
+        CREATE INDEX IF NOT EXISTS jobs_recording ON jobs (recording_id, kind);
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        config: JobConfig | None = None,
+        on_status: Callable[[Job, str, dict[str, Any]], None] | None = None,
+    ) -> None:
+        self.path = str(path)
+        self.config = config or JobConfig()
+        self._on_status = on_status
+        self._handlers: dict[str, Callable[[Job], dict[str, Any] | None]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._running: dict[str, int] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._last_prune = 0.0
+        self._worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind: str, handler: Callable[[Job], dict[str, Any] | None]) -> None:
+        self._handlers[kind] = handler
+
+    # -- producer side -------------------------------------------------------
+
+    def enqueue(self, kind: str, payload: dict[str, Any] | None = None, *, recording_id: int | None = None) -> int:
+        """Queue a job; an identical job for the recording that is still pending is reused."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            existing = None
+            if recording_id is not None:
+                existing = conn.execute(
+                    "SELECT id FROM jobs WHERE recording_id = ? AND kind = ? AND status = 'queued'",
+                    (recording_id, kind),
+                ).fetchone()
+            if existing is not None:
+                # Asked for again: skip any retry backoff it was waiting out
+                job_id = existing['id']
+                conn.execute('UPDATE jobs SET available_at = MIN(available_at, ?) WHERE id = ?', (now, job_id))
+            else:
+                job_id = conn.execute(
+                    'INSERT INTO jobs (kind, recording_id, payload, max_attempts, available_at, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (kind, recording_id, json.dumps(payload or {}), self.config.max_attempts, now, now, now),
+                ).lastrowid
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._wake.set()
+        return job_id
+
+    def stats(self) -> dict[str, Any]:
+        rows = self._conn().execute('SELECT kind, status, COUNT(*) AS n FROM jobs GROUP BY kind, status').fetchall()
+        counts: dict[str, dict[str, int]] = {}
+        for r in rows:
+            counts.setdefault(r['kind'], {})[r['status']] = r['n']
+        with self._lock:
+            running_here = dict(self._running)
+        return {
+            'workers': len(self._threads),
+            'concurrency': self.config.concurrency,
+            'runningInProcess': running_here,
+            'counts': counts,
+        }
+
+    def jobs(self, recording_id: int | None = None, limit: int = 50) -> list[dict[str, Any]]:
+        if recording_id is None:
+            rows = self._conn().execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        else:
+            rows = self._conn().execute(
+                'SELECT * FROM jobs WHERE recording_id = ? ORDER BY id DESC LIMIT ?', (recording_id, limit)
+            ).fetchall()
+        return [
+            {
+                'id': r['id'],
+                'kind': r['kind'],
+                'recordingId': r['recording_id'],
+                'status': r['status'],
+                'attempts': r['attempts'],
+                'error': r['error'],
+                'createdAt': r['created_at'],
+                'updatedAt': r['updated_at'],
+            }
+            for r in rows
+        ]
+
+    # -- worker side -------------------------------------------------------
+
+    def _job(self, row: sqlite3.Row) -> Job:
+        return Job(row['id'], row['kind'], json.loads(row['payload']), row['recording_id'], row['attempts'],
+                   row['worker'], self)
+
+    def _claim(self, kinds: list[str]) -> tuple[Job | None, list[tuple[Job, str]]]:
+        """(claimed job, [(job, error)] failed for running out of attempts on an expired lease)."""
+        conn = self._conn()
+        now = time.time()
+        worker = f'{self._worker_id}:{uuid.uuid4().hex[:12]}'
+        marks = ','.join('?' * len(kinds))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # A job whose worker died on its last attempt is failed, not run again
+            expired = conn.execute(
+                f"UPDATE jobs SET status = 'failed', locked_until = NULL, updated_at = ?, "
+                f"error = 'Lease expired on the last attempt (worker ' || COALESCE(worker, '?') || ' died or hung)' "
+                f"WHERE kind IN ({marks}) AND status = 'running' AND locked_until < ? AND attempts >= max_attempts "
+                f"RETURNING id, kind, payload, recording_id, attempts, worker, error",
+                (now, *kinds, now),
+            ).fetchall()
+            row = conn.execute(
+                f"UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?, worker = ?, updated_at = ? "
+                f"WHERE id = (SELECT id FROM jobs WHERE kind IN ({marks}) AND "
+                f"((status = 'queued' AND available_at <= ?) OR (status = 'running' AND locked_until < ?)) "
+                f"ORDER BY id LIMIT 1) "
+                f"RETURNING id, kind, payload, recording_id, attempts, worker",
+                (now + self.config.lease_seconds, worker, now, *kinds, now, now),
+            ).fetchone()
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return self._job(row) if row is not None else None, [(self._job(r), r['error']) for r in expired]
+
+    def _extend_lease(self, job: Job) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET locked_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.config.lease_seconds, time.time(), job.id, job.worker),
+        )
+
+    def _finish(self, job: Job, result: dict[str, Any] | None, error: str | None) -> str | None:
+        """Record the outcome; None if the lease was lost and another worker owns the job now."""
+        now = time.time()
+        if error is None:
+            status, available_at = 'done', now
+        elif job.attempts < self.config.max_attempts:
+            status, available_at = 'queued', now + self.config.backoff_seconds * 2 ** (job.attempts - 1)
+        else:
+            status, available_at = 'failed', now
+        updated = self._conn().execute(
+            "UPDATE jobs SET status = ?, available_at = ?, locked_until = NULL, result = ?, error = ?, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (status, available_at, json.dumps(result) if result is not None else None, error, now, job.id, job.worker),
+        ).rowcount
+        if not updated:
+            logger.warning('Job %s (%s) lost its lease before finishing; discarding its outcome', job.id, job.kind)
+            return None
+        return status
+
+    def _notify(self, job: Job, status: str, details: dict[str, Any]) -> None:
+        if self._on_status is None:
+            return
+        try:
+            self._on_status(job, status, details)
+        except Exception:
+            logger.exception('Job status callback failed for job %s', job.id)
+
+    def _runnable_kinds(self) -> list[str]:
+        with self._lock:
+            return [
+                kind for kind in self._handlers
+                if self._running.get(kind, 0) < self.config.concurrency.get(kind, self.config.workers)
+            ]
+
+    def run_once(self) -> bool:
+        """Claim and run one job; False when nothing was runnable."""
+        kinds = self._runnable_kinds()
+        if not kinds:
+            return False
+        with self._lock:
+            # Claim under the lock so two workers can't both take the last slot of a kind
+            job, expired = self._claim(kinds)
+            if job is not None:
+                self._running[job.kind] = self._running.get(job.kind, 0) + 1
+        for failed, error in expired:
+            logger.warning('Job %s (%s) failed: %s', failed.id, failed.kind, error)
+            self._notify(failed, 'failed', {'error': error})
+        if job is None:
+            return False
+        self._notify(job, 'running', {})
+        try:
+            result, error = self._handlers[job.kind](job), None
+        except Exception as e:
+            result, error = None, f'{type(e).__name__}: {e}'
+            logger.warning('Job %s (%s) failed on attempt %d: %s\n%s', job.id, job.kind, job.attempts, error,
+                           traceback.format_exc())
+        finally:
+            with self._lock:
+                self._running[job.kind] -= 1
+        status = self._finish(job, result, error)
+        if status is not None:
+            self._notify(job, status, {'error': error} if error else {})
+        return True
+
+    def prune(self, older_than: float = DONE_RETENTION_SECONDS) -> int:
+        return self._conn().execute(
+            "DELETE FROM jobs WHERE status = 'done' AND updated_at < ?", (time.time() - older_than,)
+        ).rowcount
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+                if time.time() - self._last_prune > 3600:
+                    self._last_prune = time.time()
+                    self.prune()
+            except Exception:
+                logger.exception('Job worker error')
+            self._wake.wait(self.config.poll_interval)
+            self._wake.clear()
+
+    def start(self, workers: int | None = None) -> None:
+        if self._threads:
+            return
+        for i in range(max(1, workers or self.config.workers)):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
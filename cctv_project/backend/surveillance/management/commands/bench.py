@@ -0,0 +1,361 @@
+import base64
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+VIDEO_EXTS = ('.mp4', '.webm', '.avi', '.mkv')
+
+TARGETS = ('decode', 'detect', 'classify', 'detect-view', 'classify-view')
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil  # type: ignore
+
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _to_data_url(raw: bytes, mime: str = 'image/jpeg') -> str:
+    return f"data:{mime};base64,{base64.b64encode(raw).decode('ascii')}"
+
+
+def _encode_jpeg(array) -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.fromarray(array).save(buf, format='JPEG', quality=70)
+    return buf.getvalue()
+
+
+def _synthetic_frames(count: int, width: int, height: int) -> list[str]:
+    """Deterministic noisy frames with a few person-sized blocks."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        img = rng.integers(0, 60, size=(height, width, 3), dtype=np.uint8)
+        for k in range(3):
+            x = (i * 7 + k * width // 3) % max(1, width - width // 8)
+            y = height // 4
+            img[y:y + height // 2, x:x + width // 8] = 80 + 50 * k
+        frames.append(_to_data_url(_encode_jpeg(img)))
+    return frames
+
+
+def _load_frames(frames_dir: Path) -> list[str]:
+    files = sorted(p for p in frames_dir.iterdir() if p.suffix.lower() in IMAGE_EXTS)
+    return [
+        _to_data_url(p.read_bytes(), 'image/png' if p.suffix.lower() == '.png' else 'image/jpeg')
+        for p in files
+    ]
+
+
+def _read_video_clip(path: Path, num_frames: int) -> list[str]:
+    import cv2
+
+    cap = cv2.VideoCapture(str(path))
+    frames = []
+    try:
+        while len(frames) < num_frames:
+            ok, bgr = cap.read()
+            if not ok:
+                break
+            frames.append(_to_data_url(_encode_jpeg(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))))
+    finally:
+        cap.release()
+    return frames
+
+
+def _load_clips(clips_dir: Path, num_frames: int) -> list[list[str]]:
+    """A clip is either a sub-directory of frames or a video file."""
+    clips = []
+    for p in sorted(clips_dir.iterdir()):
+        if p.is_dir():
+            clip = _load_frames(p)[:num_frames]
+        elif p.suffix.lower() in VIDEO_EXTS:
+            clip = _read_video_clip(p, num_frames)
+        else:
+            continue
+        if clip:
+            clips.append(clip)
+    return clips
+
+
+def _clips_from_frames(frames: list[str], num_frames: int) -> list[list[str]]:
+    """Sliding windows over the frame list, like the frontend's rolling buffer."""
+    if not frames:
+        return []
+    if len(frames) <= num_frames:
+        return [frames]
+    return [frames[i:i + num_frames] for i in range(0, len(frames) - num_frames + 1, max(1, num_frames // 2))]
+
+
+def _run(fn, inputs: list, iterations: int, concurrency: int) -> dict:
+    """Call fn over inputs `iterations` times on `concurrency` threads."""
+    latencies: list[float] = []
+    errors = 0
+
+    def one(i: int) -> float | None:
+        start = time.perf_counter()
+        try:
+            fn(inputs[i % len(inputs)])
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    if concurrency <= 1:
+        results = [one(i) for i in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, range(iterations)))
+    wall = time.perf_counter() - wall_start
+
+    for r in results:
+        if r is None:
+            errors += 1
+        else:
+            latencies.append(r)
+    latencies.sort()
+
+    ms = 1000.0
+    return {
+        'ops': len(latencies),
+        'errors': errors,
+        'wall_s': round(wall, 4),
+        'throughput_per_s': round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * ms, 3) if latencies else 0.0,
+        'p50_ms': round(_percentile(latencies, 0.50) * ms, 3),
+        'p95_ms': round(_percentile(latencies, 0.95) * ms, 3),
+        'p99_ms': round(_percentile(latencies, 0.99) * ms, 3),
+        'max_ms': round(latencies[-1] * ms, 3) if latencies else 0.0,
+    }
+
+
+def compare_reports(current: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """List per-target/concurrency deltas; `regression` marks out-of-tolerance rows."""
+    rows = []
+    for target, result in current.get('results', {}).items():
+        base_target = baseline.get('results', {}).get(target)
+        if not base_target or 'runs' not in result or 'runs' not in base_target:
+            continue
+        for conc, run in result['runs'].items():
+            base = base_target['runs'].get(conc)
+            if not base:
+                continue
+            for key, higher_is_worse in (('p50_ms', True), ('p95_ms', True), ('throughput_per_s', False)):
+                old, new = base.get(key, 0.0), run.get(key, 0.0)
+                if not old:
+                    continue
+                change = (new - old) / old
+                regression = change > tolerance if higher_is_worse else change < -tolerance
+                rows.append({
+                    'target': target,
+                    'concurrency': conc,
+                    'metric': key,
+                    'baseline': old,
+                    'current': new,
+                    'change_pct': round(change * 100, 2),
+                    'regression': regression,
+                })
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Benchmark decode/detect/classify hot paths and the API views on sample frames."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', help='Directory of sample JPEG/PNG frames (synthetic frames if omitted).')
+        parser.add_argument('--clips', help='Directory of clips: sub-directories of frames or video files.')
+        parser.add_argument('--targets', default=','.join(TARGETS), help=f"Comma list of: {', '.join(TARGETS)}")
+        parser.add_argument('--iterations', type=int, default=50, help='Timed calls per target and concurrency level.')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed calls before measuring each target.')
+        parser.add_argument('--concurrency', default='1', help='Comma list of thread counts, e.g. 1,2,4.')
+        parser.add_argument('--num-frames', type=int, default=16, help='Frames per classification clip.')
+        parser.add_argument('--confidence', type=float, default=0.2)
+        parser.add_argument('--synthetic', type=int, default=32, help='Number of synthetic frames when --frames is omitted.')
+        parser.add_argument('--synthetic-size', default='1280x720', help='WIDTHxHEIGHT of synthetic frames.')
+        parser.add_argument('--output', default='bench_report.json', help='Where to write the JSON report.')
+        parser.add_argument('--baseline', help='Previous JSON report to compare against.')
+        parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative regression (0.10 = 10%%).')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit non-zero on regressions.')
+
+    def handle(self, *args, **options):
+        targets = [t.strip() for t in options['targets'].split(',') if t.strip()]
+        unknown = set(targets) - set(TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown targets: {', '.join(sorted(unknown))}")
+        concurrency_levels = [max(1, int(c)) for c in options['concurrency'].split(',') if c.strip()]
+        num_frames = max(1, options['num_frames'])
+
+        if options['frames']:
+            frames_dir = Path(options['frames'])
+            if not frames_dir.is_dir():
+                raise CommandError(f"Frames directory not found: {frames_dir}")
+            frames = _load_frames(frames_dir)
+            source = str(frames_dir)
+        else:
+            width, height = (int(v) for v in options['synthetic_size'].lower().split('x'))
+            frames = _synthetic_frames(options['synthetic'], width, height)
+            source = f"synthetic {options['synthetic']}x{width}x{height}"
+        if not frames:
+            raise CommandError('No frames to benchmark.')
+
+        clips = _load_clips(Path(options['clips']), num_frames) if options['clips'] else []
+        if not clips:
+            clips = _clips_from_frames(frames, num_frames)
+
+        self.stdout.write(f"Frames: {len(frames)} ({source}), clips: {len(clips)}")
+
+        report = {
+            'meta': {
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'source': source,
+                'frames': len(frames),
+                'clips': len(clips),
+                'iterations': options['iterations'],
+                'concurrency': concurrency_levels,
+            },
+            'results': {},
+        }
+
+        for target in targets:
+            self.stdout.write(f"-> {target}")
+            try:
+                fn, inputs = self._prepare(target, frames, clips, options)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"   skipped: {e}"))
+                report['results'][target] = {'skipped': str(e)}
+                continue
+
+            for i in range(max(0, options['warmup'])):
+                try:
+                    fn(inputs[i % len(inputs)])
+                except Exception:
+                    pass
+
+            runs = {}
+            for conc in concurrency_levels:
+                run = _run(fn, inputs, options['iterations'], conc)
+                runs[str(conc)] = run
+                self.stdout.write(
+                    f"   c={conc:<3} p50={run['p50_ms']:.2f}ms p95={run['p95_ms']:.2f}ms "
+                    f"p99={run['p99_ms']:.2f}ms {run['throughput_per_s']:.2f}/s errors={run['errors']}"
+                )
+            # ru_maxrss is a process-wide high-water mark, so this is the peak so far
+            report['results'][target] = {'runs': runs, 'peak_rss_mb': _peak_rss_mb()}
+
+        report['peak_rss_mb'] = _peak_rss_mb()
+
+        output = Path(options['output'])
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f"Report written to {output}"))
+
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text(encoding='utf-8'))
+            rows = compare_reports(report, baseline, options['tolerance'])
+            regressions = [r for r in rows if r['regression']]
+            for r in rows:
+                style = self.style.ERROR if r['regression'] else self.style.SUCCESS
+                self.stdout.write(style(
+                    f"   {r['target']:<14} c={r['concurrency']:<3} {r['metric']:<17} "
+                    f"{r['baseline']:>10} -> {r['current']:>10} ({r['change_pct']:+.1f}%)"
+                ))
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} metric(s) regressed beyond {options['tolerance']:.0%}")
+
+    def _prepare(self, target: str, frames: list[str], clips: list[list[str]], options: dict):
+        """Return (callable, inputs) for one target, loading models up front."""
+        confidence = options['confidence']
+        num_frames = max(1, options['num_frames'])
+        model_dir = getattr(settings, 'VIDEOMAE_MODEL_DIR', None)
+
+        if target == 'decode':
+            from surveillance.yolo_detector import decode_base64_image
+
+            return decode_base64_image, frames
+
+        if target == 'detect':
+            from surveillance.yolo_detector import detect_humans, get_model
+
+            get_model()
+            # detect_humans() answers [] on errors by default; a broken model must not bench as a fast success
+            return (lambda frame: detect_humans(frame, confidence_threshold=confidence, raise_errors=True)), frames
+
+        if target == 'classify':
+            from surveillance.videomae_classifier import _load_model, classify_activity
+
+            _load_model(model_source=model_dir)
+            return (lambda clip: classify_activity(clip, num_frames=num_frames, model_dir=model_dir)), clips
+
+        from django.test import Client
+
+        # Client keeps per-request state (cookies, last response), so one per worker thread
+        local = threading.local()
+
+        def post(path: str, payload: dict):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client(HTTP_HOST='localhost')
+            res = client.post(path, data=json.dumps(payload), content_type='application/json')
+            if res.status_code != 200:
+                raise RuntimeError(f"{path} returned {res.status_code}")
+            return res
+
+        if target == 'detect-view':
+            from surveillance.yolo_detector import detect_humans
+
+            # The view answers 200 with no detections when the model fails, so prove it works first
+            detect_humans(frames[0], confidence_threshold=confidence, raise_errors=True)
+            return (lambda frame: post('/api/detect/', {'image': frame, 'confidence': confidence})), frames
+
+        if target == 'classify-view':
+            from surveillance.cascade import CASCADE
+            from surveillance.videomae_classifier import _load_model
+
+            _load_model(model_source=model_dir)
+            # The cascade would answer most calls by skipping or probing the detector;
+            # this target times the classifier behind the view, so it runs on every call
+            CASCADE.configure(enabled=False)
+
+            def classify(clip: list[str]):
+                res = post('/api/classify/', {'frames': clip, 'numFrames': num_frames})
+                if res.json().get('rawPrediction') is None:
+                    raise RuntimeError('/api/classify/ did not run the classifier')
+                return res
+
+            return classify, clips
+
+        raise CommandError(f"Unknown target: {target}")
@@ -0,0 +1,372 @@
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.management import BaseCommand, CommandError
+
+from .bench import _clips_from_frames, _load_frames, _percentile, _synthetic_frames
+
+# Request kinds, mirroring the calls the React app makes while streaming
+KINDS = ('detect', 'classify', 'state', 'events', 'upload')
+
+# cameraId of simulated uploads, so they can be told apart from real footage
+UPLOAD_CAMERA_ID = 'loadtest'
+
+
+class _Recorder:
+    """Thread-safe latency/error bookkeeping for one load stage."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {k: [] for k in KINDS}
+        self.errors: dict[str, int] = {k: 0 for k in KINDS}
+        self.shed: dict[str, int] = {k: 0 for k in KINDS}
+
+    def record(self, kind: str, seconds: float, status: int | None) -> None:
+        with self._lock:
+            if status == 200:
+                self.latencies[kind].append(seconds)
+            elif status in (429, 503):
+                self.shed[kind] += 1
+            else:
+                self.errors[kind] += 1
+
+    def summary(self, duration: float) -> dict:
+        out = {}
+        with self._lock:
+            for kind in KINDS:
+                lat = sorted(self.latencies[kind])
+                total = len(lat) + self.errors[kind] + self.shed[kind]
+                out[kind] = {
+                    'requests': total,
+                    'ok': len(lat),
+                    'errors': self.errors[kind],
+                    'shed': self.shed[kind],
+                    'per_s': round(len(lat) / duration, 3) if duration > 0 else 0.0,
+                    'p50_ms': round(_percentile(lat, 0.50) * 1000, 2),
+                    'p95_ms': round(_percentile(lat, 0.95) * 1000, 2),
+                    'p99_ms': round(_percentile(lat, 0.99) * 1000, 2),
+                }
+        return out
+
+
+class _Connection:
+    """Keep-alive HTTP connection that reconnects after failures (like a browser)."""
+
+    def __init__(self, host: str, port: int, timeout: float) -> None:
+        self.host, self.port, self.timeout = host, port, timeout
+        self._conn: http.client.HTTPConnection | None = None
+
+    def request(self, method: str, path: str, body: bytes | None = None, headers: dict | None = None) -> int | None:
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request(method, path, body=body, headers=headers or {})
+                res = self._conn.getresponse()
+                res.read()
+                return res.status
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt:
+                    return None
+        return None
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class _Camera:
+    """One simulated dashboard: detect loop + classify, state polling, uploads."""
+
+    def __init__(self, index: int, options: dict, payloads: dict, recorder: _Recorder, stop: threading.Event):
+        self.index = index
+        self.options = options
+        self.payloads = payloads
+        self.recorder = recorder
+        self.stop = stop
+        self.detect_ticks = 0
+        self.detect_skipped = 0
+        self._events_conn: http.client.HTTPConnection | None = None
+
+    def _timed(self, conn: _Connection, kind: str, method: str, path: str, body=None, headers=None) -> None:
+        start = time.perf_counter()
+        status = conn.request(method, path, body=body, headers=headers)
+        self.recorder.record(kind, time.perf_counter() - start, status)
+
+    def detect_loop(self) -> None:
+        """setInterval(captureAndDetect, 1000 / fps), skipping ticks while busy."""
+        conn = self._connection()
+        period = 1.0 / self.options['fps']
+        detect_payloads = self.payloads['detect']
+        classify_payloads = self.payloads['classify']
+        json_headers = {'Content-Type': 'application/json'}
+        frame_idx = self.index * 7
+        buffered = 0
+        last_classify = 0.0
+        next_tick = time.perf_counter() + (self.index % 10) * period / 10
+
+        while not self.stop.is_set():
+            now = time.perf_counter()
+            if now < next_tick:
+                self.stop.wait(next_tick - now)
+                continue
+            # Ticks that fired while the previous call was in flight are dropped
+            missed = int((now - next_tick) / period)
+            self.detect_skipped += missed
+            next_tick += (missed + 1) * period
+            self.detect_ticks += 1
+
+            buffered += 1
+            if buffered >= self.options['num_frames'] and now - last_classify >= self.options['classify_interval']:
+                last_classify = now
+                body = classify_payloads[frame_idx % len(classify_payloads)]
+                self._timed(conn, 'classify', 'POST', '/api/classify/', body, json_headers)
+
+            body = detect_payloads[frame_idx % len(detect_payloads)]
+            self._timed(conn, 'detect', 'POST', '/api/detect/', body, json_headers)
+            frame_idx += 1
+        conn.close()
+
+    def state_loop(self) -> None:
+        """setInterval(fetchBackendState, 2000), or one /api/events/ stream."""
+        if not self.options['poll_state']:
+            self.events_loop()
+            return
+        conn = self._connection()
+        interval = self.options['state_interval']
+        while not self.stop.wait(interval):
+            self._timed(conn, 'state', 'GET', '/api/state/')
+        conn.close()
+
+    def events_loop(self) -> None:
+        """Hold an SSE connection open like EventSource; latency = time to first byte."""
+        while not self.stop.is_set():
+            conn = http.client.HTTPConnection(self.options['host'], self.options['port'], timeout=self.options['timeout'])
+            self._events_conn = conn
+            start = time.perf_counter()
+            try:
+                conn.request('GET', '/api/events/', headers={'Accept': 'text/event-stream'})
+                res = conn.getresponse()
+                res.read1(1)
+                self.recorder.record('events', time.perf_counter() - start, res.status)
+                while not self.stop.is_set() and res.read1(4096):
+                    pass
+            except (http.client.HTTPException, OSError):
+                if not self.stop.is_set():
+                    self.recorder.record('events', time.perf_counter() - start, None)
+                    self.stop.wait(3.0)  # EventSource retry delay
+            finally:
+                conn.close()
+
+    def close_streams(self) -> None:
+        """Unblock a pending SSE read so the stage can end promptly."""
+        conn = self._events_conn
+        if conn is not None and conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def upload_loop(self) -> None:
+        interval = self.options['upload_interval']
+        if interval <= 0:
+            return
+        conn = self._connection()
+        body, content_type = self.payloads['upload']
+        while not self.stop.wait(interval):
+            self._timed(conn, 'upload', 'POST', '/api/recordings/upload/', body, {'Content-Type': content_type})
+        conn.close()
+
+    def _connection(self) -> _Connection:
+        return _Connection(self.options['host'], self.options['port'], self.options['timeout'])
+
+
+def _multipart_upload(size_kb: int) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    blob = os.urandom(size_kb * 1024)
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        b'Content-Disposition: form-data; name="cameraId"\r\n\r\n',
+        UPLOAD_CAMERA_ID.encode(),
+        f'\r\n--{boundary}\r\n'.encode(),
+        b'Content-Disposition: form-data; name="file"; filename="recording_loadtest.webm"\r\n',
+        b'Content-Type: video/webm\r\n\r\n',
+        blob,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ])
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Command(BaseCommand):
+    help = "Simulate N concurrent camera dashboards against a running server and find the sustainable camera count."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running backend.')
+        parser.add_argument('--cameras', default='', help='Fixed comma list of camera counts to run, e.g. 1,4,8.')
+        parser.add_argument('--max-cameras', type=int, default=64, help='Upper bound for the automatic search.')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds per load stage.')
+        parser.add_argument('--fps', type=float, default=1000 / 300, help='Detect calls per camera per second.')
+        parser.add_argument('--num-frames', type=int, default=16, help='Frames per classify request.')
+        parser.add_argument('--classify-interval', type=float, default=2.0)
+        parser.add_argument('--state-interval', type=float, default=2.0)
+        parser.add_argument('--poll-state', action='store_true', help='Poll /api/state/ instead of holding an /api/events/ stream.')
+        parser.add_argument(
+            '--upload-interval', type=float, default=0.0,
+            help=f"Seconds between uploads per camera (default 0 = off). Uploads are random bytes stored for real "
+                 f"under cameraId '{UPLOAD_CAMERA_ID}' and queue processing jobs; use a scratch server.",
+        )
+        parser.add_argument('--upload-size-kb', type=int, default=2048)
+        parser.add_argument('--confidence', type=float, default=0.2)
+        parser.add_argument('--frames', help='Directory of recorded JPEG/PNG frames (synthetic if omitted).')
+        parser.add_argument('--synthetic', type=int, default=32)
+        parser.add_argument('--synthetic-size', default='640x480', help='WIDTHxHEIGHT of synthetic frames.')
+        parser.add_argument('--detect-budget-ms', type=float, default=300.0, help='p95 budget for /api/detect/.')
+        parser.add_argument('--classify-budget-ms', type=float, default=2000.0, help='p95 budget for /api/classify/.')
+        parser.add_argument('--max-error-rate', type=float, default=0.01)
+        parser.add_argument('--min-fps-ratio', type=float, default=0.9, help='Achieved/target detect FPS to pass.')
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--output', default='loadtest_report.json')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('--url must be an http:// URL')
+        options['host'] = url.hostname
+        options['port'] = url.port or 80
+        if options['fps'] <= 0:
+            raise CommandError('--fps must be positive')
+
+        if options['frames']:
+            frames = _load_frames(Path(options['frames']))
+        else:
+            width, height = (int(v) for v in options['synthetic_size'].lower().split('x'))
+            frames = _synthetic_frames(options['synthetic'], width, height)
+        if not frames:
+            raise CommandError('No frames to send.')
+
+        # Serialize request bodies once so the generator itself stays cheap
+        clips = _clips_from_frames(frames, options['num_frames'])
+        payloads = {
+            'detect': [json.dumps({'image': f, 'confidence': options['confidence']}).encode() for f in frames],
+            'classify': [json.dumps({'frames': c, 'numFrames': options['num_frames']}).encode() for c in clips],
+            'upload': _multipart_upload(options['upload_size_kb']),
+        }
+
+        probe = _Connection(options['host'], options['port'], options['timeout'])
+        if probe.request('GET', '/api/health/') != 200:
+            raise CommandError(f"Backend not reachable at {options['url']}")
+        probe.close()
+
+        stages = []
+        if options['cameras']:
+            for n in [int(c) for c in options['cameras'].split(',') if c.strip()]:
+                stages.append(self._stage(n, options, payloads))
+            passing = [s['cameras'] for s in stages if s['sustainable']]
+            max_ok = max(passing) if passing else 0
+        else:
+            max_ok = self._search(options, payloads, stages)
+
+        report = {
+            'meta': {
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'url': options['url'],
+                'duration_s': options['duration'],
+                'fps': options['fps'],
+                'detect_budget_ms': options['detect_budget_ms'],
+                'classify_budget_ms': options['classify_budget_ms'],
+                'frames': len(frames),
+            },
+            'stages': stages,
+            'max_sustainable_cameras': max_ok,
+        }
+        Path(options['output']).write_text(json.dumps(report, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f"Max sustainable cameras: {max_ok} (report: {options['output']})"))
+
+    def _search(self, options: dict, payloads: dict, stages: list) -> int:
+        """Double the camera count until a stage fails, then bisect."""
+        good, bad = 0, None
+        n = 1
+        while n <= options['max_cameras']:
+            stage = self._stage(n, options, payloads)
+            stages.append(stage)
+            if not stage['sustainable']:
+                bad = n
+                break
+            good = n
+            n *= 2
+        if bad is None:
+            return good
+
+        while bad - good > 1:
+            mid = (good + bad) // 2
+            stage = self._stage(mid, options, payloads)
+            stages.append(stage)
+            if stage['sustainable']:
+                good = mid
+            else:
+                bad = mid
+        return good
+
+    def _stage(self, cameras: int, options: dict, payloads: dict) -> dict:
+        self.stdout.write(f"-> {cameras} camera(s) for {options['duration']:.0f}s")
+        recorder = _Recorder()
+        stop = threading.Event()
+        sims = [_Camera(i, options, payloads, recorder, stop) for i in range(cameras)]
+        threads = []
+        for sim in sims:
+            for target in (sim.detect_loop, sim.state_loop, sim.upload_loop):
+                threads.append(threading.Thread(target=target, daemon=True))
+
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        stop.wait(options['duration'])
+        stop.set()
+        for sim in sims:
+            sim.close_streams()
+        for t in threads:
+            t.join(timeout=options['timeout'])
+        elapsed = time.perf_counter() - start
+
+        summary = recorder.summary(elapsed)
+        detect_fps = summary['detect']['ok'] / elapsed / cameras if elapsed > 0 else 0.0
+        total = sum(s['requests'] for s in summary.values())
+        failed = sum(s['errors'] + s['shed'] for s in summary.values())
+        error_rate = failed / total if total else 0.0
+
+        reasons = []
+        if summary['detect']['p95_ms'] > options['detect_budget_ms']:
+            reasons.append('detect p95 over budget')
+        if summary['classify']['p95_ms'] > options['classify_budget_ms']:
+            reasons.append('classify p95 over budget')
+        if error_rate > options['max_error_rate']:
+            reasons.append('error rate too high')
+        if detect_fps < options['fps'] * options['min_fps_ratio']:
+            reasons.append('detect FPS below target')
+
+        stage = {
+            'cameras': cameras,
+            'elapsed_s': round(elapsed, 2),
+            'detect_fps_per_camera': round(detect_fps, 3),
+            'detect_ticks_skipped': sum(s.detect_skipped for s in sims),
+            'error_rate': round(error_rate, 4),
+            'requests': summary,
+            'sustainable': not reasons,
+            'reasons': reasons,
+        }
+        style = self.style.SUCCESS if not reasons else self.style.WARNING
+        self.stdout.write(style(
+            f"   detect p95={summary['detect']['p95_ms']:.0f}ms fps/cam={detect_fps:.2f} "
+            f"classify p95={summary['classify']['p95_ms']:.0f}ms errors={error_rate:.1%} "
+            f"{'OK' if not reasons else ', '.join(reasons)}"
+        ))
+        return stage
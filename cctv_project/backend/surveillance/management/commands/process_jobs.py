@@ -0,0 +1,34 @@
+import time
+
+from django.core.management import BaseCommand
+
+from surveillance.recording_jobs import get_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Run recording job workers (segmenting, probe, thumbnails, analysis) in this process. "
+        "Set JOBS_AUTOSTART=0 on the web server to keep that work out of it entirely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Worker threads (default: settings JOBS).')
+        parser.add_argument('--drain', action='store_true', help='Run the jobs that are ready now, then exit.')
+
+    def handle(self, *args, **options):
+        queue = get_queue(start=False)
+        if options['drain']:
+            done = 0
+            while queue.run_once():
+                done += 1
+            self.stdout.write(self.style.SUCCESS(f"Processed {done} jobs"))
+            return
+
+        queue.start(options['workers'])
+        self.stdout.write(self.style.SUCCESS(f"Job workers running ({queue.stats()['workers']}); Ctrl+C to stop"))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after running jobs finish ...')
+            queue.stop()
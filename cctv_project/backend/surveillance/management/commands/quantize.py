@@ -0,0 +1,256 @@
+import shutil
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from surveillance import quantization
+
+from .bench import IMAGE_EXTS, _percentile
+
+MODES = ('static', 'dynamic')
+
+
+def _read_frames(paths: list[Path]) -> list:
+    import cv2
+
+    frames = []
+    for p in paths:
+        bgr = cv2.imread(str(p))
+        if bgr is not None:
+            frames.append(bgr)
+    return frames
+
+
+def _split(files: list[Path], holdout_fraction: float) -> tuple[list[Path], list[Path]]:
+    """Deterministic calibration/held-out split: every n-th frame is held out."""
+    step = max(2, round(1 / max(holdout_fraction, 1e-6)))
+    holdout = files[::step]
+    calibration = [p for i, p in enumerate(files) if i % step]
+    return calibration, holdout
+
+
+def _evenly(items: list, limit: int) -> list:
+    if limit <= 0 or len(items) <= limit:
+        return items
+    step = len(items) / limit
+    return [items[int(i * step)] for i in range(limit)]
+
+
+def _speedup(baseline: dict, candidate: dict) -> float:
+    mean = candidate['latency']['mean']
+    return round(baseline['latency']['mean'] / mean, 3) if mean else 0.0
+
+
+def _model_specs() -> dict[str, dict]:
+    """Source weights, calibration size and runtime predict arguments per model."""
+    from surveillance.videomae_classifier import resolve_weights
+    from surveillance.yolo_detector import DETECTION_CONFIG
+
+    return {
+        'detector': {
+            'source': DETECTION_CONFIG['model_name'],
+            'img_size': DETECTION_CONFIG['img_size'],
+            'predict': {
+                'conf': DETECTION_CONFIG['default_confidence'],
+                'iou': DETECTION_CONFIG['iou_threshold'],
+                'max_det': DETECTION_CONFIG['max_detections'],
+                'classes': [0],
+            },
+        },
+        'classifier': {
+            'source': resolve_weights(getattr(settings, 'VIDEOMAE_MODEL_DIR', None)),
+            # Same arguments classify_activity() uses
+            'img_size': 480,
+            'predict': {'conf': 0.25, 'iou': 0.45, 'max_det': 50},
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Build INT8 variants of the detector and activity models from local calibration frames, "
+        "compare them with FP32 on held-out frames and register those within tolerance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calibration', help='Directory of JPEG/PNG frames for calibration (required for --mode static).')
+        parser.add_argument('--holdout', help='Directory of held-out frames (default: every n-th calibration frame).')
+        parser.add_argument('--holdout-fraction', type=float, default=0.25, help='Share held out when --holdout is omitted.')
+        parser.add_argument('--models', default=','.join(quantization.MODEL_KEYS), help='Comma list of: detector, classifier')
+        parser.add_argument('--mode', choices=MODES, default='static', help='Static (calibrated) or dynamic quantization.')
+        parser.add_argument('--calibration-frames', type=int, default=100, help='Most frames fed to the calibrator.')
+        parser.add_argument('--tolerance', type=float, help='Max accuracy drop vs FP32 (default: settings QUANTIZATION).')
+        parser.add_argument('--output-dir', help='Where variants and registry.json go (default: settings QUANTIZATION).')
+
+    def handle(self, *args, **options):
+        models = [m.strip() for m in options['models'].split(',') if m.strip()]
+        unknown = set(models) - set(quantization.MODEL_KEYS)
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(sorted(unknown))}")
+        if options['output_dir']:
+            quantization.configure(variants_dir=options['output_dir'])
+        tolerance = quantization.CONFIG.tolerance if options['tolerance'] is None else options['tolerance']
+        static = options['mode'] == 'static'
+        if static and not options['calibration']:
+            raise CommandError('--calibration is required with --mode static.')
+        if not options['calibration'] and not options['holdout']:
+            raise CommandError('Pass --holdout (or --calibration to hold frames out of).')
+
+        try:
+            import onnx  # noqa: F401
+            import onnxruntime  # noqa: F401
+            from ultralytics import YOLO
+        except ImportError as e:
+            raise CommandError(f"Quantization needs ultralytics, onnx and onnxruntime: {e}") from e
+
+        files = []
+        if options['calibration']:
+            calibration_dir = Path(options['calibration'])
+            if not calibration_dir.is_dir():
+                raise CommandError(f"Calibration directory not found: {calibration_dir}")
+            files = sorted(p for p in calibration_dir.iterdir() if p.suffix.lower() in IMAGE_EXTS)
+        if options['holdout']:
+            holdout_dir = Path(options['holdout'])
+            if not holdout_dir.is_dir():
+                raise CommandError(f"Held-out directory not found: {holdout_dir}")
+            calibration_files = files
+            holdout_files = sorted(p for p in holdout_dir.iterdir() if p.suffix.lower() in IMAGE_EXTS)
+        else:
+            calibration_files, holdout_files = _split(files, options['holdout_fraction'])
+        # Dynamic quantization has no calibration step
+        calibration = _read_frames(_evenly(calibration_files, options['calibration_frames'])) if static else []
+        holdout = _read_frames(holdout_files)
+        if static and not calibration:
+            raise CommandError('Need at least one calibration frame.')
+        if not holdout:
+            raise CommandError('Need at least one held-out frame.')
+
+        out_dir = quantization.variants_dir()
+        out_dir.mkdir(parents=True, exist_ok=True)
+        self.stdout.write(
+            f"Calibration frames: {len(calibration)}, held-out frames: {len(holdout)}, "
+            f"mode: {options['mode']}, tolerance: {tolerance:.1%}, output: {out_dir}"
+        )
+
+        specs = _model_specs()
+        for key in models:
+            self.stdout.write(f"-> {key} ({specs[key]['source']})")
+            entry = self._build(YOLO, key, specs[key], calibration, holdout, options['mode'], tolerance, out_dir)
+            quantization.register_variant(key, entry)
+            scores = '  '.join(f"{name}={value:.4f}" for name, value in entry['scores'].items())
+            latency = entry['latencyMs']
+            style = self.style.SUCCESS if entry['selectable'] else self.style.ERROR
+            self.stdout.write(style(
+                f"   {scores}  fp32={latency['fp32']['p50']:.1f}ms onnx-fp32={latency['onnxFp32']['p50']:.1f}ms "
+                f"int8={latency['int8']['p50']:.1f}ms speedup={entry['speedup']:.2f}x "
+                f"(vs onnx-fp32 {entry['onnxSpeedup']:.2f}x)  "
+                f"{'selectable' if entry['selectable'] else 'rejected (over tolerance)'}"
+            ))
+
+        self.stdout.write(f"Registry: {out_dir / quantization.REGISTRY_FILE}")
+        if quantization.CONFIG.precision != 'int8':
+            self.stdout.write('Set MODEL_PRECISION=int8 to load selectable variants on CPU-only nodes.')
+
+    def _build(self, YOLO, key: str, spec: dict, calibration: list, holdout: list, mode: str, tolerance: float, out_dir: Path) -> dict:
+        import onnx
+        import onnxruntime
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        img_size = spec['img_size']
+        fp32 = YOLO(spec['source'], task='detect')
+
+        # Dynamic axes so the detector's adaptive sizes and batched crops still work
+        exported = Path(fp32.export(format='onnx', imgsz=img_size, dynamic=True, simplify=False, device='cpu'))
+        fp32_onnx = out_dir / f'{key}-fp32.onnx'
+        shutil.move(str(exported), fp32_onnx)
+        int8_onnx = out_dir / f'{key}-int8.onnx'
+
+        start = time.perf_counter()
+        if mode == 'static':
+            prepared = out_dir / f'{key}-fp32-prep.onnx'
+            quant_pre_process(str(fp32_onnx), str(prepared))
+            input_name = onnxruntime.InferenceSession(str(prepared), providers=['CPUExecutionProvider']).get_inputs()[0].name
+            quantize_static(
+                str(prepared),
+                str(int8_onnx),
+                quantization.calibration_reader(input_name, calibration, img_size),
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                weight_type=QuantType.QInt8,
+                activation_type=QuantType.QUInt8,
+                op_types_to_quantize=['Conv', 'MatMul'],
+            )
+            prepared.unlink(missing_ok=True)
+        else:
+            quantize_dynamic(str(fp32_onnx), str(int8_onnx), weight_type=QuantType.QInt8, op_types_to_quantize=['Conv', 'MatMul'])
+        build_s = time.perf_counter() - start
+
+        # Keep the exporter's metadata (class names, stride, imgsz) that ultralytics reads back
+        source_model, quantized_model = onnx.load(str(fp32_onnx)), onnx.load(str(int8_onnx))
+        del quantized_model.metadata_props[:]
+        quantized_model.metadata_props.extend(source_model.metadata_props)
+        onnx.save(quantized_model, str(int8_onnx))
+
+        int8 = YOLO(str(int8_onnx), task='detect')
+        # Both on CPU: the INT8 variants are only ever selected on CPU-only nodes
+        predict = {**spec['predict'], 'imgsz': img_size, 'device': 'cpu', 'verbose': False}
+        fp32_run = self._evaluate(fp32, holdout, predict)
+        # Same runtime as the INT8 variant, so this speedup is the quantization's alone
+        onnx_fp32_run = self._evaluate(YOLO(str(fp32_onnx), task='detect'), holdout, predict)
+        int8_run = self._evaluate(int8, holdout, predict)
+        # Low threshold for the INT8 boxes so AP sees the whole precision/recall curve
+        int8_curve = self._evaluate(int8, holdout, {**predict, 'conf': 0.001})
+
+        scores = {'mAP50': quantization.map50(fp32_run['boxes'], int8_curve['boxes'], min_confidence=predict['conf'])}
+        if key == 'classifier':
+            scores['verdictAgreement'] = quantization.agreement(fp32_run['verdicts'], int8_run['verdicts'])
+        selectable = all(score >= 1.0 - tolerance for score in scores.values())
+
+        return {
+            'variant': 'int8',
+            'mode': mode,
+            'path': int8_onnx.name,
+            'source': str(spec['source']),
+            'imgSize': img_size,
+            'scores': {name: round(value, 4) for name, value in scores.items()},
+            'tolerance': tolerance,
+            'selectable': selectable,
+            'latencyMs': {'fp32': fp32_run['latency'], 'onnxFp32': onnx_fp32_run['latency'], 'int8': int8_run['latency']},
+            'speedup': _speedup(fp32_run, int8_run),
+            'onnxSpeedup': _speedup(onnx_fp32_run, int8_run),
+            'calibrationFrames': len(calibration) if mode == 'static' else 0,
+            'holdoutFrames': len(holdout),
+            'buildSeconds': round(build_s, 2),
+            'sizeMb': {
+                'fp32': round(fp32_onnx.stat().st_size / 1e6, 2),
+                'int8': round(int8_onnx.stat().st_size / 1e6, 2),
+            },
+            'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def _evaluate(self, model, frames: list, predict: dict) -> dict:
+        """Boxes, verdicts and per-frame latency (after one warm-up call)."""
+        from surveillance.videomae_classifier import _summarize
+
+        model(frames[0], **predict)
+        boxes, verdicts, latencies = [], [], []
+        for frame in frames:
+            start = time.perf_counter()
+            results = model(frame, **predict)
+            latencies.append(time.perf_counter() - start)
+            boxes.append(quantization.result_boxes(results))
+            verdicts.append(_summarize(results, model).prediction)
+        latencies.sort()
+        return {
+            'boxes': boxes,
+            'verdicts': verdicts,
+            'latency': {
+                'mean': round(statistics.fmean(latencies) * 1000, 3),
+                'p50': round(_percentile(latencies, 0.50) * 1000, 3),
+                'p95': round(_percentile(latencies, 0.95) * 1000, 3),
+            },
+        }
@@ -0,0 +1,299 @@
+"""Lightweight in-process latency metrics.
+
+Stage timers feed fixed-bucket histograms (one per endpoint/stage pair) so
+recording a sample is a bisect plus a locked increment. Everything is exposed
+in Prometheus text format by `/api/metrics/`.
+
+When metrics are disabled (settings.METRICS_ENABLED = False) `timer()` hands
+back a shared no-op context manager and the record functions return
+immediately, so instrumented code pays only a function call.
+
+Code that reuses the endpoint pipelines off the request path (background
+jobs) wraps them in `attribute_to(label)` so their stage timings don't skew
+the live endpoints' histograms.
+
+A pipeline that hits the same stage several times per request (one decode per
+frame, one inference per ROI or tile) runs inside `request_totals()`, so each
+stage is recorded once per request as the sum of its parts rather than as
+several partial samples.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any
+
+ENABLED = True
+
+# Upper bounds in seconds: 100us doubling every two buckets up to ~50s.
+BUCKETS: tuple[float, ...] = tuple(0.0001 * (2 ** (i / 2)) for i in range(38))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_NULL_TIMER = nullcontext()
+_endpoint_override: ContextVar[str | None] = ContextVar('metrics_endpoint_override', default=None)
+_request_totals: ContextVar[dict[tuple[str, str], float] | None] = ContextVar('metrics_request_totals', default=None)
+_registry_lock = threading.Lock()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with quantile estimates."""
+
+    __slots__ = ('_lock', 'counts', 'sum', 'count')
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # One extra slot for values above the last bound (+Inf)
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        idx = bisect_left(BUCKETS, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> tuple[list[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    @staticmethod
+    def quantile_from(counts: list[int], total: int, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for idx, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[idx - 1] if idx > 0 else 0.0
+                upper = BUCKETS[idx] if idx < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * ((rank - seen) / n)
+            seen += n
+        return BUCKETS[-1]
+
+    def quantile(self, q: float) -> float:
+        counts, _, total = self.snapshot()
+        return self.quantile_from(counts, total, q)
+
+
+class _StageTimer:
+    __slots__ = ('_hist', '_start')
+
+    def __init__(self, hist: Histogram) -> None:
+        self._hist = hist
+        self._start = 0.0
+
+    def __enter__(self) -> _StageTimer:
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._hist.observe(time.perf_counter() - self._start)
+
+
+class _TotalTimer:
+    __slots__ = ('_totals', '_key', '_start')
+
+    def __init__(self, totals: dict[tuple[str, str], float], key: tuple[str, str]) -> None:
+        self._totals = totals
+        self._key = key
+        self._start = 0.0
+
+    def __enter__(self) -> _TotalTimer:
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._totals[self._key] = self._totals.get(self._key, 0.0) + time.perf_counter() - self._start
+
+
+_stage_histograms: dict[tuple[str, str], Histogram] = {}
+_request_histograms: dict[str, Histogram] = {}
+_request_counts: dict[tuple[str, str, int], int] = {}
+_model_loads: dict[str, tuple[int, float]] = {}
+
+
+def configure(*, enabled: bool) -> None:
+    global ENABLED
+    ENABLED = bool(enabled)
+
+
+def _get_histogram(store: dict, key: Any) -> Histogram:
+    hist = store.get(key)
+    if hist is None:
+        with _registry_lock:
+            hist = store.setdefault(key, Histogram())
+    return hist
+
+
+@contextmanager
+def attribute_to(endpoint: str):
+    """Record stage timings inside the block under `endpoint` instead of the caller's label."""
+    token = _endpoint_override.set(endpoint)
+    try:
+        yield
+    finally:
+        _endpoint_override.reset(token)
+
+
+@contextmanager
+def request_totals():
+    """Sum stage timings inside the block and record each stage once when it exits.
+
+    Usable as a decorator. Nested blocks add to the outermost one.
+    """
+    if _request_totals.get() is not None:
+        yield
+        return
+    totals: dict[tuple[str, str], float] = {}
+    token = _request_totals.set(totals)
+    try:
+        yield
+    finally:
+        _request_totals.reset(token)
+        for key, seconds in totals.items():
+            _get_histogram(_stage_histograms, key).observe(seconds)
+
+
+def timer(endpoint: str, stage: str):
+    """Context manager timing one stage of an endpoint, e.g. ('detect', 'inference')."""
+    if not ENABLED:
+        return _NULL_TIMER
+    endpoint = _endpoint_override.get() or endpoint
+    totals = _request_totals.get()
+    if totals is not None:
+        return _TotalTimer(totals, (endpoint, stage))
+    return _StageTimer(_get_histogram(_stage_histograms, (endpoint, stage)))
+
+
+def observe_stage(endpoint: str, stage: str, seconds: float) -> None:
+    if not ENABLED:
+        return
+    endpoint = _endpoint_override.get() or endpoint
+    totals = _request_totals.get()
+    if totals is not None:
+        totals[(endpoint, stage)] = totals.get((endpoint, stage), 0.0) + seconds
+        return
+    _get_histogram(_stage_histograms, (endpoint, stage)).observe(seconds)
+
+
+def observe_request(endpoint: str, method: str, status: int, seconds: float) -> None:
+    if not ENABLED:
+        return
+    _get_histogram(_request_histograms, endpoint).observe(seconds)
+    key = (endpoint, method, status)
+    with _registry_lock:
+        _request_counts[key] = _request_counts.get(key, 0) + 1
+
+
+def record_model_load(model: str, seconds: float) -> None:
+    """Record a model (re)load; recorded even when latency metrics are off."""
+    with _registry_lock:
+        count, _ = _model_loads.get(model, (0, 0.0))
+        _model_loads[model] = (count + 1, seconds)
+
+
+def stage_quantiles(endpoint: str, stage: str) -> dict[float, float]:
+    hist = _stage_histograms.get((endpoint, stage))
+    if hist is None:
+        return {q: 0.0 for q in QUANTILES}
+    counts, _, total = hist.snapshot()
+    return {q: Histogram.quantile_from(counts, total, q) for q in QUANTILES}
+
+
+def reset() -> None:
+    with _registry_lock:
+        _stage_histograms.clear()
+        _request_histograms.clear()
+        _request_counts.clear()
+        _model_loads.clear()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels: Any) -> str:
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def _histogram_lines(name: str, hist: Histogram, labels: str) -> list[str]:
+    counts, total_sum, total = hist.snapshot()
+    lines = []
+    cumulative = 0
+    sep = ',' if labels else ''
+    for bound, n in zip(BUCKETS, counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{bound:.6g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {total}')
+    lines.append(f'{name}_sum{{{labels}}} {total_sum:.9g}')
+    lines.append(f'{name}_count{{{labels}}} {total}')
+    return lines
+
+
+def render_prometheus() -> str:
+    """Render every metric in Prometheus text exposition format (0.0.4)."""
+    with _registry_lock:
+        stages = sorted(_stage_histograms.items())
+        requests = sorted(_request_histograms.items())
+        counts = sorted(_request_counts.items())
+        loads = sorted(_model_loads.items())
+
+    lines = [
+        '# HELP cctv_stage_duration_seconds Time spent in each stage of an endpoint.',
+        '# TYPE cctv_stage_duration_seconds histogram',
+    ]
+    for (endpoint, stage), hist in stages:
+        lines.extend(_histogram_lines(
+            'cctv_stage_duration_seconds', hist, _labels(endpoint=endpoint, stage=stage)
+        ))
+
+    lines += [
+        '# HELP cctv_stage_duration_quantile_seconds Estimated p50/p95/p99 stage latency.',
+        '# TYPE cctv_stage_duration_quantile_seconds gauge',
+    ]
+    for (endpoint, stage), hist in stages:
+        bucket_counts, _, total = hist.snapshot()
+        for q in QUANTILES:
+            value = Histogram.quantile_from(bucket_counts, total, q)
+            lines.append(
+                f'cctv_stage_duration_quantile_seconds{{{_labels(endpoint=endpoint, stage=stage, quantile=q)}}} '
+                f'{value:.9g}'
+            )
+
+    lines += [
+        '# HELP cctv_http_request_duration_seconds End-to-end request latency per endpoint.',
+        '# TYPE cctv_http_request_duration_seconds histogram',
+    ]
+    for endpoint, hist in requests:
+        lines.extend(_histogram_lines('cctv_http_request_duration_seconds', hist, _labels(endpoint=endpoint)))
+
+    lines += [
+        '# HELP cctv_http_requests_total Requests handled per endpoint, method and status.',
+        '# TYPE cctv_http_requests_total counter',
+    ]
+    for (endpoint, method, status), n in counts:
+        lines.append(f'cctv_http_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {n}')
+
+    lines += [
+        '# HELP cctv_model_load_seconds Duration of the most recent model load.',
+        '# TYPE cctv_model_load_seconds gauge',
+    ]
+    for model, (_, seconds) in loads:
+        lines.append(f'cctv_model_load_seconds{{{_labels(model=model)}}} {seconds:.9g}')
+
+    lines += [
+        '# HELP cctv_model_loads_total Number of times each model was loaded.',
+        '# TYPE cctv_model_loads_total counter',
+    ]
+    for model, (count, _) in loads:
+        lines.append(f'cctv_model_loads_total{{{_labels(model=model)}}} {count}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,55 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """Count requests and time them end-to-end per API endpoint.
+
+    The endpoint label is the URL name (e.g. `detect-humans`), so requests that
+    don't resolve to an API route are skipped. Removed from the stack entirely
+    when settings.METRICS_ENABLED is off.
+
+    Sync and async capable, so it doesn't force the async inference views
+    through a thread under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    @staticmethod
+    def _observe(request, response, start: float) -> None:
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name:
+            metrics.observe_request(
+                match.url_name,
+                request.method,
+                response.status_code,
+                time.perf_counter() - start,
+            )
@@ -0,0 +1,178 @@
+"""Opt-in statistical profiler for the running process.
+
+`profile()` samples every thread's Python stack with `sys._current_frames()`
+from its own thread for a fixed time, inference pool workers included. It
+aggregates the samples as collapsed stacks: one `thread;outer;...;inner count`
+line per distinct stack. This is the input format of flamegraph.pl,
+speedscope and inferno.
+
+Thread names drop their numeric suffixes ('inference-detect-humans_0' ->
+'inference-detect-humans'), so the workers of a pool merge into one tower.
+Threads parked in a wait (idle pool workers, the event loop's select, Event
+and Condition waits) are left out unless `include_idle` is set.
+
+Overhead is bounded:
+
+- Only one profile runs at a time; a second one raises ProfilerBusy.
+- Duration and rate are clamped.
+- After every sample the sampler sleeps long enough to keep the time it
+  spends walking stacks under `max_overhead` of wall time. On a process
+  with many threads, the effective rate drops instead of the process
+  slowing down.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+MAX_DEPTH = 128
+
+# (module, function) leaves of a thread that is parked rather than working
+_IDLE_MODULES = {'threading', 'selectors', 'queue', 'socket', 'concurrent.futures.thread', 'asyncio.windows_events'}
+_IDLE_FUNCTIONS = {'wait', 'select', 'get', 'accept', 'acquire', '_worker', '_wait_for_tstate_lock', '_poll'}
+
+
+@dataclass
+class ProfilerConfig:
+    enabled: bool = False
+    max_seconds: float = 30.0
+    max_hz: float = 1000.0
+    max_overhead: float = 0.02
+
+
+CONFIG = ProfilerConfig()
+
+
+def configure(**options: Any) -> None:
+    global CONFIG
+    CONFIG = ProfilerConfig(**{**CONFIG.__dict__, **options})
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is already being captured."""
+
+
+_running = threading.Lock()
+
+
+def _thread_label(name: str) -> str:
+    return re.sub(r'[-_]\d+', '', name).replace(';', ',')
+
+
+def _frame_label(code: Any, module: str) -> str:
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}".replace(';', ',')
+
+
+def _is_idle(module: str, function: str) -> bool:
+    return module in _IDLE_MODULES and function.rsplit('.', 1)[-1] in _IDLE_FUNCTIONS
+
+
+@dataclass
+class Profile:
+    stacks: Counter
+    samples: int
+    seconds: float
+    sampling_seconds: float
+    idle_samples: int
+    truncated_samples: int
+    threads: set[str]
+
+    def collapsed(self) -> str:
+        """flamegraph.pl input: `frame;frame;frame count` per line, hottest first."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            'seconds': round(self.seconds, 3),
+            'samples': self.samples,
+            'effectiveHz': round(self.samples / self.seconds, 1) if self.seconds else 0.0,
+            'overhead': round(self.sampling_seconds / self.seconds, 4) if self.seconds else 0.0,
+            'stackSamples': sum(self.stacks.values()),
+            'distinctStacks': len(self.stacks),
+            'idleSamples': self.idle_samples,
+            'truncatedSamples': self.truncated_samples,
+            'threads': sorted(self.threads),
+        }
+
+
+def profile(seconds: float, hz: float = 200.0, *, include_idle: bool = False, lines: bool = False) -> Profile:
+    """Sample all other threads for `seconds` at up to `hz` (both clamped by CONFIG)."""
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        return _sample(
+            min(max(seconds, 0.1), CONFIG.max_seconds),
+            1.0 / min(max(hz, 1.0), CONFIG.max_hz),
+            include_idle,
+            lines,
+        )
+    finally:
+        _running.release()
+
+
+def _sample(seconds: float, interval: float, include_idle: bool, lines: bool) -> Profile:
+    me = threading.get_ident()
+    stacks: Counter = Counter()
+    labels: dict[Any, str] = {}
+    names: dict[int, str] = {}
+    seen: set[str] = set()
+    samples = idle = truncated = 0
+    sampling = 0.0
+    # Keep a sample's share of wall time under max_overhead: sleep >= cost * (1/overhead - 1)
+    backoff = 1.0 / max(CONFIG.max_overhead, 1e-3) - 1.0
+    names_at = 0.0
+
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        t0 = time.perf_counter()
+        if t0 >= deadline:
+            break
+        if t0 - names_at > 1.0:
+            names = {t.ident: _thread_label(t.name) for t in threading.enumerate()}
+            names_at = t0
+
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            module = frame.f_globals.get('__name__', '?')
+            if not include_idle and _is_idle(module, frame.f_code.co_name):
+                idle += 1
+                continue
+            parts = []
+            while frame is not None and len(parts) < MAX_DEPTH:
+                code = frame.f_code
+                key = (code, frame.f_lineno) if lines else code
+                label = labels.get(key)
+                if label is None:
+                    label = _frame_label(code, frame.f_globals.get('__name__', '?'))
+                    if lines:
+                        label = f'{label}:{frame.f_lineno}'
+                    labels[key] = label
+                parts.append(label)
+                frame = frame.f_back
+            if frame is not None:
+                parts.append('...')
+                truncated += 1
+            thread = names.get(ident, f'thread-{ident}')
+            seen.add(thread)
+            parts.append(thread)
+            stacks[';'.join(reversed(parts))] += 1
+        frame = None  # don't keep the last thread's frames alive while sleeping
+        samples += 1
+
+        cost = time.perf_counter() - t0
+        sampling += cost
+        pause = max(interval - cost, cost * backoff)
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        time.sleep(min(pause, remaining))
+
+    return Profile(stacks, samples, time.perf_counter() - start, sampling, idle, truncated, seen)
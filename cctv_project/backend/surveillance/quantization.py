@@ -0,0 +1,214 @@
+"""INT8 model variants and the registry that makes them selectable.
+
+`manage.py quantize` exports a YOLO model to ONNX, quantizes it with
+onnxruntime (static, calibrated on local frames, or dynamic) and compares it
+with the FP32 model on held-out frames. Results go to `registry.json` in the
+variants directory; a variant is `selectable` only if every accuracy score
+(mAP@0.5 against the FP32 boxes, plus verdict agreement for the activity
+model) is at least `1 - tolerance`.
+
+At load time `select_weights()` swaps in the INT8 variant when
+MODEL_PRECISION=int8, the node has no CUDA device (GPUs keep FP32/FP16) and a
+selectable variant built from the same source weights exists. Anything else
+falls back to the FP32 weights.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_KEYS = ('detector', 'classifier')
+REGISTRY_FILE = 'registry.json'
+
+
+@dataclass
+class QuantizationConfig:
+    precision: str = 'fp32'
+    variants_dir: str = 'models/quantized'
+    tolerance: float = 0.02
+
+
+CONFIG = QuantizationConfig()
+
+
+def configure(**options: Any) -> None:
+    global CONFIG
+    CONFIG = QuantizationConfig(**{**CONFIG.__dict__, **options})
+
+
+def variants_dir() -> Path:
+    return Path(CONFIG.variants_dir)
+
+
+def load_registry() -> dict[str, Any]:
+    path = variants_dir() / REGISTRY_FILE
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logger.warning('Ignoring unreadable quantization registry %s', path)
+        return {}
+
+
+def register_variant(key: str, entry: dict[str, Any]) -> None:
+    """Record (or replace) the variant for `key`; written atomically."""
+    directory = variants_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    registry = load_registry()
+    registry[key] = entry
+    tmp = directory / f'{REGISTRY_FILE}.tmp'
+    tmp.write_text(json.dumps(registry, indent=2), encoding='utf-8')
+    os.replace(tmp, directory / REGISTRY_FILE)
+
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+
+        return bool(torch.cuda.is_available())
+    except Exception:
+        return False
+
+
+def select_weights(key: str, source: str) -> tuple[str, bool]:
+    """Weights to load for `key`: (path, is_int8). Falls back to `source`."""
+    if CONFIG.precision != 'int8' or _cuda_available():
+        return source, False
+    entry = load_registry().get(key)
+    if not entry or not entry.get('selectable'):
+        logger.warning('MODEL_PRECISION=int8 but no selectable INT8 variant for %s; using FP32', key)
+        return source, False
+    if entry.get('source') != str(source):
+        logger.warning('INT8 variant for %s was built from %s, not %s; using FP32', key, entry.get('source'), source)
+        return source, False
+    path = variants_dir() / entry['path']
+    if not path.exists():
+        logger.warning('INT8 variant for %s is missing (%s); using FP32', key, path)
+        return source, False
+    return str(path), True
+
+
+def letterbox(bgr: np.ndarray, size: int) -> np.ndarray:
+    """YOLO preprocessing for calibration: square letterbox, RGB, CHW, 0..1, batch of one."""
+    import cv2
+
+    h, w = bgr.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = round(w * scale), round(h * scale)
+    resized = cv2.resize(bgr, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    rgb = canvas[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(rgb, dtype=np.float32)[None] / 255.0
+
+
+def calibration_reader(input_name: str, frames: Iterable[np.ndarray], size: int):
+    """onnxruntime CalibrationDataReader over letterboxed frames."""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class _FrameReader(CalibrationDataReader):
+        def __init__(self) -> None:
+            self._frames = iter(frames)
+
+        def get_next(self) -> dict[str, np.ndarray] | None:
+            frame = next(self._frames, None)
+            return None if frame is None else {input_name: letterbox(frame, size)}
+
+    return _FrameReader()
+
+
+def result_boxes(results: Any) -> np.ndarray:
+    """Ultralytics results for one image -> (N, 6) x1, y1, x2, y2, conf, cls."""
+    rows = []
+    for r in results:
+        boxes = getattr(r, 'boxes', None)
+        if boxes is None or len(boxes) == 0:
+            continue
+        xyxy = boxes.xyxy.cpu().numpy()
+        conf = boxes.conf.cpu().numpy()[:, None]
+        cls = boxes.cls.cpu().numpy()[:, None]
+        rows.append(np.hstack([xyxy, conf, cls]))
+    return np.vstack(rows) if rows else np.zeros((0, 6), dtype=np.float32)
+
+
+def _iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def map50(
+    reference: list[np.ndarray],
+    predicted: list[np.ndarray],
+    iou_threshold: float = 0.5,
+    min_confidence: float = 0.0,
+) -> float:
+    """Mean AP@0.5 of `predicted` boxes, taking the FP32 `reference` boxes as ground truth.
+
+    Per frame (N, 6) arrays as returned by result_boxes(). All-point
+    interpolated AP per reference class, averaged over those classes; classes
+    the reference never reports have no AP and are skipped. `predicted` may
+    hold low-confidence boxes to trace the whole precision/recall curve.
+
+    With no reference boxes at all (a hold-out set of empty scenes) AP is
+    undefined. The score is then 1.0 unless some prediction reaches
+    `min_confidence`, the threshold the reference ran at.
+    """
+    classes = sorted({int(c) for ref in reference for c in ref[:, 5]})
+    if not classes:
+        return 0.0 if any(np.any(p[:, 4] >= min_confidence) for p in predicted if len(p)) else 1.0
+
+    aps = []
+    for cls in classes:
+        truth = [ref[ref[:, 5] == cls, :4] for ref in reference]
+        n_truth = sum(len(t) for t in truth)
+        preds = [
+            (float(box[4]), frame, box[:4])
+            for frame, pred in enumerate(predicted)
+            for box in pred[pred[:, 5] == cls]
+        ]
+        preds.sort(key=lambda p: -p[0])
+        matched = [np.zeros(len(t), dtype=bool) for t in truth]
+        tp = np.zeros(len(preds))
+        for i, (_, frame, box) in enumerate(preds):
+            if len(truth[frame]) == 0:
+                continue
+            ious = _iou(box, truth[frame])
+            ious[matched[frame]] = 0.0
+            best = int(np.argmax(ious))
+            if ious[best] >= iou_threshold:
+                matched[frame][best] = True
+                tp[i] = 1.0
+        if not preds:
+            aps.append(0.0)
+            continue
+        hits = np.cumsum(tp)
+        recall = np.concatenate([[0.0], hits / n_truth, [1.0]])
+        precision = np.concatenate([[1.0], hits / np.arange(1, len(preds) + 1), [0.0]])
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        steps = np.nonzero(recall[1:] != recall[:-1])[0]
+        aps.append(float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1])))
+    return float(np.mean(aps))
+
+
+def agreement(reference: list[str], predicted: list[str]) -> float:
+    """Fraction of frames where both models give the same verdict."""
+    if not reference:
+        return 1.0
+    return sum(a == b for a, b in zip(reference, predicted)) / len(reference)
@@ -0,0 +1,322 @@
+"""Background processing of uploaded recordings on the local job queue.
+
+Every upload queues a `segment` job. It cuts the footage, which the upload
+request indexed whole, into fixed-duration segments with ffmpeg. Once it is
+done it queues the other three jobs, so they never read a file that is being
+replaced:
+
+- `probe`: duration, resolution, frame rate and codec of the footage.
+- `thumbnail`: evenly spaced keyframes as small JPEGs under
+  MEDIA_ROOT/thumbnails/<id>/, with the middle one as the thumbnail.
+- `analyze`: frames sampled at `analyze_fps` go through the person detector.
+  Frames with people are then classified by the activity model in batches.
+  The result is a per-recording verdict plus the suspicious time spans.
+
+Results are merged into the recording's metadata (`meta.video`,
+`meta.thumbnail`, `meta.keyframes`, `meta.analysis`), with per-kind progress
+in `meta.jobs`. The recordings list therefore shows them without opening a
+video file.
+
+Analysis competes with the live endpoints for the models and the CPU/GPU. While
+live requests are in flight in any process on the host (see
+inference_pool.live_busy), it keeps to a budget. After each model call it
+rests for long enough to hold its share of wall time to `live_duty_cycle`.
+It then keeps waiting while live work continues, up to `yield_max_wait`
+seconds in all. Its stage timings are recorded under the 'recording-jobs'
+metrics label.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+
+from . import inference_pool, metrics
+from .jobs import Job, JobConfig, JobQueue
+from .recordings import THUMBNAILS_DIR, get_store, probe_duration
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('segment', 'probe', 'thumbnail', 'analyze')
+
+_METRICS_ENDPOINT = 'recording-jobs'
+
+
+@dataclass
+class RecordingJobConfig:
+    analyze_fps: float = 1.0
+    analyze_batch: int = 8
+    keyframes: int = 6
+    thumbnail_width: int = 320
+    yield_max_wait: float = 5.0
+    live_duty_cycle: float = 0.25
+
+
+CONFIG = RecordingJobConfig()
+
+
+def _sample_frames(segments: list[tuple[Path, float, float]], started_at: float, every: float) -> Iterator[tuple[float, np.ndarray]]:
+    """(offset seconds, BGR frame) about every `every` seconds of footage, across segments.
+
+    Frames between samples are only grabbed, not decoded into images.
+    """
+    import cv2
+
+    next_at = 0.0
+    for path, start_ts, _ in segments:
+        base = start_ts - started_at
+        cap = cv2.VideoCapture(str(path))
+        if not cap.isOpened():
+            logger.warning('Cannot open segment %s', path)
+            continue
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        index = 0
+        try:
+            while cap.grab():
+                if 0 < fps < 1000:
+                    t = base + index / fps
+                else:
+                    t = base + cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                index += 1
+                if t < next_at:
+                    continue
+                ok, frame = cap.retrieve()
+                if not ok:
+                    continue
+                yield t, frame
+                while next_at <= t:
+                    next_at += every
+        finally:
+            cap.release()
+
+
+def _yield_to_live(spent: float) -> None:
+    """Back off after `spent` seconds of model time if live requests are in flight."""
+    if not inference_pool.live_busy():
+        return
+    start = time.monotonic()
+    rest_until = start + spent * (1.0 / min(max(CONFIG.live_duty_cycle, 0.01), 1.0) - 1.0)
+    deadline = max(rest_until, start + CONFIG.yield_max_wait)
+    while True:
+        now = time.monotonic()
+        if now >= deadline or (now >= rest_until and not inference_pool.live_busy()):
+            return
+        time.sleep(0.05)
+
+
+def _segments(recording_id: int) -> tuple[dict[str, Any], list[tuple[Path, float, float]]]:
+    store = get_store()
+    recording = store.recording(recording_id)
+    segments = store.recording_segments(recording_id) if recording else []
+    if not segments:
+        raise LookupError(f'Recording {recording_id} has no footage left')
+    return recording, segments
+
+
+def segment(job: Job) -> dict[str, Any]:
+    if get_store().recording(job.recording_id) is None:
+        raise LookupError(f'Recording {job.recording_id} has no footage left')
+    result = {'segments': get_store().split(job.recording_id)}
+    then = job.payload.get('then') or []
+    if then:
+        result['jobs'] = enqueue_recording(job.recording_id, then)
+    return result
+
+
+def probe(job: Job) -> dict[str, Any]:
+    import cv2
+
+    _, segments = _segments(job.recording_id)
+    duration = 0.0
+    for path, start_ts, end_ts in segments:
+        probed = probe_duration(path)
+        duration += probed if probed is not None else end_ts - start_ts
+
+    video: dict[str, Any] = {'duration': round(duration, 3)}
+    cap = cv2.VideoCapture(str(segments[0][0]))
+    try:
+        if cap.isOpened():
+            fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+            video.update(
+                width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                fps=round(cap.get(cv2.CAP_PROP_FPS) or 0.0, 3),
+                codec=''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ') or None,
+            )
+    finally:
+        cap.release()
+
+    get_store().update_meta(job.recording_id, video=video)
+    return video
+
+
+def thumbnail(job: Job) -> dict[str, Any]:
+    import cv2
+
+    store = get_store()
+    recording, segments = _segments(job.recording_id)
+    duration = recording['duration'] or sum(probe_duration(p) or 0.0 for p, _, _ in segments)
+    count = max(1, CONFIG.keyframes)
+    every = max(duration / count, 1.0)
+
+    out_dir = store.root / THUMBNAILS_DIR / str(job.recording_id)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    started_at = segments[0][1]
+    keyframes = []
+    for offset, frame in _sample_frames(segments, started_at, every):
+        h, w = frame.shape[:2]
+        if w > CONFIG.thumbnail_width:
+            frame = cv2.resize(frame, (CONFIG.thumbnail_width, round(h * CONFIG.thumbnail_width / w)), interpolation=cv2.INTER_AREA)
+        name = f'{len(keyframes):02d}.jpg'
+        if not cv2.imwrite(str(out_dir / name), frame, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+            raise OSError(f'Could not write {out_dir / name}')
+        keyframes.append({'offset': round(offset, 3), 'url': store.url(f'{THUMBNAILS_DIR}/{job.recording_id}/{name}')})
+        if len(keyframes) >= count:
+            break
+    if not keyframes:
+        raise ValueError(f'No decodable frames in recording {job.recording_id}')
+
+    result = {'thumbnail': keyframes[len(keyframes) // 2]['url'], 'keyframes': keyframes}
+    store.update_meta(job.recording_id, **result)
+    return result
+
+
+def _merge_spans(offsets: list[float], gap: float) -> list[list[float]]:
+    spans: list[list[float]] = []
+    for t in offsets:
+        if spans and t - spans[-1][1] <= gap:
+            spans[-1][1] = t
+        else:
+            spans.append([t, t])
+    return [[round(a, 3), round(b, 3)] for a, b in spans]
+
+
+def analyze(job: Job) -> dict[str, Any]:
+    from django.conf import settings
+
+    from .videomae_classifier import _load_model, classify_crops
+    from .yolo_detector import detect_humans, get_model
+
+    model_dir = getattr(settings, 'VIDEOMAE_MODEL_DIR', None)
+    # Load up front so a broken setup fails (and retries) the job before any footage is decoded
+    get_model()
+    _load_model(model_source=model_dir)
+
+    _, segments = _segments(job.recording_id)
+    every = 1.0 / max(CONFIG.analyze_fps, 1e-3)
+    sampled = 0
+    max_people = 0
+    person_frames: list[tuple[float, np.ndarray]] = []
+    suspicious: list[float] = []
+    confidences: list[float] = []
+
+    def classify_pending() -> None:
+        verdicts = classify_crops([frame for _, frame in person_frames], model_dir=model_dir, img_size=480)
+        for (offset, _), verdict in zip(person_frames, verdicts):
+            if verdict.prediction == 'suspicious':
+                suspicious.append(offset)
+                confidences.append(verdict.confidence)
+        person_frames.clear()
+
+    frames_with_people = 0
+    touched = time.monotonic()
+    with metrics.attribute_to(_METRICS_ENDPOINT):
+        for offset, bgr in _sample_frames(segments, segments[0][1], every):
+            rgb = np.ascontiguousarray(bgr[:, :, ::-1])
+            started = time.perf_counter()
+            # Never the adaptive low-resolution pass the live view may use: offline analysis favours recall
+            people = len(detect_humans(rgb, adaptive=False, classify_people=False, raise_errors=True))
+            sampled += 1
+            if people:
+                frames_with_people += 1
+                max_people = max(max_people, people)
+                person_frames.append((offset, rgb))
+                if len(person_frames) >= CONFIG.analyze_batch:
+                    classify_pending()
+            _yield_to_live(time.perf_counter() - started)
+            # By time, not frames: yielding to live traffic can stretch a frame to many seconds
+            if time.monotonic() - touched > 30:
+                job.touch()
+                touched = time.monotonic()
+        if person_frames:
+            _yield_to_live(0.0)
+            classify_pending()
+
+    analysis = {
+        'verdict': 'suspicious' if suspicious else 'normal',
+        'sampleFps': CONFIG.analyze_fps,
+        'framesAnalyzed': sampled,
+        'framesWithPeople': frames_with_people,
+        'maxPeople': max_people,
+        'suspiciousFrames': len(suspicious),
+        'maxConfidence': round(max(confidences), 2) if confidences else None,
+        'suspiciousSpans': _merge_spans(suspicious, every * 1.5),
+        'analyzedAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    get_store().update_meta(job.recording_id, analysis=analysis)
+    return analysis
+
+
+HANDLERS = {'segment': segment, 'probe': probe, 'thumbnail': thumbnail, 'analyze': analyze}
+
+
+def _record_status(job: Job, status: str, details: dict[str, Any]) -> None:
+    if job.recording_id is None:
+        return
+    entry = {'status': status, 'attempts': job.attempts, 'updatedAt': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    if details.get('error'):
+        entry['error'] = details['error']
+    get_store().update_meta(job.recording_id, jobs={job.kind: entry})
+
+
+def enqueue_recording(recording_id: int, kinds: tuple[str, ...] | list[str] = KINDS) -> dict[str, int]:
+    """Queue processing jobs for a recording; returns {kind: job id}.
+
+    With 'segment' among `kinds`, only it is queued now; it queues the rest
+    when it finishes.
+    """
+    queue = get_queue()
+    # Before enqueueing, so a worker's 'running' can't be overwritten by 'queued'
+    get_store().update_meta(recording_id, jobs={
+        kind: {'status': 'queued', 'attempts': 0, 'updatedAt': time.strftime('%Y-%m-%dT%H:%M:%S')} for kind in kinds
+    })
+    if 'segment' in kinds:
+        then = [kind for kind in kinds if kind != 'segment']
+        return {'segment': queue.enqueue('segment', {'then': then}, recording_id=recording_id)}
+    return {kind: queue.enqueue(kind, recording_id=recording_id) for kind in kinds}
+
+
+_QUEUE: JobQueue | None = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_queue(start: bool | None = None) -> JobQueue:
+    """The recording job queue (settings.JOBS), its workers started on first use when `autostart`."""
+    global _QUEUE, CONFIG
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            from django.conf import settings
+
+            options = dict(getattr(settings, 'JOBS', {}))
+            path = options.pop('path', Path(settings.BASE_DIR) / 'jobs.sqlite3')
+            autostart = options.pop('autostart', True)
+            handler_fields = {f.name for f in dataclasses.fields(RecordingJobConfig)}
+            CONFIG = RecordingJobConfig(**{k: v for k, v in options.items() if k in handler_fields})
+            queue = JobQueue(
+                path,
+                JobConfig(**{k: v for k, v in options.items() if k not in handler_fields}),
+                on_status=_record_status,
+            )
+            for kind, handler in HANDLERS.items():
+                queue.register(kind, handler)
+            if autostart if start is None else start:
+                queue.start()
+            _QUEUE = queue
+        return _QUEUE
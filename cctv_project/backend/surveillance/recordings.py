@@ -0,0 +1,591 @@
+"""Segmented recording storage with a per-camera time index.
+
+Uploads are cut into fixed-duration segments with an ffmpeg stream copy (no
+re-encode; cuts land on keyframes) and stored as
+
+    <MEDIA_ROOT>/segments/<camera>/<YYYY-MM-DD>/<start_ms>_<end_ms>.<ext>
+
+Each segment's wall-clock span is indexed in SQLite by (camera_id, start_ts).
+The index and uploads still being written (`incoming/`) live in a separate
+`state_dir`, outside MEDIA_ROOT, which is served as-is at MEDIA_URL.
+A range query such as 14:02-14:05 is one bounded index range scan. The lower
+bound is the query start minus the camera's longest segment, so older
+footage is never scanned. Without ffmpeg an upload is kept whole as a single
+segment. Uploads through the API are indexed whole first and cut later by the
+`segment` job (see recording_jobs), so ffmpeg never runs inside a request.
+
+A background thread first indexes uploads left flat in MEDIA_ROOT by older
+versions, then enforces the disk quota (and an optional maximum age)
+incrementally. Each pass deletes at most `batch` segments, oldest first. It
+then compacts: index rows whose file vanished, recordings left without
+segments and empty directories are removed, and freed index pages are
+returned to the filesystem.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from django.utils.text import get_valid_filename
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTS = ('.mp4', '.webm')
+INDEX_FILE = 'index.sqlite3'
+# Derived images (see recording_jobs), removed along with their recording
+THUMBNAILS_DIR = 'thumbnails'
+
+
+@dataclass
+class RetentionConfig:
+    segment_seconds: int = 60
+    quota_mb: float = 10240
+    max_age_days: float = 0  # 0 keeps footage until the quota needs the space
+    interval: float = 60.0
+    batch: int = 200
+
+
+def parse_timestamp(value: Any, date: str | None = None) -> float | None:
+    """Epoch seconds from an epoch number, an ISO datetime or a local HH:MM[:SS] (today or `date`)."""
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if len(text) <= 8 and ':' in text:
+        day = date or time.strftime('%Y-%m-%d')
+        text = f'{day}T{text}'
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _isoformat(ts: float | None) -> str | None:
+    return datetime.fromtimestamp(ts).astimezone().isoformat(timespec='seconds') if ts is not None else None
+
+
+def probe_duration(path: Path) -> float | None:
+    """Video duration in seconds via ffprobe, else OpenCV; None if unknown."""
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        try:
+            out = subprocess.run(
+                [ffprobe, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', str(path)],
+                capture_output=True, text=True, timeout=30, check=True,
+            ).stdout.strip()
+            return float(out) if out and out != 'N/A' else None
+        except (subprocess.SubprocessError, ValueError, OSError):
+            pass
+    try:
+        import cv2
+
+        cap = cv2.VideoCapture(str(path))
+        try:
+            frames, fps = cap.get(cv2.CAP_PROP_FRAME_COUNT), cap.get(cv2.CAP_PROP_FPS)
+        finally:
+            cap.release()
+        return frames / fps if frames > 0 and fps > 0 else None
+    except Exception:
+        return None
+
+
+def _split_segments(path: Path, out_dir: Path, segment_seconds: int) -> list[tuple[Path, float, float]] | None:
+    """Stream-copy `path` into ~segment_seconds parts; [(part, start, end)] offsets, or None."""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    out_dir.mkdir(parents=True, exist_ok=True)
+    listing = out_dir / 'segments.csv'
+    cmd = [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-i', str(path),
+        '-map', '0', '-c', 'copy', '-f', 'segment', '-segment_time', str(segment_seconds),
+        '-reset_timestamps', '1', '-segment_list', str(listing), '-segment_list_type', 'csv',
+        str(out_dir / f'part_%05d{path.suffix}'),
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, timeout=600, check=True)
+        with open(listing, newline='') as f:
+            parts = [(out_dir / name, float(start), float(end)) for name, start, end in csv.reader(f)]
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        logger.warning('Segmenting %s failed, keeping it whole: %s', path.name, e)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        return None
+    listing.unlink(missing_ok=True)
+    return parts or None
+
+
+class RecordingStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS recordings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            camera_id TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            ended_at REAL NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            meta TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE TABLE IF NOT EXISTS segments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recording_id INTEGER NOT NULL,
+            camera_id TEXT NOT NULL,
+            start_ts REAL NOT NULL,
+            end_ts REAL NOT NULL,
+            path TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS segments_camera_start ON segments (camera_id, start_ts);
+        CREATE INDEX IF NOT EXISTS segments_start ON segments (start_ts);
+        CREATE INDEX IF NOT EXISTS segments_recording ON segments (recording_id);
+        CREATE TABLE IF NOT EXISTS cameras (
+            camera_id TEXT PRIMARY KEY,
+            max_span REAL NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            bytes INTEGER NOT NULL DEFAULT 0,
+            compact_cursor INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO totals (id, bytes, compact_cursor) VALUES (1, 0, 0);
+    """
+
+    def __init__(self, root: str | Path, config: RetentionConfig | None = None,
+                 state_dir: str | Path | None = None) -> None:
+        self.root = Path(root)
+        self.config = config or RetentionConfig()
+        self.state_dir = Path(state_dir) if state_dir is not None else self.root
+        # Uploads are written here, then moved into `root` once indexed
+        self.incoming_dir = self.state_dir / 'incoming'
+        self._local = threading.local()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+        self._move_legacy_index()
+        conn = self._conn()
+        # Must precede table creation to take effect on a new index file
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(self.SCHEMA)
+
+    def _move_legacy_index(self) -> None:
+        """Move an index left in `root` by older versions (where it was downloadable) into `state_dir`."""
+        legacy, index = self.root / INDEX_FILE, self.state_dir / INDEX_FILE
+        if legacy == index or not legacy.exists() or index.exists():
+            return
+        # With its WAL and shared-memory files, so committed pages aren't lost
+        for suffix in ('', '-wal', '-shm'):
+            source = legacy.with_name(legacy.name + suffix)
+            if source.exists():
+                shutil.move(source, index.with_name(index.name + suffix))
+        logger.info('Moved the recordings index from %s to %s', legacy, index)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.state_dir / INDEX_FILE, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+        return conn
+
+    def url(self, rel_path: str) -> str:
+        from django.conf import settings
+
+        return f'{settings.MEDIA_URL}{rel_path}'
+
+    # -- writes -------------------------------------------------------------
+
+    def ingest(
+        self,
+        upload: Path,
+        *,
+        camera_id: str = 'default',
+        filename: str | None = None,
+        started_at: float | None = None,
+        ended_at: float | None = None,
+        split: bool = True,
+    ) -> dict[str, Any]:
+        """Segment and index an uploaded file (which is moved/consumed, also on failure).
+
+        With `split=False` the file is indexed whole and can be cut later with
+        `split()`, keeping ffmpeg out of the caller's request.
+        """
+        work_dir = upload.parent / f'{upload.stem}.parts'
+        placed: list[Path] = []
+        try:
+            parts = _split_segments(upload, work_dir, self.config.segment_seconds) if split else None
+            if parts:
+                duration = parts[-1][2]
+            else:
+                if started_at is not None and ended_at is not None:
+                    duration = max(0.0, ended_at - started_at)
+                else:
+                    duration = probe_duration(upload) or 0.0
+                parts = [(upload, 0.0, duration)]
+
+            if started_at is None:
+                started_at = (ended_at or time.time()) - duration
+            if ended_at is None:
+                ended_at = started_at + duration
+
+            segments = self._place(camera_id, started_at, parts, placed)
+            return self._index(camera_id, filename or upload.name, started_at, ended_at, segments)
+        except BaseException:
+            for path in placed:
+                path.unlink(missing_ok=True)
+            raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            upload.unlink(missing_ok=True)
+
+    def _place(self, camera_id: str, started_at: float, parts: list[tuple[Path, float, float]],
+               placed: list[Path]) -> list[tuple[str, float, float, int]]:
+        """Move parts (offsets from `started_at`) to their segment paths; each moved file is appended to `placed`."""
+        segments = []
+        for part, start, end in parts:
+            start_ts, end_ts = started_at + start, started_at + end
+            day = time.strftime('%Y-%m-%d', time.localtime(start_ts))
+            dest = self.root / 'segments' / get_valid_filename(camera_id) / day / f'{int(start_ts * 1000)}_{int(end_ts * 1000)}{part.suffix}'
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            # A rename, unless state_dir is on another filesystem than root
+            shutil.move(part, dest)
+            placed.append(dest)
+            segments.append((dest.relative_to(self.root).as_posix(), start_ts, end_ts, dest.stat().st_size))
+        return segments
+
+    def split(self, recording_id: int) -> int:
+        """Cut a recording indexed as one whole segment into parts; returns its segment count.
+
+        The parts replace the whole file in one transaction. Recordings that
+        already have several segments, or without ffmpeg, are left alone.
+        """
+        conn = self._conn()
+        rows = conn.execute(
+            'SELECT id, camera_id, start_ts, path FROM segments WHERE recording_id = ?', (recording_id,)
+        ).fetchall()
+        if len(rows) != 1:
+            return len(rows)
+        whole = rows[0]
+        source = self.root / whole['path']
+        work_dir = self.incoming_dir / f'split_{recording_id}.parts'
+        parts = _split_segments(source, work_dir, self.config.segment_seconds)
+        placed: list[Path] = []
+        try:
+            if not parts or len(parts) == 1:
+                return 1
+            segments = self._place(whole['camera_id'], whole['start_ts'], parts, placed)
+            size = sum(s[3] for s in segments)
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                removed = conn.execute('DELETE FROM segments WHERE id = ? RETURNING size', (whole['id'],)).fetchone()
+                if removed is None:  # expired by retention meanwhile
+                    conn.execute('ROLLBACK')
+                    for path in placed:
+                        path.unlink(missing_ok=True)
+                    return 0
+                conn.executemany(
+                    'INSERT INTO segments (recording_id, camera_id, start_ts, end_ts, path, size) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(recording_id, whole['camera_id'], start, end, path, seg_size) for path, start, end, seg_size in segments],
+                )
+                conn.execute(
+                    'UPDATE cameras SET max_span = MAX(max_span, ?) WHERE camera_id = ?',
+                    (max(end - start for _, start, end, _ in segments), whole['camera_id']),
+                )
+                conn.execute('UPDATE recordings SET size = size - ? + ? WHERE id = ?', (removed['size'], size, recording_id))
+                conn.execute('UPDATE totals SET bytes = MAX(0, bytes - ? + ?) WHERE id = 1', (removed['size'], size))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except BaseException:
+            for path in placed:
+                path.unlink(missing_ok=True)
+            raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        source.unlink(missing_ok=True)
+        return len(segments)
+
+    def _index(self, camera_id: str, filename: str, started_at: float, ended_at: float,
+               segments: list[tuple[str, float, float, int]]) -> dict[str, Any]:
+        size = sum(s[3] for s in segments)
+        max_span = max((end - start for _, start, end, _ in segments), default=0.0)
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            recording_id = conn.execute(
+                'INSERT INTO recordings (camera_id, filename, started_at, ended_at, size, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (camera_id, filename, started_at, ended_at, size, time.time()),
+            ).lastrowid
+            conn.executemany(
+                'INSERT INTO segments (recording_id, camera_id, start_ts, end_ts, path, size) VALUES (?, ?, ?, ?, ?, ?)',
+                [(recording_id, camera_id, start, end, path, seg_size) for path, start, end, seg_size in segments],
+            )
+            conn.execute(
+                'INSERT INTO cameras (camera_id, max_span) VALUES (?, ?) '
+                'ON CONFLICT(camera_id) DO UPDATE SET max_span = MAX(max_span, excluded.max_span)',
+                (camera_id, max_span),
+            )
+            conn.execute('UPDATE totals SET bytes = bytes + ? WHERE id = 1', (size,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return self.recording(recording_id)
+
+    def update_meta(self, recording_id: int, **values: Any) -> None:
+        """Merge `values` into a recording's metadata; dict values merge one level deep."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT meta FROM recordings WHERE id = ?', (recording_id,)).fetchone()
+            if row is not None:
+                meta = json.loads(row['meta'])
+                for key, value in values.items():
+                    current = meta.get(key)
+                    meta[key] = {**current, **value} if isinstance(current, dict) and isinstance(value, dict) else value
+                conn.execute('UPDATE recordings SET meta = ? WHERE id = ?', (json.dumps(meta), recording_id))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def adopt_legacy(self) -> int:
+        """Index pre-segmentation uploads left flat in MEDIA_ROOT as single segments."""
+        conn = self._conn()
+        adopted = 0
+        for p in sorted(self.root.iterdir()):
+            if not p.is_file() or p.suffix.lower() not in VIDEO_EXTS:
+                continue
+            rel = p.relative_to(self.root).as_posix()
+            if conn.execute('SELECT 1 FROM segments WHERE path = ?', (rel,)).fetchone():
+                continue
+            ended_at = p.stat().st_mtime
+            started_at = ended_at - (probe_duration(p) or 0.0)
+            self._index('default', p.name, started_at, ended_at, [(rel, started_at, ended_at, p.stat().st_size)])
+            adopted += 1
+        return adopted
+
+    # -- reads --------------------------------------------------------------
+
+    def _recording_dict(self, row: sqlite3.Row, first_segment: str | None, segment_count: int) -> dict[str, Any]:
+        return {
+            'id': row['id'],
+            'cameraId': row['camera_id'],
+            'filename': row['filename'],
+            'path': first_segment,
+            'url': self.url(first_segment) if first_segment else None,
+            'size': row['size'],
+            'modifiedAt': int(row['created_at']),
+            'startedAt': _isoformat(row['started_at']),
+            'endedAt': _isoformat(row['ended_at']),
+            'duration': round(row['ended_at'] - row['started_at'], 3),
+            'segments': segment_count,
+            'meta': json.loads(row['meta']),
+        }
+
+    def recording(self, recording_id: int) -> dict[str, Any] | None:
+        conn = self._conn()
+        row = conn.execute('SELECT * FROM recordings WHERE id = ?', (recording_id,)).fetchone()
+        if row is None:
+            return None
+        first, count = conn.execute(
+            'SELECT (SELECT path FROM segments WHERE recording_id = ?1 ORDER BY start_ts LIMIT 1), '
+            '(SELECT COUNT(*) FROM segments WHERE recording_id = ?1)',
+            (recording_id,),
+        ).fetchone()
+        return self._recording_dict(row, first, count)
+
+    def recording_segments(self, recording_id: int) -> list[tuple[Path, float, float]]:
+        """(path, start_ts, end_ts) of each segment, in time order."""
+        rows = self._conn().execute(
+            'SELECT path, start_ts, end_ts FROM segments WHERE recording_id = ? ORDER BY start_ts', (recording_id,)
+        ).fetchall()
+        return [(self.root / r['path'], r['start_ts'], r['end_ts']) for r in rows]
+
+    def list_recordings(self, limit: int = 200) -> list[dict[str, Any]]:
+        rows = self._conn().execute(
+            'SELECT r.*, COUNT(s.id) AS segment_count, '
+            '(SELECT path FROM segments WHERE recording_id = r.id ORDER BY start_ts LIMIT 1) AS first_segment '
+            'FROM recordings r LEFT JOIN segments s ON s.recording_id = r.id '
+            'GROUP BY r.id ORDER BY r.created_at DESC LIMIT ?',
+            (limit,),
+        ).fetchall()
+        return [self._recording_dict(r, r['first_segment'], r['segment_count']) for r in rows]
+
+    def query(self, camera_id: str, start: float, end: float) -> list[dict[str, Any]]:
+        """Segments of `camera_id` overlapping [start, end), with in/out offsets to seek to."""
+        conn = self._conn()
+        span = conn.execute('SELECT max_span FROM cameras WHERE camera_id = ?', (camera_id,)).fetchone()
+        if span is None:
+            return []
+        rows = conn.execute(
+            'SELECT recording_id, start_ts, end_ts, path, size FROM segments '
+            'WHERE camera_id = ? AND start_ts >= ? AND start_ts < ? AND end_ts > ? ORDER BY start_ts',
+            (camera_id, start - span['max_span'], end, start),
+        ).fetchall()
+        return [
+            {
+                'recordingId': r['recording_id'],
+                'url': self.url(r['path']),
+                'start': _isoformat(r['start_ts']),
+                'end': _isoformat(r['end_ts']),
+                'seekOffset': round(max(0.0, start - r['start_ts']), 3),
+                'endOffset': round(min(r['end_ts'], end) - r['start_ts'], 3),
+                'size': r['size'],
+            }
+            for r in rows
+        ]
+
+    def usage(self) -> dict[str, Any]:
+        conn = self._conn()
+        total = conn.execute('SELECT bytes FROM totals WHERE id = 1').fetchone()['bytes']
+        segments, oldest = conn.execute('SELECT COUNT(*), MIN(start_ts) FROM segments').fetchone()
+        return {
+            'bytes': total,
+            'quotaBytes': int(self.config.quota_mb * 1024 * 1024),
+            'segments': segments,
+            'oldest': _isoformat(oldest),
+        }
+
+    # -- retention ----------------------------------------------------------
+
+    def _delete_segments(self, rows: list[sqlite3.Row]) -> int:
+        if not rows:
+            return 0
+        for r in rows:
+            path = self.root / r['path']
+            path.unlink(missing_ok=True)
+            self._prune_dirs(path.parent)
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('DELETE FROM segments WHERE id = ?', [(r['id'],) for r in rows])
+            conn.execute('UPDATE totals SET bytes = MAX(0, bytes - ?) WHERE id = 1', (sum(r['size'] for r in rows),))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return len(rows)
+
+    def _prune_dirs(self, directory: Path) -> None:
+        segments_root = self.root / 'segments'
+        while directory != segments_root and segments_root in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:  # not empty
+                return
+            directory = directory.parent
+
+    def enforce_retention(self) -> dict[str, int]:
+        """One incremental pass: expire by age, then trim oldest-first to the quota."""
+        conn = self._conn()
+        batch = max(1, self.config.batch)
+        deleted = 0
+        if self.config.max_age_days > 0:
+            cutoff = time.time() - self.config.max_age_days * 86400
+            deleted += self._delete_segments(conn.execute(
+                'SELECT id, path, size FROM segments WHERE start_ts < ? AND end_ts < ? ORDER BY start_ts LIMIT ?',
+                (cutoff, cutoff, batch),
+            ).fetchall())
+
+        quota = int(self.config.quota_mb * 1024 * 1024)
+        excess = conn.execute('SELECT bytes FROM totals WHERE id = 1').fetchone()['bytes'] - quota
+        if excess > 0 and deleted < batch:
+            victims, freed = [], 0
+            for r in conn.execute(
+                'SELECT id, path, size FROM segments ORDER BY start_ts LIMIT ?', (batch - deleted,)
+            ).fetchall():
+                victims.append(r)
+                freed += r['size']
+                if freed >= excess:
+                    break
+            deleted += self._delete_segments(victims)
+
+        return {'deleted': deleted, **self.compact()}
+
+    def compact(self) -> dict[str, int]:
+        """Drop index rows for vanished files (a batch per call), empty recordings, free pages."""
+        conn = self._conn()
+        cursor = conn.execute('SELECT compact_cursor FROM totals WHERE id = 1').fetchone()['compact_cursor']
+        rows = conn.execute(
+            'SELECT id, path, size FROM segments WHERE id > ? ORDER BY id LIMIT ?', (cursor, max(1, self.config.batch))
+        ).fetchall()
+        missing = [r for r in rows if not (self.root / r['path']).exists()]
+        self._delete_segments(missing)
+        conn.execute('UPDATE totals SET compact_cursor = ? WHERE id = 1', (rows[-1]['id'] if rows else 0,))
+        orphans = [r['id'] for r in conn.execute(
+            'DELETE FROM recordings WHERE NOT EXISTS (SELECT 1 FROM segments s WHERE s.recording_id = recordings.id) '
+            'RETURNING id'
+        ).fetchall()]
+        for recording_id in orphans:
+            shutil.rmtree(self.root / THUMBNAILS_DIR / str(recording_id), ignore_errors=True)
+        conn.execute('PRAGMA incremental_vacuum(256)')
+        return {'missing': len(missing), 'orphanRecordings': len(orphans)}
+
+    def start_background(self) -> None:
+        if self._thread is not None:
+            return
+
+        def loop() -> None:
+            # Adopting probes every old file, so it runs here instead of in the first request
+            try:
+                adopted = self.adopt_legacy()
+                if adopted:
+                    logger.info('Indexed %d existing recordings', adopted)
+            except Exception:
+                logger.exception('Indexing existing recordings failed')
+            if self.config.interval <= 0:
+                return
+            while not self._stop.wait(self.config.interval):
+                try:
+                    result = self.enforce_retention()
+                    if result['deleted'] or result['missing']:
+                        logger.info('Recording retention: %s', result)
+                except Exception:
+                    logger.exception('Recording retention pass failed')
+
+        self._thread = threading.Thread(target=loop, name='recording-retention', daemon=True)
+        self._thread.start()
+
+    def stop_background(self) -> None:
+        self._stop.set()
+
+
+_STORE: RecordingStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> RecordingStore:
+    """The store under MEDIA_ROOT (settings.RECORDINGS), created and started on first use."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            from django.conf import settings
+
+            options = dict(getattr(settings, 'RECORDINGS', {}))
+            state_dir = options.pop('state_dir', None)
+            store = RecordingStore(settings.MEDIA_ROOT, RetentionConfig(**options), state_dir)
+            store.start_background()
+            _STORE = store
+        return _STORE
@@ -0,0 +1,31 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from . import columnar, metrics
+
+
+def _endpoint(renderer_context) -> str:
+    request = (renderer_context or {}).get('request')
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name if match is not None else None) or 'unknown'
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that records its render time as the `serialize` stage."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.timer(_endpoint(renderer_context), 'serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ColumnarRenderer(BaseRenderer):
+    """Compact columnar encoding (surveillance/columnar.py), chosen with
+    `Accept: application/vnd.cctv.columnar`."""
+
+    media_type = columnar.MEDIA_TYPE
+    format = 'columnar'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.timer(_endpoint(renderer_context), 'serialize'):
+            return columnar.encode(data)
@@ -1,80 +1,107 @@
-import random
 import time
-from dataclasses import dataclass
+import uuid
 from typing import Any
 
+from django.conf import settings
 
-@dataclass
-class SurveillanceState:
-    running: bool = False
-    start_time: float | None = None
-    detections: list[dict[str, Any]] = None  # type: ignore[assignment]
-    alerts: list[dict[str, Any]] = None  # type: ignore[assignment]
-    stats: dict[str, Any] = None  # type: ignore[assignment]
+from .events import BUS
+from .state_backends import MemoryStateBackend, SQLiteStateBackend, create_backend
 
-    def __post_init__(self) -> None:
-        if self.detections is None:
-            self.detections = []
-        if self.alerts is None:
-            self.alerts = []
-        if self.stats is None:
-            self.stats = {
-                'totalDetections': 0,
-                'normalCount': 0,
-                'suspiciousCount': 0,
-                'uptime': 0,
-            }
+_BACKEND: MemoryStateBackend | SQLiteStateBackend | None = None
 
 
-STATE = SurveillanceState()
+def get_backend() -> MemoryStateBackend | SQLiteStateBackend:
+    """The configured state backend (settings.STATE_BACKEND), created on first use."""
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = create_backend(
+            getattr(settings, 'STATE_BACKEND', 'memory'),
+            path=getattr(settings, 'STATE_SQLITE_PATH', None),
+        )
+    return _BACKEND
+
+
+def publish_event(event_type: str, data: dict[str, Any]) -> None:
+    """Send an `/api/events/` event to every dashboard.
+
+    With a shared backend the event goes through its log, which every serving
+    process follows (`follow_shared_events`); otherwise straight to this
+    process's bus.
+    """
+    if get_backend().append_event(event_type, data) is None:
+        BUS.publish(event_type, data)
+
+
+def follow_shared_events() -> None:
+    """Feed this process's bus from the backend's event log, if it has one."""
+    backend = get_backend()
+    if isinstance(backend, SQLiteStateBackend):
+        BUS.follow(backend, poll_interval=getattr(settings, 'EVENTS_POLL_SECONDS', 0.25))
 
 
 def reset_state() -> None:
-    STATE.running = False
-    STATE.start_time = None
-    STATE.detections = []
-    STATE.alerts = []
-    STATE.stats = {
-        'totalDetections': 0,
-        'normalCount': 0,
-        'suspiciousCount': 0,
-        'uptime': 0,
+    get_backend().reset()
+    publish_event('reset', session_event())
+
+
+def session_event() -> dict[str, Any]:
+    running, start_time = get_backend().session()
+    return {'running': running, 'startTime': start_time}
+
+
+def add_alert(message: str, confidence: float, camera_id: str = 'default') -> dict[str, Any]:
+    """Record an alert in the shape the frontend's AlertDisplay expects."""
+    now = time.time()
+    alert = {
+        # Unique even for alerts in the same millisecond; evidence is keyed by it
+        'id': f'alert_{int(now * 1000)}_{uuid.uuid4().hex[:8]}',
+        'message': message,
+        'time': time.strftime('%H:%M:%S', time.localtime(now)),
+        'confidence': round(confidence),
+        'cameraId': camera_id,
     }
+    get_backend().append_alert(alert)
+    publish_event('alert', alert)
+    return alert
 
 
-def start_session() -> None:
-    if not STATE.running:
-        STATE.running = True
-        STATE.start_time = time.time()
+def record_stats(**counts: int) -> None:
+    """Atomically add to the session counters (totalDetections, normalCount, suspiciousCount).
 
+    All three count people; see state_backends.
+    """
+    get_backend().increment(counts)
 
-def stop_session() -> None:
-    STATE.running = False
 
+def set_activity_status(status: str) -> None:
+    get_backend().set_value('activityStatus', status)
 
-def _update_uptime() -> None:
-    if STATE.start_time is None or not STATE.running:
-        STATE.stats['uptime'] = 0
-        return
-    STATE.stats['uptime'] = int(time.time() - STATE.start_time)
 
+def is_running() -> bool:
+    return get_backend().session()[0]
 
-def tick_simulation() -> None:
-    """Update uptime only - real detections come from YOLO/VideoMAE endpoints.
 
-    The simulation is disabled to allow real AI detection to work.
-    """
-    _update_uptime()
-    # Simulation disabled - real detection comes from /api/detect/ and /api/classify/ endpoints
-    return
+def start_session() -> None:
+    if get_backend().start_session(time.time()):
+        publish_event('session', session_event())
+
+
+def stop_session() -> None:
+    if get_backend().stop_session():
+        publish_event('session', session_event())
 
 
-def get_state(activity_status: str) -> dict[str, Any]:
-    _update_uptime()
+def get_state(activity_status: str | None = None) -> dict[str, Any]:
+    backend = get_backend()
+    running, start_time = backend.session()
+    if activity_status is None:
+        activity_status = backend.get_value('activityStatus', 'normal') if running else 'idle'
+    uptime = int(time.time() - start_time) if running and start_time is not None else 0
     return {
-        'running': STATE.running,
+        'running': running,
         'activityStatus': activity_status,
-        'detections': STATE.detections,
-        'alerts': STATE.alerts,
-        'stats': STATE.stats,
+        'detections': [],
+        'alerts': backend.alerts(50),
+        'stats': {**backend.counters(), 'uptime': uptime},
+        'startTime': start_time,
     }
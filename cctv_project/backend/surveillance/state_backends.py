@@ -0,0 +1,303 @@
+"""Storage backends for the surveillance session state.
+
+`memory` keeps everything in the process (fine for a single runserver).
+`sqlite` keeps it in a WAL-mode SQLite file so every gunicorn/uvicorn worker
+on a node sees the same session, counters, alerts, events and presence:
+
+- the session row is flipped with conditional UPDATEs, so concurrent
+  start/stop calls from different workers can't both "win";
+- stats are `value = value + n` upserts, all keys of one call in one transaction;
+- alerts are an append-only table read newest-first by primary key;
+- `/api/events/` events are an append-only table too. Each serving process
+  follows it (events.EventBus.follow) and uses the row id as the SSE id, so
+  every worker streams the same events under the same ids;
+- cascade presence (when a camera last had a detector result, and last had
+  people in it) is one row per camera, so the detection gate sees requests
+  handled by any worker.
+
+WAL lets readers (the frequent /api/state/ calls) proceed while a writer
+commits, so reads stay cheap. Selected by settings.STATE_BACKEND.
+
+Verdict smoothing, the camera hub and evidence rings stay per-process.
+
+Counters are all in people: `totalDetections` counts people detected, and
+`normalCount` / `suspiciousCount` split them by the status they were shown with.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+STAT_KEYS = ('totalDetections', 'normalCount', 'suspiciousCount')
+
+
+class MemoryStateBackend:
+    """Process-local state guarded by a lock."""
+
+    def __init__(self, max_alerts: int = 50) -> None:
+        self._lock = threading.Lock()
+        self._max_alerts = max_alerts
+        self.reset()
+
+    def start_session(self, now: float) -> bool:
+        with self._lock:
+            if self._running:
+                return False
+            self._running, self._start_time = True, now
+            return True
+
+    def stop_session(self) -> bool:
+        with self._lock:
+            if not self._running:
+                return False
+            self._running = False
+            return True
+
+    def session(self) -> tuple[bool, float | None]:
+        with self._lock:
+            return self._running, self._start_time
+
+    def increment(self, counts: dict[str, int]) -> None:
+        with self._lock:
+            for key, n in counts.items():
+                self._counters[key] = self._counters.get(key, 0) + n
+
+    def counters(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def append_alert(self, alert: dict[str, Any]) -> None:
+        with self._lock:
+            self._alerts.insert(0, alert)
+            del self._alerts[self._max_alerts:]
+
+    def alerts(self, limit: int = 50) -> list[dict[str, Any]]:
+        with self._lock:
+            return self._alerts[:limit]
+
+    def append_event(self, event_type: str, data: dict[str, Any]) -> int | None:
+        """No shared log in memory: returns None and the caller publishes to its own bus."""
+        return None
+
+    def record_presence(self, camera_id: str, people: bool, now: float) -> None:
+        with self._lock:
+            _, last_people_at = self._presence.get(camera_id, (None, None))
+            self._presence[camera_id] = (now, now if people else last_people_at)
+
+    def presence(self, camera_id: str) -> tuple[float | None, float | None]:
+        """(last detector result, last detection with people) for the camera."""
+        with self._lock:
+            return self._presence.get(camera_id, (None, None))
+
+    def set_value(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def get_value(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._values.get(key, default)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._running = False
+            self._start_time: float | None = None
+            self._counters = {key: 0 for key in STAT_KEYS}
+            self._alerts: list[dict[str, Any]] = []
+            self._values: dict[str, Any] = {}
+            self._presence: dict[str, tuple[float | None, float | None]] = {}
+
+
+class SQLiteStateBackend:
+    """Cross-process state in a WAL-mode SQLite database (one connection per thread)."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS session (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            running INTEGER NOT NULL DEFAULT 0,
+            start_time REAL
+        );
+        INSERT OR IGNORE INTO session (id, running, start_time) VALUES (1, 0, NULL);
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS alerts (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at REAL NOT NULL,
+            payload TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS kv (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            payload TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS presence (
+            camera_id TEXT PRIMARY KEY,
+            last_detect_at REAL NOT NULL,
+            last_people_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str | Path, max_alerts: int = 10_000, max_events: int = 10_000) -> None:
+        self.path = str(path)
+        self._max_alerts = max_alerts
+        self._max_events = max_events
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(self.SCHEMA)
+        # Identifies this database in SSE ids; survives reset() (event ids keep increasing) but not a new file
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; multi-statement writes take an explicit IMMEDIATE transaction
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._local.conn = conn
+        return conn
+
+    def start_session(self, now: float) -> bool:
+        cur = self._conn().execute(
+            'UPDATE session SET running = 1, start_time = ? WHERE id = 1 AND running = 0', (now,)
+        )
+        return cur.rowcount == 1
+
+    def stop_session(self) -> bool:
+        cur = self._conn().execute('UPDATE session SET running = 0 WHERE id = 1 AND running = 1')
+        return cur.rowcount == 1
+
+    def session(self) -> tuple[bool, float | None]:
+        running, start_time = self._conn().execute(
+            'SELECT running, start_time FROM session WHERE id = 1'
+        ).fetchone()
+        return bool(running), start_time
+
+    def increment(self, counts: dict[str, int]) -> None:
+        rows = [(key, n) for key, n in counts.items() if n]
+        if not rows:
+            return
+        conn = self._conn()
+        # One transaction, so a reader never sees some counters updated and not others
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO counters (name, value) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                rows,
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def counters(self) -> dict[str, int]:
+        values = {key: 0 for key in STAT_KEYS}
+        values.update(self._conn().execute('SELECT name, value FROM counters').fetchall())
+        return values
+
+    def append_alert(self, alert: dict[str, Any]) -> None:
+        conn = self._conn()
+        cur = conn.execute(
+            'INSERT INTO alerts (created_at, payload) VALUES (?, ?)',
+            (time.time(), json.dumps(alert, separators=(',', ':'))),
+        )
+        # Bound the table without rewriting it on every append
+        if cur.lastrowid % 1000 == 0:
+            conn.execute('DELETE FROM alerts WHERE seq <= ?', (cur.lastrowid - self._max_alerts,))
+
+    def alerts(self, limit: int = 50) -> list[dict[str, Any]]:
+        rows = self._conn().execute('SELECT payload FROM alerts ORDER BY seq DESC LIMIT ?', (limit,)).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def append_event(self, event_type: str, data: dict[str, Any]) -> int:
+        """Append to the shared event log; the row id is the event id every worker streams it under."""
+        conn = self._conn()
+        cur = conn.execute(
+            'INSERT INTO events (type, payload) VALUES (?, ?)',
+            (event_type, json.dumps(data, separators=(',', ':'))),
+        )
+        if cur.lastrowid % 1000 == 0:
+            conn.execute('DELETE FROM events WHERE seq <= ?', (cur.lastrowid - self._max_events,))
+        return cur.lastrowid
+
+    def events_after(self, event_id: int, limit: int = 500) -> list[tuple[int, str, dict[str, Any]]]:
+        rows = self._conn().execute(
+            'SELECT seq, type, payload FROM events WHERE seq > ? ORDER BY seq LIMIT ?', (event_id, limit)
+        ).fetchall()
+        return [(seq, event_type, json.loads(payload)) for seq, event_type, payload in rows]
+
+    def last_event_id(self) -> int:
+        # sqlite_sequence keeps the AUTOINCREMENT high-water mark even when the table is empty
+        row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        return row[0] if row else 0
+
+    def event_epoch(self) -> str:
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def record_presence(self, camera_id: str, people: bool, now: float) -> None:
+        self._conn().execute(
+            'INSERT INTO presence (camera_id, last_detect_at, last_people_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(camera_id) DO UPDATE SET '
+            'last_detect_at = max(last_detect_at, excluded.last_detect_at), '
+            'last_people_at = coalesce(max(last_people_at, excluded.last_people_at), '
+            'last_people_at, excluded.last_people_at)',
+            (camera_id, now, now if people else None),
+        )
+
+    def presence(self, camera_id: str) -> tuple[float | None, float | None]:
+        """(last detector result, last detection with people) for the camera, from any worker."""
+        row = self._conn().execute(
+            'SELECT last_detect_at, last_people_at FROM presence WHERE camera_id = ?', (camera_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def set_value(self, key: str, value: Any) -> None:
+        self._conn().execute(
+            'INSERT INTO kv (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, json.dumps(value)),
+        )
+
+    def get_value(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def reset(self) -> None:
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE session SET running = 0, start_time = NULL WHERE id = 1')
+            conn.execute('DELETE FROM counters')
+            conn.execute('DELETE FROM alerts')
+            conn.execute('DELETE FROM kv')
+            conn.execute('DELETE FROM presence')
+            # Events are kept: followers must still see the `reset` event published next
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def create_backend(name: str, **options: Any) -> MemoryStateBackend | SQLiteStateBackend:
+    if name == 'memory':
+        return MemoryStateBackend()
+    if name == 'sqlite':
+        return SQLiteStateBackend(options['path'])
+    raise ValueError(f"Unknown STATE_BACKEND: {name!r} (expected 'memory' or 'sqlite')")
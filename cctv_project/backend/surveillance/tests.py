@@ -0,0 +1,536 @@
+import base64
+import json
+import os
+import random
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from . import columnar
+from .cascade import CascadeConfig, DetectionCascade
+from .events import EventBus
+from .evidence import EvidenceConfig, EvidenceStore
+from .jobs import JobConfig, JobQueue
+from .state_backends import SQLiteStateBackend
+from .recordings import RecordingStore
+from .views import _detect_pipeline, _wants_columnar
+
+# Encoded payloads the frontend's decoder test (src/columnar.test.js) checks
+# against; regenerate with UPDATE_COLUMNAR_FIXTURES=1 python manage.py test surveillance
+FRONTEND_FIXTURES = Path(__file__).resolve().parents[2] / 'cctv-frontend' / 'src' / 'columnar.fixtures.json'
+FIXTURE_SEED = 2024
+FIXTURE_CASES = 12
+
+
+def _random_number(rng: random.Random):
+    pick = rng.random()
+    if pick < 0.25:
+        return rng.randint(-40000, 40000)
+    if pick < 0.5:
+        return round(rng.uniform(0, 100), rng.randint(0, 2))
+    if pick < 0.7:
+        return round(rng.uniform(-1e6, 1e6), rng.randint(0, 6))
+    if pick < 0.85:
+        return rng.uniform(-1, 1)  # full precision, falls back to float64
+    return rng.choice([0.0, -0.0, 1e-7, 1e21, 2 ** 31, -(2 ** 31) - 1, 0.1 + 0.2])
+
+
+def _random_value(rng: random.Random, labels: list[str]):
+    pick = rng.random()
+    if pick < 0.5:
+        return _random_number(rng)
+    if pick < 0.75:
+        return rng.choice(labels)
+    if pick < 0.85:
+        return rng.choice([True, False])
+    return None
+
+
+def random_payload(rng: random.Random, max_rows: int = 40) -> dict:
+    """A detection/state-like payload: tables of flat records plus nested JSON."""
+    labels = [f'label_{i}' for i in range(rng.choice([2, 20, 300]))]  # 300: uint16 string codes
+    keys = ['id', 'x', 'y', 'width', 'height', 'confidence', 'status', 'statusConfidence']
+    homogeneous = rng.random() < 0.5
+    column_kind = {key: rng.choice(['int', 'float2', 'float', 'str', 'any']) for key in keys}
+
+    def cell(key: str):
+        if not homogeneous:
+            return _random_value(rng, labels)
+        kind = column_kind[key]
+        if kind == 'int':
+            return rng.randint(-70000, 70000)
+        if kind == 'float2':
+            return round(rng.uniform(0, 100), 2)
+        if kind == 'float':
+            return rng.uniform(-1e3, 1e3)
+        if kind == 'str':
+            return rng.choice(labels)
+        return _random_value(rng, labels)
+
+    rows = []
+    for _ in range(rng.randint(1, max_rows)):
+        # Some rows lack some keys (e.g. statusConfidence only with per-person classification)
+        rows.append({key: cell(key) for key in keys if rng.random() < 0.9})
+    if not any(rows):
+        rows[0]['id'] = 'human_0'
+    return {
+        'success': rng.random() < 0.9,
+        'count': len(rows),
+        'detections': rows,
+        'empty': [],
+        'nested': {'alerts': rows[: rng.randint(1, len(rows))], 'tags': labels[:3], 'n': _random_number(rng)},
+    }
+
+
+def _canonical(value) -> str:
+    return json.dumps(value, sort_keys=True)
+
+
+def fixture_cases() -> list[dict]:
+    rng = random.Random(FIXTURE_SEED)
+    cases = []
+    for _ in range(FIXTURE_CASES):
+        payload = random_payload(rng, max_rows=8)
+        cases.append({
+            'json': json.dumps(payload),
+            'columnar': base64.b64encode(columnar.encode(payload)).decode('ascii'),
+        })
+    return cases
+
+
+class ColumnarRoundTripTests(SimpleTestCase):
+    def test_random_payloads_round_trip_to_the_json_values(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            payload = random_payload(rng)
+            # What a JSON client would see, with int/float distinctions intact
+            expected = json.loads(json.dumps(payload))
+            decoded = columnar.decode(columnar.encode(payload))
+            self.assertEqual(_canonical(decoded), _canonical(expected))
+
+    def test_fixed_point_columns_decode_to_the_same_doubles(self):
+        values = [12.34, 0.1, 99.99, 0.3, 45.6, 100.0]
+        payload = {'detections': [{'x': v} for v in values]}
+        body = columnar.encode(payload)
+        header = json.loads(body[9:9 + int.from_bytes(body[5:9], 'little')])
+        self.assertEqual(header['tables'][0][1][0][1], 'f')
+        self.assertEqual([row['x'] for row in columnar.decode(body)['detections']], values)
+
+    def test_rejects_other_payloads(self):
+        with self.assertRaises(ValueError):
+            columnar.decode(b'JSON\x01\x00\x00\x00\x00')
+
+    def test_frontend_fixtures_match_the_encoder(self):
+        cases = fixture_cases()
+        if os.environ.get('UPDATE_COLUMNAR_FIXTURES') == '1':
+            FRONTEND_FIXTURES.write_text(json.dumps(cases, indent=1) + '\n', encoding='utf-8')
+        if not FRONTEND_FIXTURES.exists():
+            self.skipTest(f'{FRONTEND_FIXTURES} not present')
+        self.assertEqual(json.loads(FRONTEND_FIXTURES.read_text(encoding='utf-8')), cases)
+        for case in cases:
+            decoded = columnar.decode(base64.b64decode(case['columnar']))
+            self.assertEqual(_canonical(decoded), _canonical(json.loads(case['json'])))
+
+
+class ColumnarNegotiationTests(SimpleTestCase):
+    def wants(self, accept: str) -> bool:
+        return _wants_columnar(RequestFactory().post('/api/detect/', HTTP_ACCEPT=accept))
+
+    def test_named_columnar_wins(self):
+        self.assertTrue(self.wants(columnar.MEDIA_TYPE))
+        self.assertTrue(self.wants(f'{columnar.MEDIA_TYPE}, application/json;q=0.9'))
+        self.assertTrue(self.wants(f'{columnar.MEDIA_TYPE}, */*'))
+
+    def test_json_ranked_higher_wins(self):
+        self.assertFalse(self.wants(f'{columnar.MEDIA_TYPE};q=0.1, application/json'))
+        self.assertFalse(self.wants(f'application/json, {columnar.MEDIA_TYPE};q=0.5'))
+        self.assertFalse(self.wants(f'{columnar.MEDIA_TYPE};q=0.2, */*;q=0.8'))
+
+    def test_refused_or_absent(self):
+        self.assertFalse(self.wants(f'{columnar.MEDIA_TYPE};q=0'))
+        self.assertFalse(self.wants('application/json'))
+        self.assertFalse(self.wants('*/*'))
+
+    def test_malformed_q_does_not_raise(self):
+        self.assertTrue(self.wants(f'{columnar.MEDIA_TYPE};q=high'))
+        self.assertTrue(self.wants(f'{columnar.MEDIA_TYPE};q=nan, application/json;q=0.5'))
+        self.assertFalse(self.wants(f'{columnar.MEDIA_TYPE};q=0.3, application/json;q=bogus'))
+
+
+class RecordingIngestTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name) / 'media'
+        self.state_dir = Path(tmp.name) / 'state'
+        self.store = RecordingStore(self.root, state_dir=self.state_dir)
+        self.incoming = self.store.incoming_dir
+
+    def upload(self, name: str = 'clip.mp4') -> Path:
+        path = self.incoming / name
+        path.write_bytes(b'\x00' * 1024)
+        return path
+
+    def test_unsplit_upload_is_indexed_whole(self):
+        recording = self.store.ingest(self.upload(), camera_id='cam1', started_at=1000.0, ended_at=1060.0, split=False)
+        self.assertEqual(recording['segments'], 1)
+        self.assertEqual(recording['duration'], 60.0)
+        self.assertEqual(len(self.store.query('cam1', 1010.0, 1020.0)), 1)
+        self.assertEqual(list(self.incoming.iterdir()), [])
+
+    def test_failed_ingest_leaves_nothing_behind(self):
+        with mock.patch.object(RecordingStore, '_index', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.store.ingest(self.upload(), camera_id='cam1', started_at=1000.0, ended_at=1060.0, split=False)
+        self.assertEqual(list(self.incoming.iterdir()), [])
+        self.assertEqual([p for p in (self.root / 'segments').rglob('*') if p.is_file()], [])
+        self.assertEqual(self.store.usage()['segments'], 0)
+
+    def test_index_and_incoming_stay_out_of_the_served_root(self):
+        self.store.ingest(self.upload(), camera_id='cam1', started_at=1000.0, ended_at=1060.0, split=False)
+        served = sorted(p.relative_to(self.root).parts[0] for p in self.root.rglob('*') if p.is_file())
+        self.assertEqual(served, ['segments'])
+        self.assertTrue((self.state_dir / 'index.sqlite3').exists())
+
+    def test_legacy_index_in_the_served_root_is_moved(self):
+        legacy_root = self.root.parent / 'legacy'
+        RecordingStore(legacy_root).ingest(
+            self.upload(), camera_id='cam1', started_at=1000.0, ended_at=1060.0, split=False,
+        )
+        moved = RecordingStore(legacy_root, state_dir=legacy_root.parent / 'legacy-state')
+        self.assertFalse((legacy_root / 'index.sqlite3').exists())
+        self.assertEqual(len(moved.query('cam1', 1010.0, 1020.0)), 1)
+
+
+class JobQueueTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.statuses = []
+        self.queue = JobQueue(
+            Path(tmp.name) / 'jobs.sqlite3',
+            JobConfig(max_attempts=2, lease_seconds=60),
+            on_status=lambda job, status, details: self.statuses.append((job.id, status)),
+        )
+        self.queue.register('work', lambda job: {'ok': True})
+
+    def expire_leases(self):
+        self.queue._conn().execute("UPDATE jobs SET locked_until = 0 WHERE status = 'running'")
+
+    def test_expired_last_attempt_fails_instead_of_running_again(self):
+        job_id = self.queue.enqueue('work')
+        for _ in range(2):
+            job, _ = self.queue._claim(['work'])
+            self.assertEqual(job.id, job_id)
+            self.expire_leases()
+        self.assertFalse(self.queue.run_once())
+        self.assertEqual(self.queue.jobs()[0]['status'], 'failed')
+        self.assertIn((job_id, 'failed'), self.statuses)
+
+    def test_worker_that_lost_its_lease_cannot_finish(self):
+        self.queue.enqueue('work')
+        stale, _ = self.queue._claim(['work'])
+        self.expire_leases()
+        current, _ = self.queue._claim(['work'])
+        self.assertNotEqual(stale.worker, current.worker)
+        self.assertIsNone(self.queue._finish(stale, None, 'RuntimeError: too slow'))
+        self.assertEqual(self.queue.jobs()[0]['status'], 'running')
+        self.assertEqual(self.queue._finish(current, {'ok': True}, None), 'done')
+
+
+class EvidenceStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = EvidenceStore(EvidenceConfig(path=tmp.name, max_cameras=2, post_frames=1, post_timeout=60))
+        self.frame = base64.b64encode(b'jpeg').decode('ascii')
+
+    def test_rings_are_capped_to_the_most_recent_cameras(self):
+        for camera in ('cam1', 'cam2', 'cam1', 'cam3'):
+            self.store.observe(camera, self.frame)
+        self.assertEqual(list(self.store._rings), ['cam1', 'cam3'])
+        self.assertEqual(set(self.store._ring_bytes), {'cam1', 'cam3'})
+
+    def test_repeated_capture_keeps_the_first_pending_alert(self):
+        self.store.capture('alert_1', 'cam1', [self.frame])
+        first = self.store._pending['alert_1']
+        self.store.capture('alert_1', 'cam1', [self.frame, self.frame])
+        self.assertIs(self.store._pending['alert_1'], first)
+        first.timer.cancel()
+
+    def frames(self, *names: str) -> list[str]:
+        return [base64.b64encode(name.encode()).decode('ascii') for name in names]
+
+    def pending_frames(self, alert_id: str) -> list[tuple[str, str, float]]:
+        pending = self.store._pending[alert_id]
+        pending.timer.cancel()
+        return [(base64.b64decode(frame).decode(), role, ts) for frame, role, ts in pending.frames]
+
+    def test_clip_frames_are_stored_once_with_their_own_times(self):
+        with mock.patch('surveillance.evidence.time.time', side_effect=[1.0, 2.0, 3.0, 9.0]):
+            for frame in self.frames('f1', 'f2', 'f3'):
+                self.store.observe('cam1', frame)
+            self.store.capture('alert_1', 'cam1', self.frames('f2', 'f3', 'f4'), [7.0, 7.5, 8.0])
+        self.assertEqual(self.pending_frames('alert_1'), [
+            ('f1', 'before', 1.0), ('f2', 'trigger', 7.0), ('f3', 'trigger', 7.5), ('f4', 'trigger', 8.0),
+        ])
+
+    def test_without_frame_times_clip_frames_take_the_time_the_ring_saw_them(self):
+        with mock.patch('surveillance.evidence.time.time', side_effect=[1.0, 2.0, 9.0]):
+            for frame in self.frames('f1', 'f2'):
+                self.store.observe('cam1', frame)
+            self.store.capture('alert_1', 'cam1', self.frames('f2', 'f3'))
+        self.assertEqual(self.pending_frames('alert_1'), [
+            ('f1', 'before', 1.0), ('f2', 'trigger', 2.0), ('f3', 'trigger', 9.0),
+        ])
+
+
+class MetricsAccessTests(TestCase):
+    def test_anonymous_is_refused(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Basic', response['WWW-Authenticate'])
+
+    def test_staff_basic_auth_is_served(self):
+        User.objects.create_user('ops', password='secret', is_staff=True)
+        User.objects.create_user('viewer', password='secret')
+        auth = lambda user: 'Basic ' + base64.b64encode(f'{user}:secret'.encode()).decode()
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION=auth('viewer')).status_code, 401)
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION=auth('ops'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+class InferenceInputTests(SimpleTestCase):
+    def post(self, path: str, body: dict):
+        return self.client.post(path, json.dumps(body), content_type='application/json')
+
+    def test_bad_confidence_is_a_400(self):
+        for confidence in ('x', None, 1.5, -0.1, 'nan', True):
+            response = self.post('/api/detect/', {'image': 'aGk=', 'confidence': confidence})
+            self.assertEqual(response.status_code, 400, confidence)
+            self.assertIn('confidence', response.json()['error'])
+
+    def test_bad_num_frames_is_a_400(self):
+        for num_frames in ('x', None, 0, 1, 1000, [16]):
+            response = self.post('/api/classify/', {'frames': ['aGk='], 'numFrames': num_frames})
+            self.assertEqual(response.status_code, 400, num_frames)
+            self.assertIn('numFrames', response.json()['error'])
+
+    def test_bad_frame_times_is_a_400(self):
+        for frame_times in ('x', [1000], [1000, 'x'], [1000, True], {}):
+            response = self.post('/api/classify/', {'frames': ['aGk=', 'aGk='], 'frameTimes': frame_times})
+            self.assertEqual(response.status_code, 400, frame_times)
+            self.assertIn('frameTimes', response.json()['error'])
+
+
+class DetectionCascadeTests(SimpleTestCase):
+    def setUp(self):
+        self.cascade = DetectionCascade(CascadeConfig(presence_window=3.0, enter_count=2, exit_count=3))
+
+    def votes(self, *labels: str) -> list:
+        return [self.cascade.record_result('cam1', label, 80.0 + i) for i, label in enumerate(labels)]
+
+    def test_enters_suspicious_only_after_enter_count_in_a_row(self):
+        first, second = self.votes('suspicious', 'suspicious')
+        self.assertEqual((first.prediction, first.changed), ('normal', False))
+        self.assertEqual((second.prediction, second.changed), ('suspicious', True))
+        self.assertEqual(second.confidence, 81.0)
+
+    def test_an_interrupted_streak_starts_over(self):
+        verdicts = self.votes('suspicious', 'normal', 'suspicious')
+        self.assertEqual([v.prediction for v in verdicts], ['normal'] * 3)
+
+    def test_exits_only_after_exit_count_normals_in_a_row(self):
+        self.votes('suspicious', 'suspicious')
+        verdicts = [self.cascade.record_result('cam1', 'normal', 90.0) for _ in range(3)]
+        self.assertEqual([v.prediction for v in verdicts], ['suspicious', 'suspicious', 'normal'])
+        self.assertEqual([v.changed for v in verdicts], [False, False, True])
+
+    def test_classifies_only_within_the_presence_window(self):
+        self.assertTrue(self.cascade.needs_probe('cam1', now=100.0))
+        self.assertFalse(self.cascade.should_classify('cam1', now=100.0))
+        self.cascade.record_detections('cam1', 2, now=100.0)
+        self.assertFalse(self.cascade.needs_probe('cam1', now=102.0))
+        self.assertTrue(self.cascade.should_classify('cam1', now=103.0))
+        self.assertFalse(self.cascade.should_classify('cam1', now=103.5))
+        self.assertTrue(self.cascade.needs_probe('cam1', now=103.5))
+        # An empty detection refreshes the detector result but not presence
+        self.cascade.record_detections('cam1', 0, now=103.5)
+        self.assertFalse(self.cascade.needs_probe('cam1', now=104.0))
+        self.assertFalse(self.cascade.should_classify('cam1', now=104.0))
+
+    def test_skips_vote_normal_with_the_last_normal_confidence(self):
+        self.cascade.record_result('cam1', 'normal', 70.0)
+        self.cascade.record_result('cam1', 'suspicious', 95.0)
+        skipped = self.cascade.record_skip('cam1')
+        self.assertTrue(skipped.skipped)
+        self.assertEqual((skipped.prediction, skipped.confidence), ('normal', 70.0))
+        # Skips count towards leaving the suspicious state
+        self.votes('suspicious', 'suspicious')
+        verdicts = [self.cascade.record_skip('cam1') for _ in range(3)]
+        self.assertEqual([v.prediction for v in verdicts], ['suspicious', 'suspicious', 'normal'])
+
+    def test_disabled_cascade_always_classifies_and_passes_verdicts_through(self):
+        self.cascade.configure(enabled=False)
+        self.assertFalse(self.cascade.needs_probe('cam1'))
+        self.assertTrue(self.cascade.should_classify('cam1'))
+        verdict = self.cascade.record_result('cam1', 'suspicious', 60.0)
+        self.assertEqual((verdict.prediction, verdict.changed), ('suspicious', True))
+
+    def test_stats_count_runs_skips_and_probes(self):
+        self.cascade.record_probe('cam1', 1, now=100.0)
+        self.votes('normal', 'normal', 'normal')
+        self.cascade.record_skip('cam1')
+        self.cascade.record_skip('cam2')
+        stats = self.cascade.stats()
+        self.assertEqual((stats['classifierRuns'], stats['classifierSkipped']), (3, 2))
+        self.assertEqual(stats['skipRatio'], 0.4)
+        self.assertEqual(stats['cameras']['cam1'], {
+            'state': 'normal', 'classifierRuns': 3, 'classifierSkipped': 1, 'detectorProbes': 1,
+        })
+
+    def test_smoothed_is_normal_for_unknown_cameras_and_follows_the_votes(self):
+        self.assertEqual(self.cascade.smoothed('unseen'), 'normal')
+        self.assertNotIn('unseen', self.cascade.stats()['cameras'])
+        self.votes('suspicious')
+        self.assertEqual(self.cascade.smoothed('cam1'), 'normal')
+        self.votes('suspicious')
+        self.assertEqual(self.cascade.smoothed('cam1'), 'suspicious')
+
+
+class DetectStatsTests(SimpleTestCase):
+    def setUp(self):
+        self.cascade = DetectionCascade(CascadeConfig(enter_count=1))
+        patches = [
+            mock.patch('surveillance.views.CASCADE', self.cascade),
+            mock.patch('surveillance.views.record_stats'),
+            mock.patch('surveillance.yolo_detector.detect_humans'),
+        ]
+        self.record_stats, self.detect_humans = [p.start() for p in patches][1:]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def counts(self, detections: list) -> dict:
+        self.detect_humans.return_value = detections
+        _detect_pipeline('image', 0.5, 'cam1')
+        return self.record_stats.call_args.kwargs
+
+    def test_counts_each_person_with_their_own_verdict(self):
+        counts = self.counts([
+            {'status': 'suspicious', 'statusConfidence': 90.0},
+            {'status': 'normal', 'statusConfidence': 80.0},
+            {'status': 'normal', 'statusConfidence': 70.0},
+        ])
+        self.assertEqual(counts, {'totalDetections': 3, 'normalCount': 2, 'suspiciousCount': 1})
+
+    def test_people_without_a_verdict_take_the_smoothed_camera_state(self):
+        self.assertEqual(
+            self.counts([{'status': 'normal'}, {'status': 'normal'}]),
+            {'totalDetections': 2, 'normalCount': 2, 'suspiciousCount': 0},
+        )
+        self.cascade.record_result('cam1', 'suspicious', 90.0)
+        self.assertEqual(
+            self.counts([{'status': 'normal'}, {'status': 'suspicious', 'statusConfidence': 60.0}]),
+            {'totalDetections': 2, 'normalCount': 0, 'suspiciousCount': 2},
+        )
+
+
+class EventResumeTests(SimpleTestCase):
+    def setUp(self):
+        self.bus = EventBus(history=3)
+        for i in range(5):
+            self.bus.publish('alert', {'n': i})
+
+    def opening(self, last_event_id):
+        """Event types and ids the stream starts with, up to the first heartbeat."""
+        events = []
+        for event in self.bus.stream_sync(last_event_id, 0.01, lambda: {'state': True}):
+            if event is None:
+                break
+            events.append((event.type, event.id))
+        return events
+
+    def test_known_id_replays_what_was_missed(self):
+        self.assertEqual(self.opening(f'{self.bus.epoch}-3'), [('alert', 4), ('alert', 5)])
+        self.assertEqual(self.opening(f'{self.bus.epoch}-5'), [])
+
+    def test_unresumable_ids_get_a_snapshot(self):
+        for last_event_id in (
+            None,
+            f'{self.bus.epoch}-40',  # newer than anything published here
+            f'{self.bus.epoch}-1',  # event 2 already fell out of the ring
+            'deadbeef-3',  # another process, or this one before a restart
+            '3',
+        ):
+            self.assertEqual(self.opening(last_event_id), [('snapshot', 5)], last_event_id)
+
+    def test_ids_carry_the_epoch(self):
+        event = self.bus.publish('session', {})
+        self.assertTrue(event.encode().startswith(f'id: {self.bus.epoch}-6\n'))
+
+
+class SQLiteStateBackendTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.backend = SQLiteStateBackend(Path(tmp.name) / 'state.sqlite3')
+
+    def test_increment_updates_all_counters_in_one_transaction(self):
+        self.backend.increment({'totalDetections': 3, 'normalCount': 2, 'suspiciousCount': 1})
+        self.assertEqual(self.backend.counters(), {'totalDetections': 3, 'normalCount': 2, 'suspiciousCount': 1})
+        real_conn = self.backend._conn()
+        statements = []
+        real_conn.set_trace_callback(statements.append)
+        self.backend.increment({'totalDetections': 1, 'normalCount': 0, 'suspiciousCount': 1})
+        real_conn.set_trace_callback(None)
+        self.assertEqual(statements[0], 'BEGIN IMMEDIATE')
+        self.assertEqual(statements[-1], 'COMMIT')
+        self.assertEqual(self.backend.counters(), {'totalDetections': 4, 'normalCount': 2, 'suspiciousCount': 2})
+
+    def worker(self) -> SQLiteStateBackend:
+        """Another process's view of the same database."""
+        return SQLiteStateBackend(self.backend.path)
+
+    def test_event_ids_are_shared_and_keep_increasing_across_reset(self):
+        other = self.worker()
+        first = self.backend.append_event('alert', {'n': 1})
+        self.assertEqual(other.events_after(0), [(first, 'alert', {'n': 1})])
+        self.assertEqual(other.event_epoch(), self.backend.event_epoch())
+        self.backend.reset()
+        second = other.append_event('reset', {'running': False})
+        self.assertGreater(second, first)
+        self.assertEqual(self.backend.last_event_id(), second)
+        self.assertEqual([row[0] for row in self.backend.events_after(first)], [second])
+
+    def test_every_follower_streams_the_same_events_under_the_same_ids(self):
+        self.backend.append_event('session', {'running': True})
+        buses = [EventBus(history=10), EventBus(history=10)]
+        for bus in buses:
+            bus.follow(self.worker(), poll_interval=0.01)
+            self.addCleanup(bus.unfollow)
+        # Primed from the log: a client can resume on either worker
+        self.assertEqual([bus.last_id for bus in buses], [1, 1])
+        event_id = self.worker().append_event('alert', {'id': 'a1'})
+        for bus in buses:
+            events = bus.stream_sync(f'{bus.epoch}-1', 5.0, dict)
+            event = next(events)
+            events.close()
+            self.assertEqual((event.id, event.type, event.epoch), (event_id, 'alert', self.backend.event_epoch()))
+
+    def test_cascade_presence_is_shared_between_workers(self):
+        detect_worker = DetectionCascade(CascadeConfig(presence_window=3.0))
+        classify_worker = DetectionCascade(CascadeConfig(presence_window=3.0))
+        detect_worker.share_presence(self.backend)
+        classify_worker.share_presence(self.worker())
+        self.assertTrue(classify_worker.needs_probe('cam1', now=100.0))
+        detect_worker.record_detections('cam1', 2, now=100.0)
+        detect_worker.record_detections('cam1', 0, now=101.0)
+        self.assertFalse(classify_worker.needs_probe('cam1', now=102.0))
+        self.assertTrue(classify_worker.should_classify('cam1', now=102.0))
+        self.assertFalse(classify_worker.should_classify('cam1', now=103.5))
+        self.backend.reset()
+        self.assertTrue(classify_worker.needs_probe('cam1', now=102.0))
@@ -1,10 +1,21 @@
 from django.urls import path
 
 from .views import (
+    AlertEvidenceView,
+    CameraEventsView,
+    CameraListView,
+    CascadeStatsView,
     ClassifyActivityView,
     DetectHumansView,
+    EventsView,
     HealthView,
+    JobListView,
+    MetricsView,
+    ProfileView,
+    RecordingFootageView,
     RecordingListView,
+    RecordingReanalyzeView,
+    RecordingStorageView,
     RecordingUploadView,
     SessionResetView,
     SessionStartView,
@@ -14,15 +25,26 @@ from .views import (
 
 urlpatterns = [
     path('health/', HealthView.as_view(), name='health'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('debug/profile/', ProfileView.as_view(), name='debug-profile'),
     path('session/start/', SessionStartView.as_view(), name='session-start'),
     path('session/stop/', SessionStopView.as_view(), name='session-stop'),
     path('session/reset/', SessionResetView.as_view(), name='session-reset'),
     path('state/', StateView.as_view(), name='state'),
+    path('events/', EventsView.as_view(), name='events'),
+    path('cameras/', CameraListView.as_view(), name='camera-list'),
+    path('cameras/<str:camera_id>/events/', CameraEventsView.as_view(), name='camera-events'),
+    path('alerts/<str:alert_id>/evidence/', AlertEvidenceView.as_view(), name='alert-evidence'),
 
     path('recordings/', RecordingListView.as_view(), name='recording-list'),
     path('recordings/upload/', RecordingUploadView.as_view(), name='recording-upload'),
+    path('recordings/footage/', RecordingFootageView.as_view(), name='recording-footage'),
+    path('recordings/storage/', RecordingStorageView.as_view(), name='recording-storage'),
+    path('recordings/reanalyze/', RecordingReanalyzeView.as_view(), name='recording-reanalyze'),
+    path('jobs/', JobListView.as_view(), name='job-list'),
     
     path('detect/', DetectHumansView.as_view(), name='detect-humans'),
 
     path('classify/', ClassifyActivityView.as_view(), name='classify-activity'),
+    path('cascade/', CascadeStatsView.as_view(), name='cascade-stats'),
 ]
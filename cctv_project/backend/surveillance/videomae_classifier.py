@@ -10,16 +10,29 @@ from __future__ import annotations
 
 import base64
 import io
+import threading
+import time
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 from PIL import Image
 
+from . import metrics, quantization
+
 
 _MODEL = None
 _MODEL_SOURCE = None
 
+# Ultralytics predictors are not thread-safe; the model is shared by the
+# classify pool, per-person classification on the detect pool and background jobs
+_MODEL_LOAD_LOCK = threading.Lock()
+_MODEL_LOCK = threading.Lock()
+
+# Endpoint label for stage timers (matches the /api/classify/ URL name)
+_METRICS_ENDPOINT = "classify-activity"
+
 
 @dataclass(frozen=True)
 class ClassificationResult:
@@ -29,12 +42,14 @@ class ClassificationResult:
 
 
 def _decode_data_url_jpeg(data_url: str) -> Image.Image:
-    if "," in data_url:
-        data_url = data_url.split(",", 1)[1]
-    raw = base64.b64decode(data_url)
-    img = Image.open(io.BytesIO(raw))
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+    with metrics.timer(_METRICS_ENDPOINT, "base64_decode"):
+        if "," in data_url:
+            data_url = data_url.split(",", 1)[1]
+        raw = base64.b64decode(data_url)
+    with metrics.timer(_METRICS_ENDPOINT, "image_decode"):
+        img = Image.open(io.BytesIO(raw))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
     return img
 
 
@@ -58,8 +73,8 @@ def _looks_like_hf_repo_id(value: str) -> bool:
     return bool(v) and "/" in v and "\\" not in v and ":" not in v and not v.endswith(".pt")
 
 
-def _load_model(model_source: Optional[str] = None):
-    """Load YOLO model.
+def resolve_weights(model_source: Optional[str] = None) -> str:
+    """Resolve a model source to a local weights file (or whatever YOLO accepts).
 
     model_source may be:
     - local .pt file path
@@ -67,15 +82,6 @@ def _load_model(model_source: Optional[str] = None):
     - Hugging Face repo id (owner/repo)
     """
 
-    global _MODEL, _MODEL_SOURCE
-    if _MODEL is not None and _MODEL_SOURCE == (model_source or ""):
-        return _MODEL
-
-    try:
-        from ultralytics import YOLO  # type: ignore
-    except Exception as e:
-        raise RuntimeError("Missing dependency for YOLO inference. Install: ultralytics") from e
-
     resolved_source = (model_source or "").strip()
     if not resolved_source:
         resolved_source = "Accurateinfosolution/Suspicious_activity_detection_Yolov11_Custom"
@@ -99,8 +105,6 @@ def _load_model(model_source: Optional[str] = None):
     else:
         # If a directory is provided, try to locate the weights file inside it.
         try:
-            from pathlib import Path
-
             p = Path(resolved_source)
             if p.exists() and p.is_dir():
                 candidate = p / "Suspicious_Activities_nano.pt"
@@ -109,13 +113,40 @@ def _load_model(model_source: Optional[str] = None):
         except Exception:
             # If path parsing fails, YOLO will raise a clearer error.
             pass
+    return weights_path
 
-    model = YOLO(weights_path)
-    _MODEL = model
-    _MODEL_SOURCE = (model_source or "")
-    return model
 
+def _load_model(model_source: Optional[str] = None):
+    """Load YOLO model (see resolve_weights for model_source).
+
+    With MODEL_PRECISION=int8 on a CPU-only node, a registered INT8 variant of
+    the same weights is loaded instead (see quantization).
+    """
 
+    global _MODEL, _MODEL_SOURCE
+    if _MODEL is not None and _MODEL_SOURCE == (model_source or ""):
+        return _MODEL
+
+    with _MODEL_LOAD_LOCK:
+        if _MODEL is not None and _MODEL_SOURCE == (model_source or ""):
+            return _MODEL
+
+        try:
+            from ultralytics import YOLO  # type: ignore
+        except Exception as e:
+            raise RuntimeError("Missing dependency for YOLO inference. Install: ultralytics") from e
+
+        weights_path, _ = quantization.select_weights("classifier", resolve_weights(model_source))
+
+        load_start = time.perf_counter()
+        model = YOLO(weights_path, task="detect")
+        metrics.record_model_load(Path(str(weights_path)).name, time.perf_counter() - load_start)
+        _MODEL = model
+        _MODEL_SOURCE = (model_source or "")
+        return model
+
+
+@metrics.request_totals()
 def classify_activity(
     frame_data_urls: List[str],
     *,
@@ -131,18 +162,54 @@ def classify_activity(
 
     # Use the most recent frame for speed.
     frame = frames[-1]
-    img = np.array(frame)
+    # PIL decodes lazily, so the JPEG pixel decode actually happens here.
+    with metrics.timer(_METRICS_ENDPOINT, "image_decode"):
+        img = np.array(frame)
 
     # Run detection. Keep thresholds modest; frontend applies its own gating.
-    results = model(
-        img,
-        verbose=False,
-        conf=0.25,
-        iou=0.45,
-        imgsz=480,
-        max_det=50,
-    )
+    with _MODEL_LOCK, metrics.timer(_METRICS_ENDPOINT, "inference"):
+        results = model(
+            img,
+            verbose=False,
+            conf=0.25,
+            iou=0.45,
+            imgsz=480,
+            max_det=50,
+        )
+
+    with metrics.timer(_METRICS_ENDPOINT, "postprocess"):
+        return _summarize(results, model)
+
+
+def classify_crops(
+    crops: List[np.ndarray],
+    *,
+    model_dir: Optional[str] = None,
+    img_size: int = 256,
+) -> List[ClassificationResult]:
+    """Classify several person crops in a single batched forward pass.
+
+    Crops are RGB arrays cut from an already-decoded frame; they may differ in
+    size (each is letterboxed to `img_size`). Returns one result per crop, in
+    order.
+    """
+    if not crops:
+        return []
+    model = _load_model(model_source=model_dir)
+    with _MODEL_LOCK:
+        results = model(
+            list(crops),
+            verbose=False,
+            conf=0.25,
+            iou=0.45,
+            imgsz=img_size,
+            max_det=10,
+        )
+    return [_summarize([r], model) for r in results]
+
 
+def _summarize(results: Any, model: Any) -> ClassificationResult:
+    """Turn raw YOLO results into a normal/suspicious verdict."""
     suspicious_labels = {"people", "person"}
     max_people_conf = 0.0
     max_suspicious_conf = 0.0
@@ -1,14 +1,50 @@
-import os
+import asyncio
+import base64
+import binascii
+import json
+import math
 import time
-from pathlib import Path
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
 from django.utils.text import get_valid_filename
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from .services import STATE, get_state, reset_state, start_session, stop_session, tick_simulation
+from . import columnar, metrics, profiler
+from .camera_hub import CAMERA_HUB
+from .cascade import CASCADE
+from .recording_jobs import KINDS as RECORDING_JOB_KINDS, enqueue_recording, get_queue
+from .recordings import get_store, parse_timestamp
+from .events import BUS, heartbeat_comment
+from .evidence import EVIDENCE
+from .inference_pool import InferencePoolFull, get_pool
+from .renderers import ColumnarRenderer
+from .services import (
+    add_alert,
+    get_state,
+    publish_event,
+    record_stats,
+    reset_state,
+    set_activity_status,
+    start_session,
+    stop_session,
+)
+
+# State endpoints also speak the compact columnar format when asked for it
+STATE_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarRenderer]
+
+# Clip lengths /api/classify/ samples to (evenly spaced frames; 2+ to space them)
+MIN_CLIP_FRAMES, MAX_CLIP_FRAMES = 2, 64
 
 
 class HealthView(APIView):
@@ -16,6 +52,26 @@ class HealthView(APIView):
         return Response({'status': 'ok'})
 
 
+class MetricsView(View):
+    """Prometheus text exposition of latency histograms and counters.
+
+    Staff only, like the profiler: latencies and traffic per endpoint are not
+    public. Scrapers authenticate with HTTP Basic credentials of a staff user.
+    """
+
+    http_method_names = ['get', 'options']
+
+    def get(self, request):
+        if not _is_staff(request):
+            response = JsonResponse({'error': 'Staff credentials required'}, status=401)
+            response['WWW-Authenticate'] = 'Basic realm="metrics"'
+            return response
+        return HttpResponse(
+            metrics.render_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
 class SessionStartView(APIView):
     def post(self, request):
         start_session()
@@ -31,23 +87,114 @@ class SessionStopView(APIView):
 class SessionResetView(APIView):
     def post(self, request):
         reset_state()
+        CASCADE.reset()
+        CAMERA_HUB.reset()
         return Response({'running': False})
 
 
 class StateView(APIView):
     """Return the latest detection/alert/stat state.
 
-    For now this also advances the simulation each time it's polled.
+    Read from the configured state backend, so every worker answers the same.
     """
 
+    renderer_classes = STATE_RENDERERS
+
+    def get(self, request):
+        return Response(get_state())
+
+
+def _sse_response(request, bus, snapshot) -> StreamingHttpResponse:
+    """Stream `bus` as Server-Sent Events, starting with a snapshot or a replay.
+
+    A connection resuming with a Last-Event-ID this bus can replay from gets
+    the missed events; any other gets `snapshot()` as its first event (see
+    events). Async under ASGI, a blocking generator under WSGI.
+    """
+    last_event_id = _last_event_id(request)
+    heartbeat = float(getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15))
+    preamble = 'retry: 3000\n\n'
+
+    if isinstance(request, ASGIRequest):
+        async def body():
+            yield preamble
+            async for event in bus.stream(last_event_id, heartbeat, snapshot):
+                yield heartbeat_comment() if event is None else event.encode()
+    else:
+        def body():
+            yield preamble
+            for event in bus.stream_sync(last_event_id, heartbeat, snapshot):
+                yield heartbeat_comment() if event is None else event.encode()
+
+    response = StreamingHttpResponse(body(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class EventsView(View):
+    """Server-Sent Events stream of alerts and state changes.
+
+    A fresh connection starts with a `snapshot` event (same payload as
+    /api/state/); after that only `alert`, `session`, `activity` and `reset`
+    events are sent, plus a heartbeat comment every
+    settings.EVENTS_HEARTBEAT_SECONDS. Reconnecting with `Last-Event-ID`
+    (EventSource does this automatically) replays what was missed instead,
+    when this server still has it; otherwise the stream restarts with a
+    snapshot.
+    """
+
+    http_method_names = ['get', 'options']
+
+    async def get(self, request):
+        return _sse_response(request, BUS, get_state)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CameraEventsView(View):
+    """Per-camera stream of shared inference results.
+
+    Every fresh `/api/detect/` or `/api/classify/` result for the camera is
+    sent once as a `detections` / `classification` event, so any number of
+    viewers can watch a camera while only one client posts its frames.
+    Only cameras that frames were posted for recently, or that are listed in
+    CAMERA_SHARING['cameras'], can be watched; others answer 404.
+    """
+
+    http_method_names = ['get', 'options']
+
+    async def get(self, request, camera_id):
+        bus = CAMERA_HUB.bus(camera_id)
+        if bus is None:
+            return JsonResponse({'error': f'Unknown camera {camera_id!r}'}, status=404)
+        return _sse_response(request, bus, lambda: {
+            'cameraId': camera_id,
+            'detections': CAMERA_HUB.latest(camera_id, 'detections'),
+            'classification': CAMERA_HUB.latest(camera_id, 'classification'),
+        })
+
+
+class CameraListView(APIView):
+    """Cameras seen by the fan-out hub: inferences run vs. responses shared."""
+
+    renderer_classes = STATE_RENDERERS
+
     def get(self, request):
-        if STATE.running:
-            tick_simulation()
-            activity_status = STATE.detections[-1]['status'] if STATE.detections else 'normal'
-        else:
-            activity_status = 'idle'
+        return Response({'cameras': CAMERA_HUB.stats()})
+
+
+def _last_event_id(request) -> str | None:
+    return request.headers.get('Last-Event-ID') or request.GET.get('lastEventId') or None
 
-        return Response(get_state(activity_status))
+
+class CascadeStatsView(APIView):
+    """How often the activity model ran vs. was skipped by the detection gate."""
+
+    renderer_classes = STATE_RENDERERS
+
+    def get(self, request):
+        return Response(CASCADE.stats())
 
 
 class RecordingUploadView(APIView):
@@ -60,14 +207,20 @@ class RecordingUploadView(APIView):
         - file: video/webm
         - startedAt (optional): ISO string
         - endedAt (optional): ISO string
+        - cameraId (optional): camera the footage belongs to ('default')
+
+        The file is indexed by time as one segment (see recordings); `url`
+        points at it. A segment job is queued that cuts it into
+        fixed-duration segments and then queues the probe, thumbnail and
+        analysis jobs (see recording_jobs).
         """
 
         uploaded = request.FILES.get('file')
         if uploaded is None:
             return Response({'error': 'Missing file field'}, status=400)
 
-        recordings_dir = Path(settings.MEDIA_ROOT)
-        recordings_dir.mkdir(parents=True, exist_ok=True)
+        store = get_store()
+        incoming_dir = store.incoming_dir
 
         ts = time.strftime('%Y%m%d_%H%M%S')
         original_name = get_valid_filename(getattr(uploaded, 'name', 'recording.mp4'))
@@ -75,115 +228,511 @@ class RecordingUploadView(APIView):
         if not original_name.endswith(('.mp4', '.webm')):
             original_name = original_name + '.mp4'
         base_name = f"recording_{ts}_{original_name}"
-        out_path = recordings_dir / base_name
-
-        # Avoid overwriting
-        if out_path.exists():
-            out_path = recordings_dir / f"recording_{ts}_{int(time.time() * 1000)}_{original_name}"
+        out_path = incoming_dir / f"{int(time.time() * 1000)}_{base_name}"
 
-        with open(out_path, 'wb') as f:
-            for chunk in uploaded.chunks():
-                f.write(chunk)
-
-        rel_path = out_path.relative_to(settings.MEDIA_ROOT).as_posix()
-        url = f"{settings.MEDIA_URL}{out_path.name}"
+        try:
+            with open(out_path, 'wb') as f:
+                for chunk in uploaded.chunks():
+                    f.write(chunk)
+        except BaseException:
+            out_path.unlink(missing_ok=True)
+            raise
+
+        # Indexed whole; the segment job cuts it so ffmpeg stays out of the request
+        recording = store.ingest(
+            out_path,
+            camera_id=str(request.data.get('cameraId') or 'default'),
+            filename=base_name,
+            started_at=parse_timestamp(request.data.get('startedAt')),
+            ended_at=parse_timestamp(request.data.get('endedAt')),
+            split=False,
+        )
+        jobs = enqueue_recording(recording['id'])
 
         return Response(
             {
                 'saved': True,
-                'filename': out_path.name,
-                'path': rel_path,
-                'url': url,
+                'id': recording['id'],
+                'filename': base_name,
+                'path': recording['path'],
+                'url': recording['url'],
+                'cameraId': recording['cameraId'],
                 'startedAt': request.data.get('startedAt'),
                 'endedAt': request.data.get('endedAt'),
-                'size': os.path.getsize(out_path),
+                'size': recording['size'],
+                'segments': recording['segments'],
+                'jobs': jobs,
             }
         )
 
 
 class RecordingListView(APIView):
+    """Uploaded recordings, newest first, read from the segment index."""
+
+    def get(self, request):
+        return Response({'recordings': get_store().list_recordings()})
+
+
+class RecordingReanalyzeView(APIView):
+    """Queue processing jobs again, e.g. after a model update.
+
+    JSON body: `ids` (default: every indexed recording) and `kinds`
+    (default: ['analyze']; any of segment, probe, thumbnail, analyze).
+    """
+
+    def post(self, request):
+        kinds = request.data.get('kinds') or ['analyze']
+        if not isinstance(kinds, list) or not set(kinds) <= set(RECORDING_JOB_KINDS):
+            return Response({'error': f"kinds must be a list of: {', '.join(RECORDING_JOB_KINDS)}"}, status=400)
+        ids = request.data.get('ids')
+        store = get_store()
+        if ids is None:
+            ids = [r['id'] for r in store.list_recordings(limit=100_000)]
+        elif not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return Response({'error': 'ids must be a list of recording ids'}, status=400)
+
+        queued = {i: enqueue_recording(i, kinds) for i in ids if store.recording(i) is not None}
+        return Response({'queued': queued, 'missing': [i for i in ids if i not in queued]})
+
+
+class JobListView(APIView):
+    """Job queue counts per kind/status and the most recent jobs (`?recordingId=` to filter)."""
+
+    def get(self, request):
+        queue = get_queue()
+        recording_id = request.GET.get('recordingId')
+        if recording_id is not None and not recording_id.isdigit():
+            return Response({'error': 'recordingId must be an integer'}, status=400)
+        return Response({
+            **queue.stats(),
+            'jobs': queue.jobs(int(recording_id) if recording_id is not None else None),
+        })
+
+
+class RecordingFootageView(APIView):
+    """Segments covering a time range of one camera.
+
+    Query parameters: `cameraId` ('default'), `start` and `end` as ISO
+    datetimes, epoch seconds or local `HH:MM[:SS]` (on `date`, default
+    today). Each segment comes with `seekOffset`/`endOffset` in seconds so
+    a player can jump straight to the requested span.
+    """
+
+    def get(self, request):
+        date = request.GET.get('date')
+        start = parse_timestamp(request.GET.get('start'), date)
+        end = parse_timestamp(request.GET.get('end'), date)
+        if start is None or end is None or end <= start:
+            return Response({'error': 'start and end are required and end must be after start'}, status=400)
+        camera_id = request.GET.get('cameraId') or 'default'
+        return Response({
+            'cameraId': camera_id,
+            'start': start,
+            'end': end,
+            'segments': get_store().query(camera_id, start, end),
+        })
+
+
+class RecordingStorageView(APIView):
+    """Disk usage of the segment store against its quota."""
+
     def get(self, request):
-        recordings_dir = Path(settings.MEDIA_ROOT)
-        recordings_dir.mkdir(parents=True, exist_ok=True)
-
-        items = []
-        # Find both .webm and .mp4 files
-        video_files = list(recordings_dir.glob('*.webm')) + list(recordings_dir.glob('*.mp4'))
-        for p in sorted(video_files, key=lambda x: x.stat().st_mtime, reverse=True):
-            rel_path = p.relative_to(settings.MEDIA_ROOT).as_posix()
-            items.append(
+        return Response(get_store().usage())
+
+
+def _is_staff(request) -> bool:
+    """Staff session (Django admin login) or HTTP Basic credentials of a staff user."""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Basic '):
+        try:
+            username, _, password = base64.b64decode(header[6:]).decode('utf-8').partition(':')
+        except (binascii.Error, UnicodeDecodeError):
+            return False
+        user = authenticate(request, username=username, password=password)
+    else:
+        user = request.user
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ProfileView(View):
+    """Time-boxed sampling profile of this process as collapsed stacks (see profiler).
+
+    Staff only, and 404 unless PROFILING_ENABLED=1. Query parameters:
+    `seconds` (default 10), `hz` (default 200), `idle=1` to keep parked
+    threads, `lines=1` for per-line frames and `format=json` for the stacks
+    with a summary. The default text body feeds flamegraph.pl directly; its
+    summary is in the X-Profile-* headers.
+
+    Async so a capture doesn't hold the thread the ASGI server runs sync
+    views on; sampling happens on a worker thread.
+    """
+
+    http_method_names = ['get', 'options']
+
+    async def get(self, request):
+        if not profiler.CONFIG.enabled:
+            return JsonResponse({'error': 'Not found'}, status=404)
+        if not await sync_to_async(_is_staff)(request):
+            response = JsonResponse({'error': 'Staff credentials required'}, status=401)
+            response['WWW-Authenticate'] = 'Basic realm="profiler"'
+            return response
+        try:
+            seconds = float(request.GET.get('seconds', 10))
+            hz = float(request.GET.get('hz', 200))
+        except ValueError:
+            return JsonResponse({'error': 'seconds and hz must be numbers'}, status=400)
+
+        try:
+            result = await asyncio.to_thread(
+                profiler.profile,
+                seconds,
+                hz,
+                include_idle=request.GET.get('idle') == '1',
+                lines=request.GET.get('lines') == '1',
+            )
+        except profiler.ProfilerBusy:
+            return JsonResponse({'error': 'A profile is already running'}, status=409)
+
+        summary = result.summary()
+        if request.GET.get('format') == 'json':
+            return JsonResponse({**summary, 'stacks': dict(result.stacks.most_common())})
+        response = HttpResponse(result.collapsed(), content_type='text/plain; charset=utf-8')
+        for key in ('seconds', 'samples', 'effectiveHz', 'overhead', 'distinctStacks'):
+            response[f'X-Profile-{key[0].upper()}{key[1:]}'] = str(summary[key])
+        return response
+
+
+class AlertEvidenceView(APIView):
+    """Frames archived for an alert (see evidence): before, trigger and after.
+
+    Frames come back inline as data URLs; `?frame=N` returns frame N's raw
+    image instead. 202 while the alert is still collecting its post frames.
+    """
+
+    def get(self, request, alert_id):
+        evidence = EVIDENCE.get(alert_id)
+        if evidence is None:
+            if EVIDENCE.is_pending(alert_id):
+                return Response({'alertId': alert_id, 'pending': True}, status=202)
+            return Response({'error': 'No evidence for this alert'}, status=404)
+
+        frames = evidence['frames']
+        index = request.GET.get('frame')
+        if index is not None:
+            if not index.isdigit() or int(index) >= len(frames):
+                return Response({'error': f'frame must be 0..{len(frames) - 1}'}, status=400)
+            data, _, mime, _ = frames[int(index)]
+            return HttpResponse(data, content_type=mime)
+
+        return Response({
+            'alertId': evidence['alertId'],
+            'cameraId': evidence['cameraId'],
+            'createdAt': evidence['createdAt'],
+            'frames': [
                 {
-                    'filename': p.name,
-                    'url': f"{settings.MEDIA_URL}{p.name}",
-                    'size': p.stat().st_size,
-                    'modifiedAt': int(p.stat().st_mtime),
+                    'role': role,
+                    'timestamp': ts,
+                    'size': len(data),
+                    'data': f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}",
                 }
-            )
+                for data, role, mime, ts in frames
+            ],
+        })
+
+
+def _parse_json_body(request, endpoint: str) -> dict | None:
+    """Decode a JSON object body for the async views (DRF parsers are sync-only)."""
+    with metrics.timer(endpoint, 'parse'):
+        try:
+            data = json.loads(request.body or b'{}')
+        except (ValueError, UnicodeDecodeError):
+            return None
+    return data if isinstance(data, dict) else None
+
+
+def _bounded_number(data: dict, key: str, default, cast, low, high):
+    """`data[key]` (or `default`) converted by `cast` and within [low, high]; None if it isn't one."""
+    value = data.get(key, default)
+    if isinstance(value, bool):
+        return None
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return number if low <= number <= high else None  # NaN fails both comparisons
+
+
+def _frame_times(value, count: int) -> list[float] | None:
+    """Epoch seconds from a list of `count` epoch-millisecond numbers; None if it isn't one."""
+    if not isinstance(value, list) or len(value) != count:
+        return None
+    if not all(isinstance(t, (int, float)) and not isinstance(t, bool) and math.isfinite(t) for t in value):
+        return None
+    return [t / 1000 for t in value]
+
+
+def _json_response(endpoint: str, payload: dict, status: int = 200) -> JsonResponse:
+    with metrics.timer(endpoint, 'serialize'):
+        return JsonResponse(payload, status=status)
+
+
+def _accept_quality(media_type) -> float:
+    """The q-value of an Accept entry; a malformed one counts as the default 1."""
+    try:
+        q = float(media_type.params.get('q', 1))
+    except (TypeError, ValueError):
+        return 1.0
+    return min(max(q, 0.0), 1.0) if q == q else 1.0
+
+
+def _wants_columnar(request) -> bool:
+    """True when the Accept header ranks the columnar encoding at least as high as JSON."""
+    columnar_q = json_q = 0.0
+    for t in request.accepted_types:
+        media_type = f'{t.main_type}/{t.sub_type}'
+        if media_type == columnar.MEDIA_TYPE:
+            columnar_q = max(columnar_q, _accept_quality(t))
+        elif media_type in ('application/json', 'application/*', '*/*'):
+            json_q = max(json_q, _accept_quality(t))
+    return columnar_q > 0 and columnar_q >= json_q
+
+
+def _negotiated_response(request, endpoint: str, payload: dict, status: int = 200) -> HttpResponse:
+    """JSON, or the columnar encoding when the client's Accept header names it."""
+    if _wants_columnar(request):
+        with metrics.timer(endpoint, 'serialize'):
+            response = HttpResponse(columnar.encode(payload), status=status, content_type=columnar.MEDIA_TYPE)
+    else:
+        response = _json_response(endpoint, payload, status=status)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def _overloaded_response(endpoint: str, payload: dict) -> JsonResponse:
+    """Fast 503 when the endpoint's inference queue is full."""
+    response = _json_response(
+        endpoint,
+        {'success': False, 'error': 'Inference queue is full, retry later', **payload},
+        status=503,
+    )
+    response['Retry-After'] = str(getattr(settings, 'INFERENCE_RETRY_AFTER_SECONDS', 1))
+    return response
+
+
+def _detect_pipeline(image_data: str, confidence: float, camera_id: str) -> dict:
+    """Detection plus cascade bookkeeping; runs on the inference pool."""
+    from .yolo_detector import detect_humans
+
+    detections = detect_humans(
+        image_data,
+        confidence_threshold=confidence,
+        rois=getattr(settings, 'DETECTION_ROIS', {}).get(camera_id),
+        adaptive=getattr(settings, 'DETECTION_ADAPTIVE_RESOLUTION', False),
+        classify_people=getattr(settings, 'PER_PERSON_CLASSIFICATION', None),
+        model_dir=getattr(settings, 'VIDEOMAE_MODEL_DIR', None),
+    )
+    CASCADE.record_detections(camera_id, len(detections))
+    # Counted per person like the dashboard: per-person verdicts when present,
+    # otherwise the camera's smoothed activity verdict
+    frame_status = CASCADE.smoothed(camera_id)
+    statuses = [d['status'] if 'statusConfidence' in d else frame_status for d in detections]
+    record_stats(
+        totalDetections=len(detections),
+        normalCount=statuses.count('normal'),
+        suspiciousCount=statuses.count('suspicious'),
+    )
+    return {
+        'success': True,
+        'detections': detections,
+        'count': len(detections)
+    }
+
+
+def _classify_pipeline(frames: list, num_frames: int, camera_id: str, frame_times: list[float] | None = None) -> dict:
+    """Cascade-gated classification, smoothing and alerting; runs on the inference pool."""
+    from .videomae_classifier import classify_activity
+    from .yolo_detector import detect_humans
+
+    if CASCADE.needs_probe(camera_id):
+        people = detect_humans(frames[-1], rois=getattr(settings, 'DETECTION_ROIS', {}).get(camera_id))
+        CASCADE.record_probe(camera_id, len(people))
+
+    result = None
+    if CASCADE.should_classify(camera_id):
+        result = classify_activity(
+            frames,
+            num_frames=num_frames,
+            model_dir=getattr(settings, 'VIDEOMAE_MODEL_DIR', None),
+        )
+        verdict = CASCADE.record_result(camera_id, result.prediction, result.confidence)
+    else:
+        verdict = CASCADE.record_skip(camera_id)
+
+    if verdict.changed:
+        set_activity_status(verdict.prediction)
+        publish_event('activity', {
+            'cameraId': camera_id,
+            'status': verdict.prediction,
+            'confidence': round(verdict.confidence, 2),
+        })
+        if verdict.prediction == 'suspicious':
+            alert = add_alert('Suspicious activity detected', verdict.confidence, camera_id)
+            EVIDENCE.capture(alert['id'], camera_id, frames, frame_times)
+
+    probabilities = result.probabilities if result is not None else {
+        'normal': 100.0 if verdict.prediction == 'normal' else 0.0,
+        'suspicious': 100.0 if verdict.prediction == 'suspicious' else 0.0,
+    }
+    return {
+        'success': True,
+        'prediction': verdict.prediction,
+        'confidence': round(verdict.confidence, 2),
+        'probabilities': {k: round(v, 2) for k, v in probabilities.items()},
+        'rawPrediction': result.prediction if result is not None else None,
+        'skipped': verdict.skipped,
+    }
+
+
+async def _run_inference(endpoint: str, shared_camera: str | None, key: tuple, window: float, fn, *args) -> dict:
+    """Run a pipeline on the endpoint's pool, shared per camera when one is named.
+
+    With a camera, concurrent and recent requests for the same key reuse one
+    result (CAMERA_HUB) and each fresh result is broadcast to the camera's
+    subscribers; `shared` tells the caller whether it got someone else's.
+    """
+    pool = get_pool(endpoint)
+    if shared_camera is None or not CAMERA_HUB.config.enabled:
+        return await pool.run(fn, *args)
 
-        return Response({'recordings': items})
+    payload, shared = await CAMERA_HUB.run(
+        (shared_camera, *key),
+        window,
+        lambda: pool.submit(fn, *args),
+        on_result=lambda bus, result: bus.publish(key[0], result),
+    )
+    return {**payload, 'shared': shared}
 
 
-class DetectHumansView(APIView):
+@method_decorator(csrf_exempt, name='dispatch')
+class DetectHumansView(View):
     """YOLO-based human detection endpoint.
     
     Receives a base64 encoded image and returns bounding boxes for detected humans.
+    An optional `cameraId` selects that camera's regions of interest
+    (settings.DETECTION_ROIS); boxes are always in full-frame percentages.
+
+    Async: the model call runs on the bounded `detect-humans` inference pool and
+    a full queue answers 503 with Retry-After instead of waiting. Requests
+    naming a `cameraId` share one inference per camera (see camera_hub).
+    `Accept: application/vnd.cctv.columnar` returns the same payload in the
+    compact columnar encoding (see columnar).
     """
-    
-    def post(self, request):
-        image_data = request.data.get('image')
+
+    http_method_names = ['post', 'options']
+    endpoint = 'detect-humans'
+
+    async def post(self, request):
+        data = _parse_json_body(request, self.endpoint)
+        if data is None:
+            return _json_response(self.endpoint, {'error': 'Invalid JSON body'}, status=400)
+        image_data = data.get('image')
         if not image_data:
-            return Response({'error': 'Missing image data'}, status=400)
-        
-        confidence = float(request.data.get('confidence', 0.5))
+            return _json_response(self.endpoint, {'error': 'Missing image data'}, status=400)
+
+        confidence = _bounded_number(data, 'confidence', 0.5, float, 0.0, 1.0)
+        if confidence is None:
+            return _json_response(self.endpoint, {'error': 'confidence must be a number from 0 to 1'}, status=400)
+        shared_camera = str(data['cameraId']) if data.get('cameraId') else None
+        camera_id = shared_camera or 'default'
+        EVIDENCE.observe(camera_id, image_data)
         
         try:
-            from .yolo_detector import detect_humans
-            detections = detect_humans(image_data, confidence_threshold=confidence)
-            return Response({
-                'success': True,
-                'detections': detections,
-                'count': len(detections)
-            })
+            payload = await _run_inference(
+                self.endpoint,
+                shared_camera,
+                ('detections', confidence),
+                CAMERA_HUB.config.detect_window,
+                _detect_pipeline,
+                image_data,
+                confidence,
+                camera_id,
+            )
+            return _negotiated_response(request, self.endpoint, payload)
+        except InferencePoolFull:
+            return _overloaded_response(self.endpoint, {'detections': []})
         except Exception as e:
-            return Response({
+            return _json_response(self.endpoint, {
                 'success': False,
                 'error': str(e),
                 'detections': []
             }, status=500)
 
 
-class ClassifyActivityView(APIView):
+@method_decorator(csrf_exempt, name='dispatch')
+class ClassifyActivityView(View):
     """VideoMAE-based activity classification endpoint.
 
     Expects JSON:
       { "frames": ["data:image/jpeg;base64,...", ...] }
+    plus optional "numFrames", "cameraId" and "frameTimes" (each frame's
+    capture time in epoch ms, used to date alert evidence).
 
     Returns:
       { "success": true, "prediction": "normal|suspicious", "confidence": 0..100, "probabilities": {...} }
+
+    Async, on the bounded `classify-activity` inference pool (503 when full).
+
+    Gated by the detection cascade: the activity model only runs when people
+    were seen on this `cameraId` recently (probing the detector on the last
+    frame if there's no fresh detection). `prediction` is the hysteresis-
+    smoothed verdict; `rawPrediction` is this call's own result, or null
+    when the classifier was skipped. Shared per named camera like detection.
     """
 
-    def post(self, request):
-        frames = request.data.get('frames')
+    http_method_names = ['post', 'options']
+    endpoint = 'classify-activity'
+
+    async def post(self, request):
+        data = _parse_json_body(request, self.endpoint)
+        if data is None:
+            return _json_response(self.endpoint, {'error': 'Invalid JSON body'}, status=400)
+        frames = data.get('frames')
         if not isinstance(frames, list) or len(frames) == 0:
-            return Response({'error': 'Missing frames list'}, status=400)
+            return _json_response(self.endpoint, {'error': 'Missing frames list'}, status=400)
 
-        num_frames = int(request.data.get('numFrames', 16))
+        num_frames = _bounded_number(data, 'numFrames', 16, int, MIN_CLIP_FRAMES, MAX_CLIP_FRAMES)
+        if num_frames is None:
+            return _json_response(
+                self.endpoint, {'error': f'numFrames must be an integer from {MIN_CLIP_FRAMES} to {MAX_CLIP_FRAMES}'},
+                status=400,
+            )
+        frame_times = None
+        if data.get('frameTimes') is not None:
+            frame_times = _frame_times(data['frameTimes'], len(frames))
+            if frame_times is None:
+                return _json_response(
+                    self.endpoint, {'error': 'frameTimes must be a list of epoch milliseconds, one per frame'},
+                    status=400,
+                )
+        shared_camera = str(data['cameraId']) if data.get('cameraId') else None
+        camera_id = shared_camera or 'default'
+        EVIDENCE.observe(camera_id, frames[-1])
 
         try:
-            from .videomae_classifier import classify_activity
-
-            result = classify_activity(
+            payload = await _run_inference(
+                self.endpoint,
+                shared_camera,
+                ('classification', num_frames),
+                CAMERA_HUB.config.classify_window,
+                _classify_pipeline,
                 frames,
-                num_frames=num_frames,
-                model_dir=getattr(settings, 'VIDEOMAE_MODEL_DIR', None),
-            )
-            return Response(
-                {
-                    'success': True,
-                    'prediction': result.prediction,
-                    'confidence': round(result.confidence, 2),
-                    'probabilities': {k: round(v, 2) for k, v in result.probabilities.items()},
-                }
+                num_frames,
+                camera_id,
+                frame_times,
             )
+            return _json_response(self.endpoint, payload)
+        except InferencePoolFull:
+            return _overloaded_response(self.endpoint, {})
         except Exception as e:
-            return Response({'success': False, 'error': str(e)}, status=500)
+            return _json_response(self.endpoint, {'success': False, 'error': str(e)}, status=500)
@@ -9,16 +9,28 @@ Optimized for multi-human detection in surveillance scenarios.
 import base64
 import io
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 
 import numpy as np
 from PIL import Image
 
+from . import metrics, quantization
+
 logger = logging.getLogger(__name__)
 
+# Endpoint label for stage timers (matches the /api/detect/ URL name)
+_METRICS_ENDPOINT = 'detect-humans'
+
 # Global model instance (lazy loaded)
 _model = None
 
+# Ultralytics predictors keep per-call state and are not thread-safe; the model
+# is shared by the detect pool, per-person classification and background jobs
+_model_load_lock = threading.Lock()
+_model_lock = threading.Lock()
+
 # Detection settings optimized for surveillance - speed and accuracy balance
 DETECTION_CONFIG = {
     # Use YOLOv8n (nano) for fastest speed, good for real-time
@@ -39,27 +51,67 @@ DETECTION_CONFIG = {
     
     # Use half precision on GPU for speed (if available)
     'half_precision': True,
+
+    # Adaptive resolution: run a cheap low-resolution pass first, then re-run
+    # at high resolution only on tiles around low-confidence people. Enabled
+    # per request (settings.DETECTION_ADAPTIVE_RESOLUTION for the API).
+    'adaptive_low_img_size': 320,
+    'adaptive_high_img_size': 640,
+
+    # Low-res boxes within this distance of the requested confidence threshold
+    # (either side) are re-checked at high resolution
+    'adaptive_refine_margin': 0.15,
+
+    # Padding added around a low-confidence box when cutting its tile
+    # (fraction of the box width/height on each side)
+    'adaptive_tile_padding': 0.5,
+
+    # Upper bound on high-res tile re-runs per frame
+    'adaptive_max_tiles': 4,
+
+    # Per-person activity classification: crop each detected person from the
+    # decoded frame and classify all crops in one batched forward pass
+    'per_person_classification': False,
+
+    # Context added around each person box (fraction of box width/height)
+    'person_crop_padding': 0.1,
+
+    # Letterbox size for person crops in the batched classifier pass
+    'person_crop_img_size': 256,
+
+    # Most confident people classified per frame; the rest stay 'normal'
+    'max_person_crops': 16,
 }
 
 
 def get_model():
     """Lazy load the YOLO model with optimized settings for speed."""
     global _model
-    if _model is None:
+    if _model is not None:
+        return _model
+    with _model_load_lock:
+        if _model is not None:
+            return _model
         try:
             from ultralytics import YOLO
             import torch
             
             model_name = DETECTION_CONFIG['model_name']
-            print(f"[YOLO] Loading model: {model_name}")
-            _model = YOLO(model_name)
+            # INT8 variant when MODEL_PRECISION=int8 on a CPU-only node (see quantization)
+            weights, quantized = quantization.select_weights('detector', model_name)
+            print(f"[YOLO] Loading model: {weights}")
+            load_start = time.perf_counter()
+            model = YOLO(weights, task='detect')
             
+            if quantized:
+                print(f"[YOLO] INT8 variant loaded on CPU")
+                logger.info(f"YOLO model '{model_name}' loaded as INT8 variant '{weights}'")
             # Move to GPU if available for faster inference
-            if torch.cuda.is_available():
-                _model.to('cuda')
+            elif torch.cuda.is_available():
+                model.to('cuda')
                 # Use half precision for faster inference on GPU
                 if DETECTION_CONFIG['half_precision']:
-                    _model.half()
+                    model.half()
                 print(f"[YOLO] Model loaded on GPU (CUDA) with half precision")
                 logger.info(f"YOLO model '{model_name}' loaded on GPU (CUDA)")
             else:
@@ -68,8 +120,11 @@ def get_model():
             
             # Warm up the model with a dummy inference
             dummy = np.zeros((480, 640, 3), dtype=np.uint8)
-            _model(dummy, verbose=False)
+            model(dummy, verbose=False)
             print("[YOLO] Model warmed up")
+            metrics.record_model_load(model_name, time.perf_counter() - load_start)
+            # Published only once warmed up, so no caller runs it concurrently with the warm-up
+            _model = model
                 
         except Exception as e:
             print(f"[YOLO] FAILED to load model: {e}")
@@ -80,93 +135,264 @@ def get_model():
 
 def decode_base64_image(base64_string: str) -> np.ndarray:
     """Decode a base64 image string to numpy array."""
-    # Remove data URL prefix if present
-    if ',' in base64_string:
-        base64_string = base64_string.split(',')[1]
-    
-    image_data = base64.b64decode(base64_string)
-    image = Image.open(io.BytesIO(image_data))
-    
-    # Convert to RGB if necessary
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    return np.array(image)
+    with metrics.timer(_METRICS_ENDPOINT, 'base64_decode'):
+        # Remove data URL prefix if present
+        if ',' in base64_string:
+            base64_string = base64_string.split(',')[1]
 
+        image_data = base64.b64decode(base64_string)
 
-def detect_humans(image_data: str, confidence_threshold: float = None) -> List[Dict[str, Any]]:
-    """
-    Detect humans in an image with optimized settings for multiple people.
-    
-    Args:
-        image_data: Base64 encoded image string
-        confidence_threshold: Minimum confidence score (0-1), defaults to config value
-    
-    Returns:
-        List of detections with bounding boxes in percentage coordinates
+    with metrics.timer(_METRICS_ENDPOINT, 'image_decode'):
+        image = Image.open(io.BytesIO(image_data))
+
+        # Convert to RGB if necessary
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        return np.array(image)
+
+
+def _predict_boxes(
+    model,
+    image: np.ndarray,
+    confidence_threshold: float,
+    img_size: int,
+    offset: Tuple[int, int] = (0, 0),
+) -> np.ndarray:
+    """Run the model on an image (or crop) and return person boxes.
+
+    Returns an (N, 5) float array of x1, y1, x2, y2, confidence, shifted by
+    `offset` so coordinates are in full-frame pixels.
     """
-    if confidence_threshold is None:
-        confidence_threshold = DETECTION_CONFIG['default_confidence']
-    
-    try:
-        model = get_model()
-        
-        # Decode the image
-        image = decode_base64_image(image_data)
-        img_height, img_width = image.shape[:2]
-        
-        # Run detection with optimized settings for speed
+    with _model_lock, metrics.timer(_METRICS_ENDPOINT, 'inference'):
         results = model(
             image,
             verbose=False,
             conf=confidence_threshold,
             iou=DETECTION_CONFIG['iou_threshold'],
-            imgsz=DETECTION_CONFIG['img_size'],
+            imgsz=img_size,
             max_det=DETECTION_CONFIG['max_detections'],
             classes=[0],  # Only detect person class (class_id=0)
             agnostic_nms=False,
         )
-        
-        detections = []
-        detection_id = 0
-        
+
+    with metrics.timer(_METRICS_ENDPOINT, 'postprocess'):
+        offset_x, offset_y = offset
+        rows = []
         for result in results:
             boxes = result.boxes
             if boxes is None or len(boxes) == 0:
                 continue
-            
-            # Process all detected boxes
+
             for i in range(len(boxes)):
                 # Get class ID - 0 is 'person' in COCO dataset
-                class_id = int(boxes.cls[i])
-                if class_id != 0:  # Only detect humans (person class)
+                if int(boxes.cls[i]) != 0:
                     continue
-                
-                confidence = float(boxes.conf[i])
-                
-                # Get bounding box coordinates (xyxy format)
                 x1, y1, x2, y2 = boxes.xyxy[i].tolist()
-                
+                rows.append([
+                    x1 + offset_x,
+                    y1 + offset_y,
+                    x2 + offset_x,
+                    y2 + offset_y,
+                    float(boxes.conf[i]),
+                ])
+
+        return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def _nms(boxes: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression over (N, 5) xyxy+conf boxes.
+
+    Needed when crops overlap (adjacent ROIs, adaptive tiles) and the same
+    person is reported more than once.
+    """
+    if len(boxes) <= 1:
+        return boxes
+
+    order = np.argsort(-boxes[:, 4])
+    boxes = boxes[order]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        xx1 = np.maximum(boxes[i, 0], boxes[i + 1:, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[i + 1:, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[i + 1:, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[i + 1:, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[i + 1:] - inter, 1e-6)
+        suppressed[i + 1:] |= iou > iou_threshold
+
+    return boxes[keep]
+
+
+def _roi_to_pixels(roi: Sequence[float], img_width: int, img_height: int) -> Tuple[int, int, int, int]:
+    """Convert an ROI given as [x, y, width, height] percentages to a pixel rect."""
+    x, y, w, h = (float(v) for v in roi)
+    x1 = int(max(0.0, min(x, 100.0)) / 100 * img_width)
+    y1 = int(max(0.0, min(y, 100.0)) / 100 * img_height)
+    x2 = int(np.ceil(max(0.0, min(x + w, 100.0)) / 100 * img_width))
+    y2 = int(np.ceil(max(0.0, min(y + h, 100.0)) / 100 * img_height))
+    return x1, y1, x2, y2
+
+
+def _detect_adaptive(
+    model,
+    image: np.ndarray,
+    confidence_threshold: float,
+    offset: Tuple[int, int] = (0, 0),
+) -> np.ndarray:
+    """Low-res pass over the whole image, high-res re-runs on uncertain tiles.
+
+    People the low-res pass is already sure about are kept as-is. Each
+    person whose low-res confidence lands within `adaptive_refine_margin` of
+    the threshold gets a padded tile cut from the full-resolution image,
+    which is re-detected at `adaptive_high_img_size`; the high-res result
+    replaces the low-res guess for that person.
+    """
+    margin = DETECTION_CONFIG['adaptive_refine_margin']
+    low = _predict_boxes(
+        model,
+        image,
+        max(confidence_threshold - margin, 0.01),
+        DETECTION_CONFIG['adaptive_low_img_size'],
+        offset=offset,
+    )
+
+    sure = low[low[:, 4] >= confidence_threshold + margin]
+    uncertain = low[low[:, 4] < confidence_threshold + margin]
+    # Most promising candidates first when the tile budget runs out
+    uncertain = uncertain[np.argsort(-uncertain[:, 4])]
+
+    img_height, img_width = image.shape[:2]
+    offset_x, offset_y = offset
+    padding = DETECTION_CONFIG['adaptive_tile_padding']
+    max_tiles = DETECTION_CONFIG['adaptive_max_tiles']
+
+    found = [sure]
+    for idx, (x1, y1, x2, y2, conf) in enumerate(uncertain):
+        if idx >= max_tiles:
+            # Out of budget: trust the low-res box if it clears the threshold
+            if conf >= confidence_threshold:
+                found.append(uncertain[idx:idx + 1])
+            continue
+
+        pad_x = (x2 - x1) * padding
+        pad_y = (y2 - y1) * padding
+        tx1 = int(max(0, x1 - offset_x - pad_x))
+        ty1 = int(max(0, y1 - offset_y - pad_y))
+        tx2 = int(min(img_width, x2 - offset_x + pad_x))
+        ty2 = int(min(img_height, y2 - offset_y + pad_y))
+        if tx2 <= tx1 or ty2 <= ty1:
+            continue
+
+        found.append(_predict_boxes(
+            model,
+            image[ty1:ty2, tx1:tx2],
+            confidence_threshold,
+            DETECTION_CONFIG['adaptive_high_img_size'],
+            offset=(offset_x + tx1, offset_y + ty1),
+        ))
+
+    return _nms(np.concatenate(found), DETECTION_CONFIG['iou_threshold'])
+
+
+@metrics.request_totals()
+def detect_humans(
+    image_data: Union[str, np.ndarray],
+    confidence_threshold: float = None,
+    rois: Optional[Sequence[Sequence[float]]] = None,
+    adaptive: bool = False,
+    classify_people: Optional[bool] = None,
+    model_dir: Optional[str] = None,
+    raise_errors: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Detect humans in an image with optimized settings for multiple people.
+    
+    Args:
+        image_data: Base64 encoded image string, or an already decoded RGB array
+        confidence_threshold: Minimum confidence score (0-1), defaults to config value
+        rois: Optional regions of interest as [x, y, width, height] percentages.
+            Only these zones are cropped and run through the model.
+        adaptive: Use the low-res/high-res tile cascade
+        classify_people: Classify each person's crop with the activity model and
+            set its `status` / `statusConfidence`, defaults to config value
+        model_dir: Activity model source for per-person classification
+        raise_errors: Re-raise model and decode errors instead of returning an
+            empty list (benchmarks, background jobs)
+    
+    Returns:
+        List of detections with bounding boxes in full-frame percentage coordinates
+    """
+    if confidence_threshold is None:
+        confidence_threshold = DETECTION_CONFIG['default_confidence']
+    if classify_people is None:
+        classify_people = DETECTION_CONFIG['per_person_classification']
+    
+    try:
+        model = get_model()
+        
+        # Decode the image
+        image = image_data if isinstance(image_data, np.ndarray) else decode_base64_image(image_data)
+        img_height, img_width = image.shape[:2]
+
+        # Crop to the configured zones, or run the whole frame
+        regions = [_roi_to_pixels(roi, img_width, img_height) for roi in rois] if rois else [
+            (0, 0, img_width, img_height)
+        ]
+
+        found = []
+        for rx1, ry1, rx2, ry2 in regions:
+            if rx2 <= rx1 or ry2 <= ry1:
+                continue
+            crop = image[ry1:ry2, rx1:rx2]
+            if adaptive:
+                found.append(_detect_adaptive(model, crop, confidence_threshold, offset=(rx1, ry1)))
+            else:
+                found.append(_predict_boxes(
+                    model,
+                    crop,
+                    confidence_threshold,
+                    DETECTION_CONFIG['img_size'],
+                    offset=(rx1, ry1),
+                ))
+
+        with metrics.timer(_METRICS_ENDPOINT, 'postprocess'):
+            boxes = np.concatenate(found) if found else np.zeros((0, 5), dtype=np.float32)
+            if len(regions) > 1:
+                # Overlapping zones can report the same person twice
+                boxes = _nms(boxes, DETECTION_CONFIG['iou_threshold'])
+
+            detections = []
+            pixel_boxes = []
+            detection_id = 0
+
+            for x1, y1, x2, y2, confidence in boxes.tolist():
                 # Clamp coordinates to image boundaries
                 x1 = max(0, min(x1, img_width))
                 y1 = max(0, min(y1, img_height))
                 x2 = max(0, min(x2, img_width))
                 y2 = max(0, min(y2, img_height))
-                
+
                 # Skip invalid boxes
                 if x2 <= x1 or y2 <= y1:
                     continue
-                
+
                 # Convert to percentage of image dimensions
                 x_percent = (x1 / img_width) * 100
                 y_percent = (y1 / img_height) * 100
                 width_percent = ((x2 - x1) / img_width) * 100
                 height_percent = ((y2 - y1) / img_height) * 100
-                
+
                 # Skip very small detections (likely false positives)
                 if width_percent < 2 or height_percent < 2:
                     continue
-                
+
                 detections.append({
                     'id': f'human_{detection_id}',
                     'x': round(x_percent, 2),
@@ -175,18 +401,70 @@ def detect_humans(image_data: str, confidence_threshold: float = None) -> List[D
                     'height': round(height_percent, 2),
                     'confidence': round(confidence * 100, 1),
                     'label': 'Human',
-                    'status': 'normal'  # Will be updated by VideoMAE classification
+                    'status': 'normal'  # Updated by per-person classification when enabled
                 })
+                pixel_boxes.append((x1, y1, x2, y2))
                 detection_id += 1
-        
+
+        if classify_people and detections:
+            _classify_people(image, detections, pixel_boxes, model_dir)
+
         logger.debug(f"Detected {len(detections)} humans")
         return detections
     
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"Detection error: {e}")
         return []
 
 
+def _classify_people(
+    image: np.ndarray,
+    detections: List[Dict[str, Any]],
+    pixel_boxes: List[Tuple[float, float, float, float]],
+    model_dir: Optional[str],
+) -> None:
+    """Set per-detection status from one batched pass over person crops.
+
+    Crops are numpy views into the frame that was already decoded for
+    detection, so nothing is decoded twice. If the activity model is not
+    available detections keep their default 'normal' status.
+    """
+    from .videomae_classifier import classify_crops
+
+    img_height, img_width = image.shape[:2]
+    padding = DETECTION_CONFIG['person_crop_padding']
+    order = sorted(range(len(detections)), key=lambda i: -detections[i]['confidence'])
+    order = order[:DETECTION_CONFIG['max_person_crops']]
+
+    with metrics.timer(_METRICS_ENDPOINT, 'person_crop'):
+        crops = []
+        for i in order:
+            x1, y1, x2, y2 = pixel_boxes[i]
+            pad_x = (x2 - x1) * padding
+            pad_y = (y2 - y1) * padding
+            crops.append(image[
+                int(max(0, y1 - pad_y)):int(min(img_height, y2 + pad_y)),
+                int(max(0, x1 - pad_x)):int(min(img_width, x2 + pad_x)),
+            ])
+
+    try:
+        with metrics.timer(_METRICS_ENDPOINT, 'person_classify'):
+            results = classify_crops(
+                crops,
+                model_dir=model_dir,
+                img_size=DETECTION_CONFIG['person_crop_img_size'],
+            )
+    except Exception as e:
+        logger.warning(f"Per-person classification unavailable: {e}")
+        return
+
+    for i, result in zip(order, results):
+        detections[i]['status'] = result.prediction
+        detections[i]['statusConfidence'] = round(result.confidence, 1)
+
+
 def preload_model():
     """Preload the model at startup for faster first detection."""
     try:
@@ -6,7 +6,7 @@ import StatusIndicator from './components/StatusIndicator';
 import ControlPanel from './components/ControlPanel';
 import AlertDisplay from './components/AlertDisplay';
 import StatsPanel from './components/StatsPanel';
-import { apiGetState, apiSessionReset, apiSessionStart, apiSessionStop, apiUploadRecording, apiDetectHumans, apiClassifyActivity } from './api';
+import { CAMERA_ID, apiGetState, apiSessionReset, apiSessionStart, apiSessionStop, apiUploadRecording, apiDetectHumans, apiClassifyActivity, openCameraEventStream, openEventStream } from './api';
 
 function App() {
   const [isStreaming, setIsStreaming] = useState(false);
@@ -24,9 +24,12 @@ function App() {
   const streamRef = useRef(null);
   const intervalRef = useRef(null);
   const isFetchingRef = useRef(false);
+  const eventSourceRef = useRef(null);
+  const sessionStartRef = useRef(null);
   const detectionIntervalRef = useRef(null);
   const detectionCanvasRef = useRef(null);
   const frameBufferRef = useRef([]);
+  const frameTimesRef = useRef([]);
   const lastClassifyAtMsRef = useRef(0);
   const activityModelRef = useRef({ prediction: null, confidence: 0 });
 
@@ -75,16 +78,22 @@ function App() {
 
     // Maintain a short buffer of frames for VideoMAE classification.
     // We keep the last ~32 frames and classify using the last 16.
+    // Capture times (epoch ms) go along, so alert evidence can date each frame.
     const buf = frameBufferRef.current;
+    const times = frameTimesRef.current;
     buf.push(imageBase64);
-    if (buf.length > 32) buf.splice(0, buf.length - 32);
+    times.push(Date.now());
+    if (buf.length > 32) {
+      buf.splice(0, buf.length - 32);
+      times.splice(0, times.length - 32);
+    }
 
     // Run classification every ~2 seconds once we have enough frames.
     const nowMs = Date.now();
     if (buf.length >= 16 && nowMs - lastClassifyAtMsRef.current >= 2000) {
       lastClassifyAtMsRef.current = nowMs;
       try {
-        const classifyRes = await apiClassifyActivity(buf.slice(-16), 16);
+        const classifyRes = await apiClassifyActivity(buf.slice(-16), 16, CAMERA_ID, times.slice(-16));
         if (classifyRes?.success && classifyRes?.prediction) {
           activityModelRef.current = {
             prediction: classifyRes.prediction,
@@ -110,9 +119,11 @@ function App() {
         const useModel = (modelPred === 'normal' || modelPred === 'suspicious') && modelConf >= 70;
         const statusFromModel = useModel ? modelPred : 'normal';
         
+        // Per-person verdicts from the backend (statusConfidence set) win over
+        // the whole-frame prediction.
         const detectionsWithStatus = result.detections.map((det) => ({
           ...det,
-          status: statusFromModel
+          status: det.statusConfidence != null ? det.status : statusFromModel
         }));
         
         setDetections(detectionsWithStatus);
@@ -129,20 +140,11 @@ function App() {
           suspiciousCount: prev.suspiciousCount + detectionsWithStatus.filter(d => d.status === 'suspicious').length
         }));
         
-        // Set activity status based on detections
+        // Set activity status based on detections. Alerts are not created
+        // here: the backend raises them and pushes each one over the event
+        // stream, so every incident appears once.
         if (detectionsWithStatus.length > 0) {
           setActivityStatus(hasSuspicious ? 'suspicious' : 'normal');
-          
-          // Create alert for suspicious activity
-          if (hasSuspicious) {
-            const newAlert = {
-              id: `alert_${Date.now()}`,
-              message: `Suspicious activity detected - ${detectionsWithStatus.filter(d => d.status === 'suspicious').length} person(s)`,
-              time: new Date().toLocaleTimeString(),
-              confidence: Math.round(detectionsWithStatus.filter(d => d.status === 'suspicious')[0]?.confidence || 0)
-            };
-            setAlerts(prev => [newAlert, ...prev].slice(0, 50));
-          }
         } else {
           setActivityStatus('idle');
         }
@@ -469,10 +471,8 @@ function App() {
           console.error('Backend session start error:', error);
         }
 
+        // Backend drives alerts/uptime (event stream, see effect below)
         setIsStreaming(true);
-        // Let backend drive alerts/uptime
-        intervalRef.current = setInterval(fetchBackendState, 2000);
-        fetchBackendState();
 
         // Start YOLO human detection every 300ms for smoother detection
         detectionIntervalRef.current = setInterval(() => {
@@ -593,13 +593,47 @@ function App() {
     setAlerts(prev => prev.filter(alert => alert.id !== id));
   };
 
-  // Keep polling lifecycle aligned with streaming state
+  // Keep backend updates aligned with streaming state: subscribe to the
+  // event stream, falling back to 2s polling without EventSource support.
   useEffect(() => {
-    if (isStreaming && !intervalRef.current) {
+    if (!isStreaming) return undefined;
+
+    const source = openEventStream({
+      snapshot: (state) => {
+        setAlerts(Array.isArray(state.alerts) ? state.alerts : []);
+        sessionStartRef.current = state.startTime || null;
+      },
+      session: (session) => {
+        sessionStartRef.current = session.running ? session.startTime : null;
+      },
+      alert: (alert) => {
+        setAlerts(prev => [alert, ...prev.filter(a => a.id !== alert.id)].slice(0, 50));
+      },
+      reset: () => {
+        setAlerts([]);
+        sessionStartRef.current = null;
+      }
+    });
+
+    if (source) {
+      eventSourceRef.current = source;
+      // Uptime is derived locally from the session start time
+      intervalRef.current = setInterval(() => {
+        const startedAt = sessionStartRef.current;
+        if (startedAt) {
+          setStats(prev => ({ ...prev, uptime: Math.max(0, Math.floor(Date.now() / 1000 - startedAt)) }));
+        }
+      }, 1000);
+    } else if (!intervalRef.current) {
       intervalRef.current = setInterval(fetchBackendState, 2000);
       fetchBackendState();
     }
+
     return () => {
+      if (eventSourceRef.current) {
+        eventSourceRef.current.close();
+        eventSourceRef.current = null;
+      }
       if (intervalRef.current) {
         clearInterval(intervalRef.current);
         intervalRef.current = null;
@@ -607,6 +641,46 @@ function App() {
     };
   }, [isStreaming, fetchBackendState]);
 
+  // With REACT_APP_CAMERA_ID set, a dashboard that isn't streaming its own
+  // webcam watches that camera's shared results instead of posting frames.
+  useEffect(() => {
+    if (isStreaming || !CAMERA_ID) return undefined;
+
+    let source = null;
+    let retryTimer = null;
+    const showDetections = (payload) => {
+      const list = Array.isArray(payload?.detections) ? payload.detections : [];
+      setDetections(list);
+      detectionsRef.current = list;
+    };
+    const showClassification = (payload) => {
+      if (payload?.prediction) setActivityStatus(payload.prediction);
+    };
+    const connect = () => {
+      source = openCameraEventStream(CAMERA_ID, {
+        snapshot: (snap) => {
+          if (snap.detections) showDetections(snap.detections);
+          if (snap.classification) showClassification(snap.classification);
+        },
+        detections: showDetections,
+        classification: showClassification,
+        error: () => {
+          // 404 until the camera's source posts frames; EventSource does not retry those
+          if (source && source.readyState === EventSource.CLOSED) {
+            source = null;
+            retryTimer = setTimeout(connect, 5000);
+          }
+        }
+      });
+    };
+    connect();
+
+    return () => {
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, [isStreaming]);
+
   // Cleanup on unmount
   useEffect(() => {
     const videoEl = videoRef.current;
@@ -1,7 +1,13 @@
+import { COLUMNAR_MEDIA_TYPE, decodeColumnar } from './columnar';
+
 const DEFAULT_BASE_URL = 'http://127.0.0.1:8000';
 
 export const API_BASE_URL = (process.env.REACT_APP_API_BASE_URL || DEFAULT_BASE_URL).replace(/\/$/, '');
 
+// Named camera this dashboard streams or watches. Requests for the same camera
+// share one inference on the backend; unset, the webcam is its own source.
+export const CAMERA_ID = (process.env.REACT_APP_CAMERA_ID || '').trim() || undefined;
+
 async function request(path, options = {}) {
   const res = await fetch(`${API_BASE_URL}${path}`, {
     headers: {
@@ -39,6 +45,39 @@ export function apiGetState() {
   return request('/api/state/');
 }
 
+function openStream(path, handlers) {
+  if (typeof EventSource === 'undefined') return null;
+  const source = new EventSource(`${API_BASE_URL}${path}`);
+  Object.entries(handlers).forEach(([type, handler]) => {
+    if (type === 'error') {
+      source.onerror = handler;
+      return;
+    }
+    source.addEventListener(type, (e) => {
+      try {
+        handler(JSON.parse(e.data));
+      } catch (err) {
+        console.warn(`Bad ${type} event:`, err);
+      }
+    });
+  });
+  return source;
+}
+
+// Server-Sent Events stream of alerts and state changes (replaces polling).
+// EventSource reconnects on its own and resumes via Last-Event-ID.
+// Returns null when the browser has no EventSource support.
+export function openEventStream(handlers = {}) {
+  return openStream('/api/events/', handlers);
+}
+
+// Shared `detections` / `classification` results of one named camera, so a
+// viewer gets them without posting frames. The backend answers 404 (and
+// EventSource gives up) until frames were posted for the camera.
+export function openCameraEventStream(cameraId, handlers = {}) {
+  return openStream(`/api/cameras/${encodeURIComponent(cameraId)}/events/`, handlers);
+}
+
 export async function apiUploadRecording(fileBlob, { startedAt, endedAt } = {}) {
   const formData = new FormData();
   // Determine file extension based on blob type
@@ -47,6 +86,7 @@ export async function apiUploadRecording(fileBlob, { startedAt, endedAt } = {})
   formData.append('file', fileBlob, `recording_${Date.now()}.${ext}`);
   if (startedAt) formData.append('startedAt', startedAt);
   if (endedAt) formData.append('endedAt', endedAt);
+  if (CAMERA_ID) formData.append('cameraId', CAMERA_ID);
 
   const res = await fetch(`${API_BASE_URL}/api/recordings/upload/`, {
     method: 'POST',
@@ -64,15 +104,18 @@ export function apiListRecordings() {
   return request('/api/recordings/');
 }
 
-export async function apiDetectHumans(imageBase64, confidence = 0.5) {
+export async function apiDetectHumans(imageBase64, confidence = 0.5, cameraId = CAMERA_ID) {
   const res = await fetch(`${API_BASE_URL}/api/detect/`, {
     method: 'POST',
     headers: {
-      'Content-Type': 'application/json'
+      'Content-Type': 'application/json',
+      // Compact columnar body; decodes to the same values as the JSON one
+      Accept: `${COLUMNAR_MEDIA_TYPE}, application/json;q=0.9`
     },
     body: JSON.stringify({
       image: imageBase64,
-      confidence: confidence
+      confidence: confidence,
+      cameraId
     })
   });
 
@@ -80,10 +123,13 @@ export async function apiDetectHumans(imageBase64, confidence = 0.5) {
     const text = await res.text();
     throw new Error(`Detection failed ${res.status}: ${text}`);
   }
+  if ((res.headers.get('Content-Type') || '').startsWith(COLUMNAR_MEDIA_TYPE)) {
+    return decodeColumnar(await res.arrayBuffer());
+  }
   return res.json();
 }
 
-export async function apiClassifyActivity(framesBase64, numFrames = 16) {
+export async function apiClassifyActivity(framesBase64, numFrames = 16, cameraId = CAMERA_ID, frameTimes = undefined) {
   const res = await fetch(`${API_BASE_URL}/api/classify/`, {
     method: 'POST',
     headers: {
@@ -91,7 +137,9 @@ export async function apiClassifyActivity(framesBase64, numFrames = 16) {
     },
     body: JSON.stringify({
       frames: framesBase64,
-      numFrames
+      numFrames,
+      cameraId,
+      frameTimes
     })
   });
 
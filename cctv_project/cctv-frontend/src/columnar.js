@@ -0,0 +1,64 @@
+// Decoder for the backend's compact columnar responses
+// (`Accept: application/vnd.cctv.columnar`, see backend/surveillance/columnar.py).
+// Yields exactly the values the JSON response would: fixed-point columns are
+// decoded as code / 10 ** scale, which is the same double JSON.parse produces.
+
+export const COLUMNAR_MEDIA_TYPE = 'application/vnd.cctv.columnar';
+
+const ITEM = {
+  B: [1, (v, o) => v.getUint8(o)],
+  h: [2, (v, o) => v.getInt16(o, true)],
+  H: [2, (v, o) => v.getUint16(o, true)],
+  i: [4, (v, o) => v.getInt32(o, true)],
+  d: [8, (v, o) => v.getFloat64(o, true)]
+};
+
+function decodeTable([count, columns], view, offset) {
+  const rows = Array.from({ length: count }, () => ({}));
+  for (const [name, kind, dtype, param, missingList] of columns) {
+    const missing = new Set(missingList || []);
+    let values = param;
+    if (kind !== 'j') {
+      const [size, read] = ITEM[dtype];
+      values = [];
+      for (let n = count - missing.size; n > 0; n -= 1, offset += size) {
+        values.push(read(view, offset));
+      }
+      if (kind === 's') values = values.map((i) => param[i]);
+      if (kind === 'f') values = values.map((code) => code / 10 ** param);
+    }
+    let next = 0;
+    rows.forEach((row, i) => {
+      if (!missing.has(i)) row[name] = values[next++];
+    });
+  }
+  return [rows, offset];
+}
+
+export function decodeColumnar(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== 'CCOL' || view.getUint8(4) !== 1) throw new Error('Not a columnar payload');
+  const headerLength = view.getUint32(5, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 9, headerLength)));
+
+  const body = new DataView(buffer, 9 + headerLength);
+  const tables = [];
+  let offset = 0;
+  for (const table of header.tables) {
+    const [rows, end] = decodeTable(table, body, offset);
+    tables.push(rows);
+    offset = end;
+  }
+
+  const walk = (value) => {
+    if (Array.isArray(value)) return value.map(walk);
+    if (value && typeof value === 'object') {
+      const keys = Object.keys(value);
+      if (keys.length === 1 && keys[0] === '$table') return tables[value.$table];
+      return Object.fromEntries(keys.map((k) => [k, walk(value[k])]));
+    }
+    return value;
+  };
+  return walk(header.data);
+}
@@ -0,0 +1,30 @@
+/**
+ * @jest-environment node
+ */
+// Payloads encoded by the backend (backend/surveillance/tests.py writes
+// columnar.fixtures.json from seeded random detection/state payloads) must
+// decode to exactly what JSON.parse gives for the JSON response.
+import { decodeColumnar } from './columnar';
+import cases from './columnar.fixtures.json';
+
+function toArrayBuffer(base64) {
+  const bytes = Buffer.from(base64, 'base64');
+  return bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.byteLength);
+}
+
+describe('decodeColumnar', () => {
+  it('has fixtures to check', () => {
+    expect(cases.length).toBeGreaterThan(0);
+  });
+
+  cases.forEach(({ json, columnar }, i) => {
+    it(`round-trips backend payload ${i} to the JSON values`, () => {
+      // toEqual compares numbers with Object.is, so -0 vs 0 is caught too
+      expect(decodeColumnar(toArrayBuffer(columnar))).toEqual(JSON.parse(json));
+    });
+  });
+
+  it('rejects other payloads', () => {
+    expect(() => decodeColumnar(new TextEncoder().encode('JSON\u0001\0\0\0\0').buffer)).toThrow('Not a columnar payload');
+  });
+});